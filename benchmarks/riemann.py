@@ -0,0 +1,83 @@
+###################################################################
+#                                                                 #
+#  Micro-benchmark of the Riemann solver in interfaces per second #
+#                                                                 #
+###################################################################
+
+# Run from the main directory with `python benchmarks/riemann.py`
+
+import numpy as np
+import sys
+import time
+
+sys.path.append(".")
+from src.jit import njit
+from src.riemann import solve_riemann
+from src.tools import get_fluxes_1d
+
+
+@njit()
+def solve_riemann_reference(
+    U_l: np.ndarray, U_r: np.ndarray, gamma: float, direction: str
+) -> np.ndarray:
+    """Upwind flux of every interface found with `get_fluxes_1d`
+
+    Follows the pattern `solve_riemann` used before it was rewritten around
+    `hllc_flux_point`, where each interface builds a small flux array. For a
+    supersonic flow moving to the right the HLLC flux is the flux of the
+    left state, so the two give the same result on the benchmark problem.
+
+    """
+
+    F = np.zeros_like(U_l)
+
+    for i in range(U_r.shape[1]):
+        for j in range(U_r.shape[2]):
+            F[:, i, j] = get_fluxes_1d(U_l[:, i, j], gamma, direction)
+
+    return F
+
+
+def supersonic_states(nx1: int, nx2: int, gamma: float):
+    """Left and right states of a uniform flow moving right at Mach 2"""
+
+    U = np.empty((4, nx1 + 1, nx2), dtype=np.float64)
+    U[0] = 1.0
+    U[1] = 2.0 * np.sqrt(gamma)
+    U[2] = 0.1
+    U[3] = 1.0 / (gamma - 1.0) + 0.5 * (U[1] ** 2 + U[2] ** 2)
+
+    return U[:, :-1, :], U[:, 1:, :]
+
+
+def interfaces_per_second(solver, U_l, U_r, gamma: float, repeats: int) -> float:
+    """Best throughput of a solver over several repeats, after a warm up call"""
+
+    solver(U_l, U_r, gamma, "x")
+
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        solver(U_l, U_r, gamma, "x")
+        best = min(best, time.perf_counter() - start)
+
+    return U_l.shape[1] * U_l.shape[2] / best
+
+
+if __name__ == "__main__":
+
+    gamma = 1.4
+    U_l, U_r = supersonic_states(256, 256, gamma)
+
+    assert np.allclose(
+        solve_riemann(U_l, U_r, gamma, "x"),
+        solve_riemann_reference(U_l, U_r, gamma, "x"),
+    )
+
+    reference = interfaces_per_second(solve_riemann_reference, U_l, U_r, gamma, 10)
+    current = interfaces_per_second(solve_riemann, U_l, U_r, gamma, 10)
+
+    print(f"Solver                       |   Interfaces per second")
+    print(f"get_fluxes_1d per interface  |   {reference:.3e}")
+    print(f"hllc_flux_point              |   {current:.3e}")
+    print(f"Speedup                      |   {current / reference:.2f}x")
@@ -0,0 +1,109 @@
+###################################################################
+#                                                                 #
+#   Benchmark of the time taken to save the output of a timestep  #
+#                                                                 #
+###################################################################
+
+# Run from the main directory with `python benchmarks/save_data.py`
+
+import numpy as np
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(".")
+from src.data_saver import PsychoOutput
+from src.input import PsychoInput
+from src.mesh import PsychoArray
+from src.pgen.kh import ProblemGenerator
+
+
+def extract_reference(field: np.ndarray) -> np.ndarray:
+    """Copies the interior one value at a time, as `save_data` did before it was vectorized"""
+
+    interior = np.empty((field.shape[0] - 4, field.shape[1] - 4), dtype=float)
+
+    for j in reversed(range(field.shape[0] - 4)):
+        for i in range(field.shape[1] - 4):
+            interior[i][j] = field[i + 2][j + 2]
+
+    return interior
+
+
+def write_text_reference(f, field: np.ndarray, delimiter: str) -> None:
+    """Writes a field one value at a time, as `save_data` did before it was vectorized"""
+
+    for j in reversed(range(field.shape[0])):
+        for i in range(field.shape[1]):
+            f.write(str(field[i][j]))
+            f.write(delimiter)
+        f.write("\n")
+
+
+def save_time(pin: PsychoInput, pmesh: PsychoArray, repeats: int) -> float:
+    """Best time of `save_data` over several repeats, in a scratch directory"""
+
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+
+        try:
+            pout = PsychoOutput("benchmark")
+            pout.data_preferences(pin)
+
+            best = np.inf
+            for iter in range(repeats):
+                start = time.perf_counter()
+                pout.save_data(pmesh.Un, 0.0, 1.0, pin.value_dict["gamma"], iter)
+                best = min(best, time.perf_counter() - start)
+
+            pout.close()
+
+        finally:
+            os.chdir(cwd)
+
+    return best
+
+
+def reference_time(pmesh: PsychoArray, repeats: int) -> float:
+    """Best time of extracting and writing four fields one value at a time"""
+
+    field = pmesh.Un[0]
+
+    best = np.inf
+    with tempfile.TemporaryFile("w") as f:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(4):
+                write_text_reference(f, extract_reference(field), " ")
+            best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+if __name__ == "__main__":
+
+    pin = PsychoInput("inputs/kh.in")
+    pin.parse_input_file()
+
+    print(f"Grid   |   txt (s)   |   csv (s)   |   hdf5 (s)   |   txt before (s)")
+
+    for n in [64, 128, 256, 512]:
+        pin.value_dict["nx1"] = n
+        pin.value_dict["nx2"] = n
+
+        pmesh = PsychoArray(pin, np.float64)
+        ProblemGenerator(pin=pin, pmesh=pmesh)
+
+        times = []
+        for file_type in ["txt", "csv", "hdf5"]:
+            pin.value_dict["data_file_type"] = file_type
+            times.append(save_time(pin, pmesh, 3))
+
+        reference = reference_time(pmesh, 1)
+
+        print(
+            f"{n}^2   |   {times[0]:.4f}   |   {times[1]:.4f}   |   {times[2]:.4f}   |   {reference:.4f}"
+        )
@@ -0,0 +1,341 @@
+###################################################################
+#                                                                 #
+#  Benchmark suite of the solver kernels and of a full KH step    #
+#                                                                 #
+###################################################################
+
+# Run from the main directory with `python benchmarks/suite.py`, see
+# `python benchmarks/suite.py --help` for the grid sizes, the baseline and
+# the regression threshold
+
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(".")
+from src.data_saver import PsychoOutput
+from src.input import PsychoInput
+from src.jit import HAVE_NUMBA, set_num_threads
+from src.mesh import PsychoArray
+from src.pgen.kh import ProblemGenerator
+from src.reconstruct import get_limited_slopes
+from src.riemann import solve_riemann, solve_riemann_parallel
+from src.step import muscl_hancock_step, muscl_hancock_step_parallel
+from src.tools import calculate_timestep, get_fluxes_2d
+
+KERNELS = [
+    "solve_riemann",
+    "get_limited_slopes",
+    "get_fluxes_2d",
+    "calculate_timestep",
+    "enforce_bcs",
+    "save_data",
+    "step",
+]
+
+
+def kh_problem(n: int):
+    """Input and mesh of the KH problem on an n x n grid, seeded for reproducibility"""
+
+    pin = PsychoInput("inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = n
+    pin.value_dict["nx2"] = n
+
+    np.random.seed(0)
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.enforce_bcs(pin)
+
+    return pin, pmesh
+
+
+def kernel_call(kernel: str, pin: PsychoInput, pmesh: PsychoArray, threads: int):
+    """Returns a function calling a kernel once on the KH problem, and a clean up"""
+
+    gamma = pin.value_dict["gamma"]
+    cfl = pin.value_dict["CFL"]
+    Un = pmesh.Un
+
+    if kernel == "solve_riemann":
+        U_l = np.ascontiguousarray(Un[:, 1:-2, 2:-2])
+        U_r = np.ascontiguousarray(Un[:, 2:-1, 2:-2])
+        F = np.empty_like(U_l)
+        solver = solve_riemann_parallel if threads > 1 else solve_riemann
+
+        return lambda: solver(U_l, U_r, gamma, "x", out=F), None
+
+    if kernel == "get_limited_slopes":
+        U_i_j = Un[:, 1:-1, 1:-1]
+        out = (np.empty_like(U_i_j), np.empty_like(U_i_j))
+        scratch = np.empty((5,) + U_i_j.shape)
+
+        return (
+            lambda: get_limited_slopes(
+                U_i_j,
+                Un[:, 2:, 1:-1],
+                Un[:, :-2, 1:-1],
+                Un[:, 1:-1, 2:],
+                Un[:, 1:-1, :-2],
+                beta=1.0,
+                out=out,
+                scratch=scratch,
+            ),
+            None,
+        )
+
+    if kernel == "get_fluxes_2d":
+        F = np.empty_like(Un)
+
+        return lambda: get_fluxes_2d(Un, gamma, "x", out=F), None
+
+    if kernel == "calculate_timestep":
+        return lambda: calculate_timestep(pmesh, cfl, gamma), None
+
+    if kernel == "enforce_bcs":
+        return lambda: pmesh.enforce_bcs(pin), None
+
+    if kernel == "save_data":
+        cwd = os.getcwd()
+        tmp_dir = tempfile.TemporaryDirectory()
+        os.chdir(tmp_dir.name)
+
+        pout = PsychoOutput("benchmark")
+        pout.data_preferences(pin)
+
+        def cleanup():
+            pout.close()
+            os.chdir(cwd)
+            tmp_dir.cleanup()
+
+        iters = iter(range(10**9))
+        return lambda: pout.save_data(Un, 0.0, 1.0, gamma, next(iters)), cleanup
+
+    if kernel == "step":
+        # A full step of the loop, as run by psycho.py with the fused kernel
+        step = muscl_hancock_step_parallel if threads > 1 else muscl_hancock_step
+        Unp1 = np.empty_like(Un)
+
+        def full_step():
+            dt = calculate_timestep(pmesh, cfl, gamma)
+            pmesh.enforce_bcs(pin)
+            step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, Unp1)
+
+        return full_step, None
+
+    raise ValueError("Please use an implemented kernel")
+
+
+def time_kernel(call, repeats: int) -> dict:
+    """Times the first call of a kernel, which includes the JIT compilation,
+    apart from the best and median of the calls that follow"""
+
+    start = time.perf_counter()
+    call()
+    warmup = time.perf_counter() - start
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+
+    return dict(warmup=warmup, best=min(times), median=float(np.median(times)))
+
+
+def metadata(threads: int) -> dict:
+    """Describes the machine and the code the benchmarks were run on"""
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    versions = dict(python=platform.python_version(), numpy=np.__version__)
+
+    if HAVE_NUMBA:
+        import numba
+
+        versions["numba"] = numba.__version__
+
+    return dict(
+        commit=commit,
+        machine=platform.machine(),
+        processor=platform.processor(),
+        cpu_count=os.cpu_count(),
+        threads=threads,
+        versions=versions,
+    )
+
+
+def run_suite(kernels: list, sizes: list, repeats: int, threads: int) -> dict:
+    """Runs every kernel on every grid size and returns the results"""
+
+    results = []
+
+    for n in sizes:
+        pin, pmesh = kh_problem(n)
+
+        for kernel in kernels:
+            call, cleanup = kernel_call(kernel, pin, pmesh, threads)
+
+            try:
+                timing = time_kernel(call, repeats)
+            finally:
+                if cleanup is not None:
+                    cleanup()
+
+            timing.update(
+                kernel=kernel,
+                n=n,
+                cell_updates_per_second=n * n / timing["median"],
+            )
+            results.append(timing)
+
+            print(
+                f"{kernel:<20}{n:>6}^2{timing['warmup']:>12.4f}{timing['median']:>12.4f}"
+                f"{timing['cell_updates_per_second']:>14.4g}"
+            )
+
+        del pin, pmesh
+
+    return dict(metadata=metadata(threads), results=results)
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Compares the throughput of every kernel and grid size with a baseline
+
+    Returns
+    -------
+    list
+        Kernel, grid size and ratio of the current to the baseline throughput
+        of every result slower than the baseline by more than the threshold
+
+    """
+
+    reference = {
+        (result["kernel"], result["n"]): result["cell_updates_per_second"]
+        for result in baseline["results"]
+    }
+
+    print(f"Kernel              Grid      Baseline       Current     Ratio")
+
+    regressions = []
+    for result in current["results"]:
+        key = (result["kernel"], result["n"])
+
+        if key not in reference:
+            continue
+
+        ratio = result["cell_updates_per_second"] / reference[key]
+        flag = "  REGRESSION" if ratio < 1.0 - threshold else ""
+
+        print(
+            f"{key[0]:<20}{key[1]:>4}^2{reference[key]:>14.4g}"
+            f"{result['cell_updates_per_second']:>14.4g}{ratio:>10.2f}{flag}"
+        )
+
+        if flag:
+            regressions.append((key[0], key[1], ratio))
+
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--sizes",
+        help="Grid sizes, each run on an n x n grid",
+        type=int,
+        nargs="+",
+        default=[64, 128, 256, 512, 1024, 2048],
+    )
+
+    parser.add_argument(
+        "--kernels",
+        help="Kernels to run, all of them by default",
+        nargs="+",
+        choices=KERNELS,
+        default=KERNELS,
+    )
+
+    parser.add_argument(
+        "--repeats",
+        help="Number of timed calls of each kernel after the warm-up call",
+        type=int,
+        default=5,
+    )
+
+    parser.add_argument(
+        "-t",
+        "--threads",
+        help="Number of threads used by the solver kernels",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="JSON file receiving the results",
+        default="benchmarks/results.json",
+    )
+
+    parser.add_argument(
+        "--baseline",
+        help="JSON file of results to compare against",
+        default="benchmarks/baseline.json",
+    )
+
+    parser.add_argument(
+        "--threshold",
+        help="Slowdown relative to the baseline flagged as a regression",
+        type=float,
+        default=0.1,
+    )
+
+    parser.add_argument(
+        "--save-baseline",
+        help="Store the results as the baseline instead of comparing against it",
+        action="store_true",
+    )
+
+    args = parser.parse_args()
+
+    set_num_threads(args.threads)
+
+    print(f"Kernel                Grid  Warm-up (s)  Median (s)  Cells per s")
+    current = run_suite(args.kernels, args.sizes, args.repeats, args.threads)
+
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        regressions = compare(current, baseline, args.threshold)
+
+        if regressions:
+            print(
+                f"{len(regressions)} results are more than {args.threshold:.0%} "
+                f"slower than the baseline"
+            )
+            sys.exit(1)
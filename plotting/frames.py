@@ -0,0 +1,529 @@
+###################################################################
+#                                                                 #
+#      Contains the renderer of colormapped frames for movies     #
+#                                                                 #
+###################################################################
+
+import numpy as np
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import zlib
+
+sys.path.append("..")
+from src.mesh import PsychoArray
+
+# Number of entries in each colormap lookup table
+LUT_SIZE = 256
+
+# Piecewise linear colormaps given as (x, value) control points of the red,
+# green and blue channels, the same as the matplotlib colormaps of that name
+_SEGMENTS = {
+    "gray": (
+        ((0.0, 0.0), (1.0, 1.0)),
+        ((0.0, 0.0), (1.0, 1.0)),
+        ((0.0, 0.0), (1.0, 1.0)),
+    ),
+    "jet": (
+        ((0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)),
+        ((0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)),
+        ((0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)),
+    ),
+    "hot": (
+        ((0.0, 0.0416), (0.365079, 1.0), (1.0, 1.0)),
+        ((0.0, 0.0), (0.365079, 0.0), (0.746032, 1.0), (1.0, 1.0)),
+        ((0.0, 0.0), (0.746032, 0.0), (1.0, 1.0)),
+    ),
+}
+
+# Colormaps given as functions of x in [0, 1], clipped to [0, 1]
+_FUNCTIONS = {
+    "ocean": (
+        lambda x: 3 * x - 2,
+        lambda x: np.abs((3 * x - 1) / 2),
+        lambda x: x,
+    ),
+}
+
+
+def _interpolate_segments(points: tuple) -> np.ndarray:
+    """Interpolates control points onto the entries, rounding as matplotlib does"""
+
+    xp = np.array([p[0] for p in points]) * (LUT_SIZE - 1)
+    fp = np.array([p[1] for p in points])
+
+    x = (LUT_SIZE - 1) * np.linspace(0.0, 1.0, LUT_SIZE)
+    ind = np.searchsorted(xp, x)[1:-1]
+
+    distance = (x[1:-1] - xp[ind - 1]) / (xp[ind] - xp[ind - 1])
+
+    return np.clip(
+        np.concatenate(
+            [[fp[0]], distance * (fp[ind] - fp[ind - 1]) + fp[ind - 1], [fp[-1]]]
+        ),
+        0.0,
+        1.0,
+    )
+
+
+def get_colormap_lut(cmap: str) -> np.ndarray:
+    """Returns the lookup table of a colormap
+
+    Parameters
+    ----------
+    cmap : str
+        Name of the colormap, one of gray, jet, hot and ocean, with `_r`
+        appended for the reversed colormap
+
+    Returns
+    -------
+    ndarray[uint8]
+        Array of shape (LUT_SIZE, 3) holding the RGB colour of each entry
+
+    """
+
+    reverse = cmap.endswith("_r")
+    name = cmap[:-2] if reverse else cmap
+
+    x = np.linspace(0.0, 1.0, LUT_SIZE)
+
+    if name in _SEGMENTS:
+        channels = []
+        for points in _SEGMENTS[name]:
+            # Reversed by mirroring the control points, as matplotlib does
+            if reverse:
+                points = [(1.0 - p[0], p[1]) for p in reversed(points)]
+
+            channels.append(_interpolate_segments(points))
+
+    elif name in _FUNCTIONS:
+        channels = [
+            np.clip(f(1.0 - x if reverse else x), 0.0, 1.0) for f in _FUNCTIONS[name]
+        ]
+
+    else:
+        raise ValueError(
+            f"Please use a colormap implemented for frames: {', '.join([*_SEGMENTS, *_FUNCTIONS])}"
+        )
+
+    return (np.stack(channels, axis=1) * 255).astype(np.uint8)
+
+
+def get_plot_primitives(Un: np.ndarray, ng: int, out: np.ndarray = None) -> np.ndarray:
+    """Returns the plotted primitives rho, u, v and et in the interior
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables
+    ng : int
+        Number of ghost cells
+    out : ndarray[float], optional
+        Array of shape (4, nx1, nx2) receiving the primitives
+
+    Returns
+    -------
+    ndarray[float]
+        Array of shape (4, nx1, nx2) holding rho, u, v and et
+
+    """
+
+    interior = Un[:, ng:-ng, ng:-ng]
+
+    if out is None:
+        out = np.empty_like(interior)
+
+    out[0] = interior[0]
+    np.divide(interior[1:], interior[0], out=out[1:])
+
+    return out
+
+
+def write_png(fname: str, rgb: np.ndarray, level: int = 1) -> None:
+    """Writes an RGB image as a PNG file
+
+    Parameters
+    ----------
+    fname : str
+        The name of the PNG file
+    rgb : ndarray[uint8]
+        Image of shape (height, width, 3)
+    level : int
+        zlib compression level, from 0 (none) to 9 (smallest)
+
+    """
+
+    height, width, _ = rgb.shape
+
+    # Every row starts with the byte of filter type 0 (none)
+    raw = np.empty((height, 1 + 3 * width), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = rgb.reshape(height, 3 * width)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + kind
+            + data
+            + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    with open(fname, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), level)))
+        f.write(chunk(b"IEND", b""))
+
+
+def write_ppm(fname: str, rgb: np.ndarray) -> None:
+    """Writes an RGB image as a binary PPM file of raw pixels
+
+    Parameters
+    ----------
+    fname : str
+        The name of the PPM file
+    rgb : ndarray[uint8]
+        Image of shape (height, width, 3)
+
+    """
+
+    height, width, _ = rgb.shape
+
+    with open(fname, "wb") as f:
+        f.write(f"P6\n{width} {height}\n255\n".encode())
+        f.write(np.ascontiguousarray(rgb).tobytes())
+
+
+def rgb_to_yuv444(rgb: np.ndarray) -> np.ndarray:
+    """Converts an RGB image to limited range BT.601 Y, Cb and Cr planes
+
+    Parameters
+    ----------
+    rgb : ndarray[uint8]
+        Image of shape (height, width, 3)
+
+    Returns
+    -------
+    ndarray[uint8]
+        Array of shape (3, height, width) holding the Y, Cb and Cr planes
+
+    """
+
+    r, g, b = np.moveaxis(rgb.astype(np.float32), -1, 0)
+
+    yuv = np.empty((3, *rgb.shape[:2]), dtype=np.float32)
+    yuv[0] = 16 + (65.481 * r + 128.553 * g + 24.966 * b) / 255
+    yuv[1] = 128 + (-37.797 * r - 74.203 * g + 112.0 * b) / 255
+    yuv[2] = 128 + (112.0 * r - 93.786 * g - 18.214 * b) / 255
+
+    return np.rint(yuv).astype(np.uint8)
+
+
+class VideoStream:
+    """Streams RGB frames into a video without writing any images
+
+    When ffmpeg is on the PATH the raw frames are piped into it and encoded
+    as H.264 to `<fname_base>.mp4`, with ffmpeg's messages in
+    `<fname_base>.log`. Otherwise they are written to an uncompressed
+    `<fname_base>.y4m` stream, which ffmpeg and most players read directly.
+
+    Parameters
+    ----------
+    fname_base : str
+        Name of the video file without its extension
+    width, height : int
+        Size of the frames in pixels
+    fps : int
+        Frames per second of the video
+    encoder : str, optional
+        `auto` (default) uses ffmpeg when found and y4m otherwise, `ffmpeg`
+        and `y4m` force one of them
+
+    Attributes
+    ----------
+    fname : str
+        Name of the video file
+
+    """
+
+    def __init__(
+        self, fname_base: str, width: int, height: int, fps: int, encoder: str = "auto"
+    ):
+
+        if encoder not in ["auto", "ffmpeg", "y4m"]:
+            raise ValueError("Please use an implemented video encoder")
+
+        ffmpeg = shutil.which("ffmpeg") if encoder != "y4m" else None
+
+        if encoder == "ffmpeg" and ffmpeg is None:
+            raise ValueError("Please install ffmpeg to encode the video")
+
+        self.width = width
+        self.height = height
+
+        if ffmpeg is not None:
+            self.fname = fname_base + ".mp4"
+
+            with open(fname_base + ".log", "w") as log:
+                self.process = subprocess.Popen(
+                    [
+                        ffmpeg,
+                        "-y",
+                        "-loglevel",
+                        "error",
+                        "-f",
+                        "rawvideo",
+                        "-pix_fmt",
+                        "rgb24",
+                        "-s",
+                        f"{width}x{height}",
+                        "-r",
+                        str(fps),
+                        "-i",
+                        "-",
+                        # yuv420p needs an even width and height
+                        "-vf",
+                        "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                        "-c:v",
+                        "libx264",
+                        "-pix_fmt",
+                        "yuv420p",
+                        self.fname,
+                    ],
+                    stdin=subprocess.PIPE,
+                    stdout=log,
+                    stderr=log,
+                )
+
+            self.f = self.process.stdin
+
+        else:
+            self.fname = fname_base + ".y4m"
+            self.process = None
+
+            self.f = open(self.fname, "wb")
+            self.f.write(
+                f"YUV4MPEG2 W{width} H{height} F{fps}:1 Ip A1:1 C444\n".encode()
+            )
+
+    def write(self, rgb: np.ndarray) -> None:
+        """Appends a frame to the video
+
+        Parameters
+        ----------
+        rgb : ndarray[uint8]
+            Image of shape (height, width, 3)
+
+        """
+
+        if rgb.shape != (self.height, self.width, 3):
+            raise ValueError("Please keep the size of the frames the same")
+
+        if self.process is not None:
+            self.f.write(np.ascontiguousarray(rgb).data)
+        else:
+            self.f.write(b"FRAME\n")
+            self.f.write(rgb_to_yuv444(rgb).data)
+
+    def close(self) -> None:
+        """Finishes the video, waiting for ffmpeg to encode the last frames"""
+
+        self.f.close()
+
+        if self.process is not None and self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.fname}")
+
+
+class FrameRenderer:
+    """Renders the primitives as raw colormapped frames without matplotlib
+
+    Each plotted variable is scaled between its minimum and maximum,
+    mapped through the lookup table of its colormap and written as its own
+    image `output/frames/<variable>_<iter>.png` (or `.ppm`), one pixel per
+    cell and with the same orientation as the plots of `Plotter`. Labels,
+    titles and colorbars are left out, so the frames can be put straight
+    into a movie. With the `video` and `y4m` formats the frames of each
+    variable are instead streamed into one `VideoStream`,
+    `output/frames/<variable>.mp4` (or `.y4m`), so no images are written.
+
+    Parameters
+    ----------
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+        and the conserved variables Un
+
+    primitives : ndarray[float], optional
+        Array of shape (4, nx1, nx2) holding rho, u, v and et in the
+        interior, used instead of computing them from Un
+
+    frame_format : str, optional
+        Format of the frames, `png` (default), `ppm`, `video` (ffmpeg when
+        found, y4m otherwise) or `y4m`
+
+    video_fps : int, optional
+        Frames per second of the videos
+
+    Attributes
+    ----------
+    primitives: dict
+        Dictionary containing each primitive (rho, u, v, et) with a corresponding
+        key
+
+    """
+
+    def __init__(
+        self,
+        pmesh: PsychoArray,
+        primitives: np.ndarray = None,
+        frame_format: str = "png",
+        video_fps: int = 24,
+    ):
+
+        if frame_format not in ["png", "ppm", "video", "y4m"]:
+            raise ValueError("Please use an implemented frame format")
+
+        self.ng = pmesh.ng
+        self.frame_format = frame_format
+        self.video_fps = video_fps
+
+        # Video of each variable (and suffix), opened on its first frame
+        self.streams = dict()
+
+        if primitives is None:
+            primitives = get_plot_primitives(pmesh.Un, self.ng)
+
+        self.update(primitives)
+
+        # Lookup tables are built once for each colormap
+        self.luts = dict()
+
+    def update(self, primitives: np.ndarray) -> None:
+        """Sets the primitives rendered by the next call to `create_plot`
+
+        Parameters
+        ----------
+        primitives : ndarray[float]
+            Array of shape (4, nx1, nx2) holding rho, u, v and et in the
+            interior, see `get_plot_primitives`
+
+        """
+
+        rho, u, v, et = primitives
+        self.primitives = {"rho": rho, "u": u, "v": v, "et": et}
+
+    def render(self, var: str, cmap: str) -> np.ndarray:
+        """Maps a primitive through a colormap
+
+        Parameters
+        ----------
+        var : str
+            The variable to render, one of rho, u, v and et
+        cmap : str
+            Name of the colormap, see `get_colormap_lut`
+
+        Returns
+        -------
+        ndarray[uint8]
+            Image of shape (nx2, nx1, 3), with x2 increasing downwards as
+            in the plots of `Plotter`
+
+        """
+
+        if cmap not in self.luts:
+            self.luts[cmap] = get_colormap_lut(cmap)
+
+        field = self.primitives[var].T
+
+        vmin = np.amin(field)
+        vmax = np.amax(field)
+
+        # Scaled to [0, 1] first and then to the entries, as matplotlib does
+        index = np.empty(field.shape, dtype=np.float64)
+        np.subtract(field, vmin, out=index)
+        if vmax > vmin:
+            np.divide(index, vmax - vmin, out=index)
+        np.multiply(index, LUT_SIZE, out=index)
+        np.clip(index, 0, LUT_SIZE - 1, out=index)
+
+        return self.luts[cmap][index.astype(np.intp)]
+
+    def create_plot(
+        self,
+        variables_to_plot: list[str],
+        labels: list[str],
+        cmaps: list[str],
+        stability_name: str,
+        style_mode: bool,
+        iter: int,
+        time: float,
+        suffix: str = "",
+    ) -> None:
+        """Writes a frame of each variable, taking the arguments of `Plotter.create_plot`
+
+        Only the variables, colormaps, iteration and suffix are used.
+
+        Parameters
+        ----------
+        variables_to_plot : list[str]
+            A list of strings containing the variables to be rendered
+        labels : list[str]
+            Unused
+        cmaps : list[str]
+            The colormap of each variable
+        stability_name : str
+            Unused
+        style_mode : bool
+            Unused
+        iter : int
+            The current iteration
+        time : float
+            Unused
+        suffix : str
+            Appended to the name of the frames, e.g. to keep the members of
+            an ensemble apart
+
+        """
+
+        if not os.path.exists("./output/frames"):
+            os.makedirs("./output/frames")
+
+        striter = str(iter).zfill(4) + suffix
+
+        for var, cmap in zip(variables_to_plot, cmaps):
+            if var not in self.primitives:
+                raise ValueError(
+                    "Please input only valid variables \n Valid variables are: rho, u, v, et"
+                )
+
+            rgb = self.render(var, cmap)
+
+            if self.frame_format in ["video", "y4m"]:
+                key = f"{var}{suffix}"
+
+                if key not in self.streams:
+                    self.streams[key] = VideoStream(
+                        f"output/frames/{key}",
+                        rgb.shape[1],
+                        rgb.shape[0],
+                        self.video_fps,
+                        "y4m" if self.frame_format == "y4m" else "auto",
+                    )
+
+                self.streams[key].write(rgb)
+
+            elif self.frame_format == "png":
+                write_png(f"output/frames/{var}_{striter}.png", rgb)
+
+            else:
+                write_ppm(f"output/frames/{var}_{striter}.ppm", rgb)
+
+    def close(self) -> None:
+        """Finishes the videos and releases the primitives"""
+
+        streams, self.streams = self.streams, dict()
+        for stream in streams.values():
+            stream.close()
+
+        self.primitives = None
@@ -5,6 +5,7 @@ import os
 
 sys.path.append("..")
 from src.mesh import PsychoArray
+from plotting.frames import get_plot_primitives
 
 
 class Plotter:
@@ -16,6 +17,16 @@ class Plotter:
         PsychoArray mesh which contains all of the current mesh information
         and the conserved variables Un
 
+    primitives : ndarray[float], optional
+        Array of shape (4, nx1, nx2) holding rho, u, v and et in the
+        interior, used instead of computing them from Un
+
+    method : str, optional
+        How the fields are drawn, `imshow` (default) or `contourf`. With
+        `imshow` the figure is built on the first frame and kept, so later
+        frames only update the image data, colour limits and title. Fields
+        larger than the axes are block averaged down to the axes' pixels
+
     Attributes
     ----------
     ng : int
@@ -53,23 +64,211 @@ class Plotter:
     x2_plot : ndarray[float]
         Array of x2 values after using meshgrid for plotting
 
+    fig : Figure
+        Figure kept between frames by the `imshow` method, None until the
+        first frame is plotted
+
     """
 
-    def __init__(self, pmesh: PsychoArray):
+    def __init__(
+        self,
+        pmesh: PsychoArray,
+        primitives: np.ndarray = None,
+        method: str = "imshow",
+    ):
+
+        if method not in ["imshow", "contourf"]:
+            raise ValueError("Please use an implemented plot method")
 
         # Get information from the mesh needed needed for plotting
         self.ng = pmesh.ng
-        self.rho = pmesh.Un[0, self.ng : -self.ng, self.ng : -self.ng]
-        self.u = pmesh.Un[1, self.ng : -self.ng, self.ng : -self.ng] / self.rho
-        self.v = pmesh.Un[2, self.ng : -self.ng, self.ng : -self.ng] / self.rho
-        self.et = pmesh.Un[3, self.ng : -self.ng, self.ng : -self.ng] / self.rho
-        self.primitives = {"rho": self.rho, "u": self.u, "v": self.v, "et": self.et}
+        self.method = method
+
+        if primitives is None:
+            primitives = get_plot_primitives(pmesh.Un, self.ng)
+
+        self.update(primitives)
 
         # Create grid for plotting
         self.x1 = np.arange(pmesh.x1min, pmesh.x1max, pmesh.dx1)
         self.x2 = np.arange(pmesh.x2min, pmesh.x2max, pmesh.dx2)
         self.x1_plot, self.x2_plot = np.meshgrid(self.x1, self.x2)
 
+        # Figure, images, colorbars and title kept by the imshow method
+        self.fig = None
+        self.layout = None
+
+    def update(self, primitives: np.ndarray) -> None:
+        """Sets the primitives plotted by the next call to `create_plot`
+
+        Parameters
+        ----------
+        primitives : ndarray[float]
+            Array of shape (4, nx1, nx2) holding rho, u, v and et in the
+            interior, see `get_plot_primitives`
+
+        """
+
+        self.rho, self.u, self.v, self.et = primitives
+        self.primitives = {"rho": self.rho, "u": self.u, "v": self.v, "et": self.et}
+
+    def close(self) -> None:
+        """Closes the figure kept by the imshow method"""
+
+        if self.fig is not None:
+            plt.close(self.fig)
+
+        self.fig = None
+        self.layout = None
+
+    def _image(self, var: str, factor: int) -> np.ndarray:
+        """Returns the field as drawn by contourf, block averaged by `factor`"""
+
+        field = np.rot90(self.primitives[var])
+
+        if factor == 1:
+            return field.copy()
+
+        n2 = field.shape[0] // factor * factor
+        n1 = field.shape[1] // factor * factor
+
+        return (
+            field[:n2, :n1]
+            .reshape(n2 // factor, factor, n1 // factor, factor)
+            .mean(axis=(1, 3))
+        )
+
+    def _build_figure(
+        self,
+        variables_to_plot: list[str],
+        labels: list[str],
+        cmaps: list[str],
+        stability_name: str,
+        style_mode: bool,
+    ) -> None:
+        """Builds the figure reused by the imshow method"""
+
+        self.close()
+
+        num_of_variables = len(variables_to_plot)
+
+        if num_of_variables <= 3:
+            fig, axs = plt.subplots(1, num_of_variables)
+        else:
+            fig, axs = plt.subplots(2, 2, figsize=(10, 10))
+
+        self.fig = fig
+        self.images = []
+        self.cbars = []
+
+        for count, (ax, var) in enumerate(
+            zip(np.atleast_1d(axs).flat, variables_to_plot)
+        ):
+
+            # Average the field down when it has more cells than the axes pixels
+            bbox = ax.get_window_extent()
+            factor = max(
+                1,
+                int(np.ceil(len(self.x1) / max(bbox.width, 1))),
+                int(np.ceil(len(self.x2) / max(bbox.height, 1))),
+            )
+
+            im = ax.imshow(
+                self._image(var, factor),
+                cmap=cmaps[count],
+                origin="lower",
+                extent=(self.x1[0], self.x1[-1], self.x2[0], self.x2[-1]),
+                interpolation="bilinear",
+            )
+            self.images.append((im, var, factor))
+
+            if not style_mode or num_of_variables > 1:
+                ax.set_aspect("equal")
+            else:
+                ax.set_aspect("auto")
+
+            ax.tick_params(
+                axis="both",
+                which="both",
+                bottom=False,
+                left=False,
+                labelbottom=False,
+                labelleft=False,
+            )
+
+            if not style_mode:
+                self.cbars.append(
+                    fig.colorbar(
+                        im,
+                        fraction=0.046,
+                        pad=0.04,
+                        orientation="horizontal",
+                        label=rf"${labels[count]}$",
+                    )
+                )
+
+        self.title = None
+
+        if not style_mode:
+            fig.tight_layout()
+            fig.set_facecolor("lightgray")
+            fig.subplots_adjust(top=0.87)
+            self.title = fig.suptitle(
+                stability_name,
+                fontsize="x-large" if num_of_variables == 1 else "xx-large",
+                fontweight="bold",
+                y=0.97 if num_of_variables == 1 else 0.95,
+            )
+
+        else:
+            fig.tight_layout(pad=0)
+            fig.set_facecolor("dimgray")
+
+        self.layout = (
+            tuple(variables_to_plot),
+            tuple(labels),
+            tuple(cmaps),
+            stability_name,
+            style_mode,
+        )
+
+    def _draw_images(
+        self,
+        variables_to_plot: list[str],
+        labels: list[str],
+        cmaps: list[str],
+        stability_name: str,
+        style_mode: bool,
+        time: float,
+    ) -> None:
+        """Updates the kept figure with the current primitives"""
+
+        layout = (
+            tuple(variables_to_plot),
+            tuple(labels),
+            tuple(cmaps),
+            stability_name,
+            style_mode,
+        )
+
+        if self.fig is None or layout != self.layout:
+            self._build_figure(
+                variables_to_plot, labels, cmaps, stability_name, style_mode
+            )
+
+        for count, (im, var, factor) in enumerate(self.images):
+            im.set_data(self._image(var, factor))
+
+            vmin = np.amin(self.primitives[var])
+            vmax = np.amax(self.primitives[var])
+            im.set_clim(vmin, vmax)
+
+            if not style_mode:
+                self.cbars[count].set_ticks(np.linspace(vmin, vmax, 5))
+
+        if self.title is not None:
+            self.title.set_text(stability_name + f"\n(t = {time:.3f} sec)")
+
     def check_path_exists(
         self,
     ) -> None:
@@ -87,6 +286,7 @@ class Plotter:
         style_mode: bool,
         iter: int,
         time: float,
+        suffix: str = "",
     ) -> None:
         """Creates desired plots for provided input variables at a given time
 
@@ -109,6 +309,9 @@ class Plotter:
             The current iteration
         time : float
             The current time
+        suffix : str
+            Appended to the name of the saved figure, e.g. to keep the
+            members of an ensemble apart
         """
 
         # Check to make sure desired output is one that exists
@@ -122,6 +325,16 @@ class Plotter:
         # Check if output directory exists
         self.check_path_exists()
 
+        striter = str(iter).zfill(4) + suffix
+
+        if self.method == "imshow":
+            self._draw_images(
+                variables_to_plot, labels, cmaps, stability_name, style_mode, time
+            )
+            self.fig.savefig("output/plots/" + f"{striter}.png")
+
+            return
+
         # Create plots for each variable, if more than 3 plots then add another row
         num_of_variables = len(variables_to_plot)
 
@@ -218,8 +431,6 @@ class Plotter:
                     count += 1
 
         # Save the output plot and adjust the figure settings
-        striter = str(iter).zfill(4)
-
         if not style_mode:
             fig.tight_layout()
             fig.set_facecolor("lightgray")
@@ -241,7 +452,6 @@ class Plotter:
         if style_mode:
             fig.tight_layout(pad=0)
             fig.set_facecolor("dimgray")
-            plt.savefig("output/plots/" + f"{striter}.png")
         plt.savefig("output/plots/" + f"{striter}.png")
         plt.close()
 
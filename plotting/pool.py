@@ -0,0 +1,277 @@
+###################################################################
+#                                                                 #
+#     Contains the pool of processes rendering plots off the loop #
+#                                                                 #
+###################################################################
+
+import copy
+import multiprocessing as mp
+import numpy as np
+import queue
+import sys
+from multiprocessing.shared_memory import SharedMemory
+
+sys.path.append("..")
+from src.mesh import PsychoArray
+from plotting.frames import FrameRenderer, get_plot_primitives
+
+
+def make_plotter(
+    pmesh: PsychoArray,
+    method: str,
+    frame_format: str = "png",
+    primitives: np.ndarray = None,
+    video_fps: int = 24,
+):
+    """Returns the plotter drawing the frames with a plot method
+
+    matplotlib is only imported for the `imshow` and `contourf` methods,
+    the `frames` method writes raw colormapped images with `FrameRenderer`.
+
+    Parameters
+    ----------
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+    method : str
+        How the fields are drawn, `imshow`, `contourf` or `frames`
+    frame_format : str, optional
+        Format of the images written by the `frames` method
+    primitives : ndarray[float], optional
+        Primitives of the first frame, computed from Un when not given
+    video_fps : int, optional
+        Frames per second of the videos written by the `frames` method
+
+    Returns
+    -------
+    Plotter or FrameRenderer
+        The plotter, with `update`, `create_plot` and `close` methods
+
+    """
+
+    if method == "frames":
+        return FrameRenderer(pmesh, primitives, frame_format, video_fps)
+
+    from plotting.plotter import Plotter
+
+    return Plotter(pmesh, primitives, method)
+
+
+def _renderer(
+    pmesh: PsychoArray,
+    shm_name: str,
+    shape: tuple,
+    jobs: mp.Queue,
+    done: mp.Queue,
+    plot_options: tuple,
+    method: str,
+    frame_format: str,
+    video_fps: int,
+) -> None:
+    """Loop run by each renderer process until it receives None"""
+
+    shm = SharedMemory(name=shm_name)
+    slots = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+    # One plotter is kept for the whole run, so its figure is reused
+    plotter = make_plotter(pmesh, method, frame_format, slots[0], video_fps)
+
+    try:
+        while True:
+            job = jobs.get()
+
+            if job is None:
+                break
+
+            slot, iter, time, suffix = job
+
+            try:
+                plotter.update(slots[slot])
+                plotter.create_plot(*plot_options, iter, time, suffix)
+                done.put((slot, None))
+
+            except Exception as e:
+                done.put((slot, repr(e)))
+
+    finally:
+        plotter.close()
+        plotter = None
+        del slots
+        shm.close()
+
+
+class PlotPool:
+    """Renders the plots of a run in a pool of processes
+
+    `submit` writes the plotted primitives of a frame into a free slot of
+    an array in `multiprocessing.shared_memory` and returns, so the solver
+    does not wait for rendering. The renderers read the frame straight
+    from the slot and free it once the figure is saved, keeping the figure
+    for the next frame. When every slot holds a frame still waiting to be
+    rendered, the drop policy decides what happens to the new frame: `skip`
+    drops it and carries on, while `block` waits for a slot to be freed so
+    that no frame is lost.
+
+    Parameters
+    ----------
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+    nworkers : int
+        Number of renderer processes
+    nslots : int
+        Number of frames that can wait to be rendered
+    drop_policy : str
+        What to do with a frame when no slot is free, `skip` or `block`
+    plot_options : tuple
+        Variables to plot, labels, cmaps, stability name and style mode,
+        as passed to `Plotter.create_plot`
+    method : str, optional
+        How the fields are drawn, see `make_plotter`
+    frame_format : str, optional
+        Format of the images written by the `frames` method
+    video_fps : int, optional
+        Frames per second of the videos written by the `frames` method
+
+    Attributes
+    ----------
+    dropped : int
+        Number of frames skipped because no slot was free
+
+    """
+
+    def __init__(
+        self,
+        pmesh: PsychoArray,
+        nworkers: int,
+        nslots: int,
+        drop_policy: str,
+        plot_options: tuple,
+        method: str = "imshow",
+        frame_format: str = "png",
+        video_fps: int = 24,
+    ) -> None:
+
+        if nworkers < 1 or nslots < 1:
+            raise ValueError("Please use at least one renderer and one plot slot")
+
+        if drop_policy not in ["skip", "block"]:
+            raise ValueError("Please use an implemented plot drop policy")
+
+        self.ng = pmesh.ng
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+        nx1 = pmesh.Un.shape[-2] - 2 * self.ng
+        nx2 = pmesh.Un.shape[-1] - 2 * self.ng
+        shape = (nslots, 4, nx1, nx2)
+
+        self.shm = SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        self.slots = np.ndarray(shape, dtype=np.float64, buffer=self.shm.buf)
+
+        self.free = list(range(nslots))
+        self.error = None
+
+        # The renderers only need the grid, not the conserved variables
+        pgrid = copy.copy(pmesh)
+        pgrid.Un = None
+
+        # Renderers are started from a fresh server process rather than
+        # forked, as forking once the numba threading layer is running
+        # leaves the main process hanging at exit
+        ctx = mp.get_context("forkserver")
+
+        self.jobs = ctx.Queue()
+        self.done = ctx.Queue()
+
+        self.workers = []
+        for _ in range(nworkers):
+            worker = ctx.Process(
+                target=_renderer,
+                args=(
+                    pgrid,
+                    self.shm.name,
+                    shape,
+                    self.jobs,
+                    self.done,
+                    plot_options,
+                    method,
+                    frame_format,
+                    video_fps,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def _collect(self, block: bool) -> None:
+        """Frees the slots of rendered frames, waiting for one if `block`"""
+
+        while True:
+            try:
+                slot, error = self.done.get(block=block)
+            except queue.Empty:
+                return
+
+            self.free.append(slot)
+
+            if error is not None and self.error is None:
+                self.error = error
+
+            block = False
+
+    def submit(self, Un: np.ndarray, iter: int, time: float, suffix: str = "") -> bool:
+        """Hands a frame to the renderers
+
+        Parameters
+        ----------
+        Un : ndarray[float]
+            Conserved variables, the primitives are copied before returning
+        iter : int
+            The current iteration
+        time : float
+            The current time
+        suffix : str
+            Appended to the name of the saved figure
+
+        Returns
+        -------
+        bool
+            Whether the frame will be rendered, False if it was skipped
+
+        """
+
+        self._collect(block=False)
+
+        if self.error is not None:
+            raise RuntimeError(f"Rendering a plot failed: {self.error}")
+
+        if not self.free:
+            if self.drop_policy == "skip":
+                self.dropped += 1
+                return False
+
+            self._collect(block=True)
+
+        slot = self.free.pop()
+        get_plot_primitives(Un, self.ng, out=self.slots[slot])
+
+        self.jobs.put((slot, iter, time, suffix))
+
+        return True
+
+    def close(self) -> None:
+        """Waits for every frame to be rendered and stops the renderers"""
+
+        for _ in self.workers:
+            self.jobs.put(None)
+
+        for worker in self.workers:
+            worker.join()
+
+        self._collect(block=False)
+
+        del self.slots
+        self.shm.close()
+        self.shm.unlink()
+
+        if self.error is not None:
+            raise RuntimeError(f"Rendering a plot failed: {self.error}")
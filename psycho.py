@@ -1,34 +1,79 @@
-from src.input import PsychoInput
-from src.data_saver import PsychoOutput
-from src.pgen import kh
-from src.mesh import PsychoArray, get_interm_array
-from src.reconstruct import get_limited_slopes
-from src.tools import calculate_timestep, get_fluxes_2d
-from src.riemann import solve_riemann
-from plotting.plotter import Plotter
 import numpy as np
 import argparse
-
-parser = argparse.ArgumentParser()
-
-parser.add_argument(
-    "-p",
-    "--problem",
-    help="Problem name as specified in the problem generation file and input file",
-    type=str,
-)
-
-args = parser.parse_args()
-
-if __name__ == "__main__":
-
-    problem_name = args.problem
-
-    input_fname = f"inputs/{problem_name}.in"
+import multiprocessing as mp
+import os
+import time
+
+
+def run(
+    problem_name: str,
+    input_fname: str,
+    threads: int = None,
+    procs: int = None,
+    restart: str = None,
+    profile: bool = None,
+) -> None:
+    """Runs a simulation from an input file, or continues it from a checkpoint
+
+    Parameters
+    ----------
+    problem_name : str
+        Problem name as specified in the problem generation file
+    input_fname : str
+        Name of the input file
+    threads : int, optional
+        Number of threads used by the solver kernels, overrides num_threads
+        in the input file
+    procs : int, optional
+        Number of worker processes sharing the mesh, overrides num_procs
+        in the input file
+    restart : str, optional
+        Checkpoint file to continue from, in which case the problem and
+        input parameters are taken from the checkpoint
+    profile : bool, optional
+        Time the stages of the loop and report them at the end of the run,
+        overrides profile in the input file
+
+    """
+
+    # The solver is imported here rather than with this module, so the
+    # command line is parsed without loading numba and compiling the kernels
+    from src.input import PsychoInput
+    from src.data_saver import PsychoOutput
+    from src.pgen import kh
+    from src.mesh import PsychoArray, Workspace, generate_members
+    from src.step import (
+        muscl_hancock_step,
+        muscl_hancock_step_parallel,
+        muscl_hancock_step_ensemble,
+        muscl_hancock_step_ensemble_parallel,
+        muscl_hancock_staged_step,
+    )
+    from src.tools import calculate_timestep
+    from src.riemann import solve_riemann, solve_riemann_parallel, solve_riemann_numpy
+    from src.reconstruct import get_limiter
+    from src.jit import HAVE_NUMBA, MAX_NUM_THREADS, set_num_threads
+    from src.checkpoint import save_checkpoint, load_checkpoint
+    from src.writer import PsychoWriter
+    from src.diagnostics import PsychoDiagnostics
+    from src.profiler import PsychoProfiler
+    from plotting.frames import get_plot_primitives
+    from plotting.pool import PlotPool, make_plotter
 
     # Load input file parameters to be used in simulation setup
     pin = PsychoInput(input_fname=input_fname)
-    pin.parse_input_file()
+
+    # The output written after the checkpoint, from its iteration on, is
+    # removed on restart as the run writes it again
+    restart_iter = None
+
+    if restart is not None:
+        checkpoint = load_checkpoint(restart)
+        problem_name = checkpoint["problem_name"]
+        pin.value_dict = checkpoint["value_dict"]
+        restart_iter = checkpoint["iter"]
+    else:
+        pin.parse_input_file()
 
     # Initialize empty problem mesh
     pmesh = PsychoArray(pin, np.float64)
@@ -39,147 +84,526 @@ if __name__ == "__main__":
     else:
         raise ValueError("Please use an implemented problem type")
 
-    # Initialize data saving preferences
-    pout = PsychoOutput(input_fname=input_fname)
-    pout.data_preferences(pin)
+    # Number of realizations advanced together, each with its own output files
+    nens = pmesh.nens
 
-    # Initialize the simulation
-    problem_generator(pin, pmesh)
+    # Initialize data saving preferences, no fields are written when the
+    # data file type is none, e.g. when only the diagnostics are wanted
+    write_fields = pin.value_dict["data_file_type"] != "none"
+
+    pouts = []
+    for m in range(nens if write_fields else 0):
+        pout = PsychoOutput(input_fname=input_fname, suffix=f"_{m}" if nens > 1 else "")
+        pout.data_preferences(
+            pin, restart=restart is not None, restart_iter=restart_iter
+        )
+        pouts.append(pout)
+
+    # Output streams write a region of the domain, or a strided or averaged
+    # copy of it, at their own cadence alongside the full output
+    streams = [name.strip() for name in pin.value_dict.get("output_streams", [])]
+
+    outputs = list(enumerate(pouts))
+    for name in streams if write_fields else []:
+        for m in range(nens):
+            pout = PsychoOutput(
+                input_fname=input_fname,
+                suffix=f"_{name}_{m}" if nens > 1 else f"_{name}",
+            )
+            pout.data_preferences(
+                pin,
+                restart=restart is not None,
+                stream=name,
+                restart_iter=restart_iter,
+            )
+            outputs.append((m, pout))
+
+    # Diagnostics reduced from the fields during the run, each member
+    # writing its own time series
+    pdiags = []
+    if pin.value_dict.get("diagnostics"):
+        pdiags = [
+            PsychoDiagnostics(
+                pin,
+                pmesh,
+                suffix=f"_{m}" if nens > 1 else "",
+                restart=restart is not None,
+                restart_iter=restart_iter,
+            )
+            for m in range(nens)
+        ]
+
+    # Initialize the simulation, every member keeps its own time
+    if restart is not None:
+        pmesh.Un[...] = checkpoint["Un"]
+        t = checkpoint["t"]
+        iter = checkpoint["iter"]
+    else:
+        generate_members(problem_generator, pin, pmesh)
+        t = 0.0 if nens == 1 else np.zeros(nens)
+        iter = 0
 
-    # Initialize time to start loop
-    t = 0.0
     tmax = float(pin.value_dict["tmax"])
     cfl = float(pin.value_dict["CFL"])
     gamma = float(pin.value_dict["gamma"])
 
+    # Slope limiter used by every step kernel, minmod by default
+    limiter, beta = get_limiter(pin)
+
     print_freq = float(pin.value_dict["output_frequency"])
 
-    # Initialize scratch arrays for intermediate calculations
-    nx1 = pin.value_dict["nx1"]
-    nx2 = pin.value_dict["nx2"]
-    ng = pin.value_dict["ng"]
+    # Wall time in seconds between checkpoints, none are written when not given
+    checkpoint_interval = pin.value_dict.get("checkpoint_interval")
+    last_checkpoint = time.perf_counter()
+
+    # Initialize scratch array receiving the conserved variables at the next step
+    Unp1 = np.zeros_like(pmesh.Un)
+
+    # Without numba only the staged step with the numpy Riemann solver is usable
+    step_kernel = pin.value_dict.get("step_kernel", "fused" if HAVE_NUMBA else "staged")
+    riemann_backend = pin.value_dict.get(
+        "riemann_backend", "numba" if HAVE_NUMBA else "numpy"
+    )
+
+    if riemann_backend == "numba" and not HAVE_NUMBA:
+        raise ValueError("The numba Riemann backend requires numba to be installed")
+
+    if riemann_backend == "numpy" and step_kernel == "fused":
+        raise ValueError("The numpy Riemann backend requires step_kernel = staged")
+
+    # Select the kernels for the requested number of threads
+    num_threads = (
+        threads if threads is not None else pin.value_dict.get("num_threads", 1)
+    )
+
+    if num_threads < 1 or num_threads > MAX_NUM_THREADS:
+        raise ValueError(
+            f"Please use between 1 and {MAX_NUM_THREADS} threads "
+            "(the limit is set by NUMBA_NUM_THREADS, by default the number of cores)"
+        )
+
+    if num_threads > 1:
+        set_num_threads(num_threads)
+        fused_step = muscl_hancock_step_parallel
+        riemann_solver = solve_riemann_parallel
+    else:
+        fused_step = muscl_hancock_step
+        riemann_solver = solve_riemann
+
+    # Ensemble members can each take their own timestep or share the smallest
+    ensemble_dt = pin.value_dict.get("ensemble_dt", "own")
+
+    if ensemble_dt not in ["own", "shared"]:
+        raise ValueError("Please use an implemented ensemble timestep option")
+
+    if nens > 1:
+        if step_kernel != "fused":
+            raise ValueError("Running an ensemble requires step_kernel = fused")
+
+        if num_threads > 1:
+            fused_step = muscl_hancock_step_ensemble_parallel
+        else:
+            fused_step = muscl_hancock_step_ensemble
+
+    if riemann_backend == "numpy":
+        riemann_solver = solve_riemann_numpy
+
+    elif riemann_backend != "numba":
+        raise ValueError("Please use an implemented Riemann backend")
+
+    # Scratch arrays for the staged step are allocated once for the whole run
+    if step_kernel == "staged":
+        ws = Workspace(pmesh)
+
+    # Share the rows of the mesh out between worker processes
+    num_procs = procs if procs is not None else pin.value_dict.get("num_procs", 1)
+
+    if num_procs < 1:
+        raise ValueError("Please use at least one process")
+
+    if num_procs > 1:
+        if nens > 1:
+            raise ValueError("Please use a single process to run an ensemble")
+
+        if step_kernel != "fused":
+            raise ValueError(
+                "Running with several processes requires step_kernel = fused"
+            )
+
+        from src.decomposition import PsychoDecomposition
 
-    Unp1 = get_interm_array(4, nx1 + 2 * ng, nx2 + 2 * ng, np.float64)
+        pdecomp = PsychoDecomposition(pmesh, num_procs, cfl, gamma, limiter, beta)
 
-    U_i_j = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_ip1_j = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_im1_j = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_i_jp1 = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_i_jm1 = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
+    # Time spent in each stage of the loop, reported at the end of the run
+    if profile is None:
+        profile = bool(pin.value_dict.get("profile", 0))
 
-    U_i_L = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_i_R = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
+    profiler = PsychoProfiler(enabled=profile)
+    iter_start = iter
 
-    U_j_L = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_j_R = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
+    # Output is written by a background thread from this many snapshot
+    # buffers, or inline in the main loop when set to 0
+    output_buffers = pin.value_dict.get("output_buffers", 2)
 
-    U_i_L_bar = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_i_R_bar = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
+    if output_buffers < 0:
+        raise ValueError("Please use a non-negative number of output buffers")
 
-    U_j_L_bar = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
-    U_j_R_bar = get_interm_array(4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 2), np.float64)
+    if output_buffers > 0:
+        pwriter = PsychoWriter(
+            pouts, pmesh.Un.shape, pmesh.Un.dtype, output_buffers, profiler
+        )
 
-    U_l_i_riemann = get_interm_array(
-        4, nx1 + (2 * ng - 3), nx2 + (2 * ng - 2), np.float64
+    plot_options = (
+        pin.value_dict["variables_to_plot"],
+        pin.value_dict["labels"],
+        pin.value_dict["cmaps"],
+        pin.value_dict["stability_name"],
+        pin.value_dict["style_mode"],
     )
-    U_r_i_riemann = get_interm_array(
-        4, nx1 + (2 * ng - 3), nx2 + (2 * ng - 2), np.float64
+
+    # Plots are rendered by a pool of processes, or inline when set to 0.
+    # Daemonic processes, e.g. the workers of a sweep, cannot start their
+    # own, so they always plot inline
+    plot_workers = pin.value_dict.get("plot_workers", 1)
+
+    if mp.current_process().daemon:
+        plot_workers = 0
+
+    if plot_workers < 0:
+        raise ValueError("Please use a non-negative number of plot workers")
+
+    # Fields are drawn with imshow into a figure kept for the whole run, or
+    # with contourf into a new figure every frame
+    plot_method = pin.value_dict.get("plot_method", "imshow")
+    frame_format = pin.value_dict.get("frame_format", "png")
+    video_fps = pin.value_dict.get("video_fps", 24)
+
+    if plot_method not in ["imshow", "contourf", "frames"]:
+        raise ValueError("Please use an implemented plot method")
+
+    # The frames of a video have to be written in order by a single process
+    if (
+        plot_method == "frames"
+        and frame_format in ["video", "y4m"]
+        and plot_workers > 1
+    ):
+        raise ValueError("Please use at most one plot worker when writing videos")
+
+    if plot_workers > 0:
+        ppool = PlotPool(
+            pmesh,
+            plot_workers,
+            pin.value_dict.get("plot_slots", 2),
+            pin.value_dict.get("plot_drop_policy", "skip"),
+            plot_options,
+            plot_method,
+            frame_format,
+            video_fps,
+        )
+    else:
+        plotters = [
+            make_plotter(
+                pmesh.member(m), plot_method, frame_format, video_fps=video_fps
+            )
+            for m in range(nens)
+        ]
+
+    # Main simulation loop for MUSCL-Hancock Scheme
+    print(f"Iteration   |   Time   |   Timestep")
+
+    # The shared memory is released and the pending output written even if
+    # the run stops early
+    profiler.start()
+
+    try:
+        while np.any(t < tmax):
+
+            # Calculate timestep
+
+            with profiler.stage("timestep"):
+                if num_procs > 1:
+                    dt = pdecomp.calculate_timestep()
+                else:
+                    dt = calculate_timestep(pmesh, cfl, gamma)
+
+            if nens > 1:
+                if ensemble_dt == "shared":
+                    dt = np.full(nens, np.min(dt))
+
+                # Members which have reached tmax are advanced by a zero timestep
+                dt = np.where(t + dt > tmax, tmax - t, dt)
+
+            elif t + dt > tmax:
+                dt = tmax - t
+
+            # Enforce BCs
+
+            with profiler.stage("boundaries"):
+                pmesh.enforce_bcs(pin)
+
+            # Members of an ensemble which have reached tmax are only advanced
+            # by zero timesteps, so they are no longer saved, plotted or
+            # recorded
+            t_members = list(t) if nens > 1 else [t]
+            running = [t_m < tmax for t_m in t_members]
+
+            # Diagnostics of the state at time t, once its ghost cells are set
+            for m, pdiag in enumerate(pdiags):
+                if running[m] and iter % pdiag.frequency == 0:
+                    with profiler.stage("diagnostics"):
+                        pdiag.record(pmesh.member(m).Un, t[m] if nens > 1 else t, iter)
+
+            # Advance the conserved variables by one timestep, the stages of
+            # the fused and decomposed steps are compiled together so only
+            # the staged step is timed stage by stage
+            if num_procs > 1:
+                with profiler.stage("step"):
+                    pdecomp.step(dt)
+
+            elif step_kernel == "fused":
+                with profiler.stage("step"):
+                    fused_step(
+                        pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, Unp1, limiter, beta
+                    )
+                pmesh.Un, Unp1 = Unp1, pmesh.Un
+
+            elif step_kernel == "staged":
+                muscl_hancock_staged_step(
+                    pmesh.Un,
+                    dt,
+                    pmesh.dx1,
+                    pmesh.dx2,
+                    gamma,
+                    ws,
+                    riemann_solver,
+                    profiler,
+                    limiter,
+                    beta,
+                )
+
+            else:
+                raise ValueError("Please use an implemented step kernel")
+
+            # Save Data
+            due = [
+                (m, pout)
+                for m, pout in outputs
+                if running[m] and iter % pout.frequency == 0
+            ]
+
+            if due:
+                # With the writer thread, only handing the snapshot over is
+                # spent in the loop, while save_data is timed on the thread
+                if output_buffers > 0:
+                    with profiler.stage("output"):
+                        pwriter.submit(pmesh.Un, t_members, tmax, gamma, iter, due)
+                else:
+                    for m, pout in due:
+                        with profiler.stage("save_data"):
+                            pout.save_data(
+                                pmesh.member(m).Un, t_members[m], tmax, gamma, iter
+                            )
+
+            if iter % print_freq == 0:
+                #######################################
+                # Plot during the run
+                #######################################
+                with profiler.stage("plotting"):
+                    for m in range(nens):
+                        if not running[m]:
+                            continue
+
+                        t_m = t_members[m]
+                        suffix = f"_{m}" if nens > 1 else ""
+
+                        if plot_workers > 0:
+                            ppool.submit(pmesh.member(m).Un, iter, t_m, suffix)
+                        else:
+                            plotters[m].update(
+                                get_plot_primitives(pmesh.member(m).Un, pmesh.ng)
+                            )
+                            plotters[m].create_plot(*plot_options, iter, t_m, suffix)
+                #######################################
+                print(f"{iter}       {np.min(t)}       {np.min(dt)}")
+
+            t += dt
+            iter += 1
+
+            if (
+                checkpoint_interval is not None
+                and time.perf_counter() - last_checkpoint >= checkpoint_interval
+            ):
+                # Every snapshot before the checkpoint is written out first,
+                # so a restart from it finds them in the output files
+                if output_buffers > 0:
+                    pwriter.flush()
+
+                for _, pout in outputs:
+                    pout.flush()
+
+                save_checkpoint("checkpoint.npz", problem_name, pin, pmesh, t, iter)
+                last_checkpoint = time.perf_counter()
+
+    finally:
+        if num_procs > 1:
+            pdecomp.close()
+
+        if output_buffers > 0:
+            pwriter.close()
+
+        for _, pout in outputs:
+            pout.close()
+
+        for pdiag in pdiags:
+            pdiag.close()
+
+        if plot_workers > 0:
+            ppool.close()
+
+            if ppool.dropped > 0:
+                print(
+                    f"{ppool.dropped} plots were skipped as the renderers fell behind"
+                )
+        else:
+            for plotter in plotters:
+                plotter.close()
+
+        profiler.stop()
+
+        if profile:
+            cell_updates = pmesh.nx1 * pmesh.nx2 * nens * (iter - iter_start)
+
+            print(profiler.report(cell_updates))
+            profiler.save("profile", cell_updates)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "-p",
+        "--problem",
+        help="Problem name as specified in the problem generation file and input file",
+        type=str,
     )
 
-    U_l_j_riemann = get_interm_array(
-        4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 3), np.float64
+    parser.add_argument(
+        "-t",
+        "--threads",
+        help="Number of threads used by the solver kernels (overrides num_threads in the input file)",
+        type=int,
     )
-    U_r_j_riemann = get_interm_array(
-        4, nx1 + (2 * ng - 2), nx2 + (2 * ng - 3), np.float64
+
+    parser.add_argument(
+        "-n",
+        "--procs",
+        help="Number of worker processes sharing the mesh (overrides num_procs in the input file)",
+        type=int,
     )
 
-    # Main simulation loop for MUSCL-Hancock Scheme
-    iter = 0
-    print(f"Iteration   |   Time   |   Timestep")
-    while t < tmax:
+    parser.add_argument(
+        "-r",
+        "--restart",
+        help="Checkpoint file to continue the run from (the problem and input parameters are taken from it)",
+        type=str,
+    )
 
-        # Calculate timestep
+    parser.add_argument(
+        "--profile",
+        help="Time the stages of the loop and report them at the end of the run (overrides profile in the input file)",
+        action="store_true",
+        default=None,
+    )
 
-        dt = calculate_timestep(pmesh, cfl, gamma)
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory caching the compiled kernels (default NUMBA_CACHE_DIR, or __pycache__ next to the sources)",
+        type=str,
+    )
 
-        if t + dt > tmax:
-            dt = tmax - t
+    subparsers = parser.add_subparsers(dest="command")
 
-        # Enforce BCs
+    sweep_parser = subparsers.add_parser(
+        "sweep", help="Run every case of a parameter sweep on a pool of workers"
+    )
 
-        pmesh.enforce_bcs(pin)
+    sweep_parser.add_argument(
+        "sweep_file",
+        help="Sweep file giving the base input file and the values of the parameters",
+        type=str,
+    )
 
-        # Data Reconstruction
+    sweep_parser.add_argument(
+        "-w",
+        "--workers",
+        help="Number of worker processes running the cases",
+        type=int,
+        default=1,
+    )
 
-        # Getting arrays with shifted indices to calculate slopes
-        U_i_j = pmesh.Un[:, 1:-1, 1:-1]
-        U_ip1_j = pmesh.Un[:, 2:, 1:-1]
-        U_im1_j = pmesh.Un[:, :-2, 1:-1]
-        U_i_jp1 = pmesh.Un[:, 1:-1, 2:]
-        U_i_jm1 = pmesh.Un[:, 1:-1, :-2]
+    sweep_parser.add_argument(
+        "-o",
+        "--output",
+        help="Directory receiving the cases and the index (default sweeps/<sweep file name>)",
+        type=str,
+    )
 
-        delta_i, delta_j = get_limited_slopes(
-            U_i_j, U_ip1_j, U_im1_j, U_i_jp1, U_i_jm1, beta=1.0
-        )
+    warmup_parser = subparsers.add_parser(
+        "warmup",
+        help="Compile the kernels used by the built-in problems into the cache",
+    )
+
+    warmup_parser.add_argument(
+        "problems",
+        help="Problems to compile the kernels of (default all of them)",
+        nargs="*",
+        type=str,
+    )
+
+    args = parser.parse_args()
+
+    if args.cache_dir is not None:
+        from src.jit import set_cache_dir
 
-        # Evolution step
-        # Boundary extrapolated values
-        U_i_L = U_i_j - 1 / 2 * delta_i
-        U_i_R = U_i_j + 1 / 2 * delta_i
-        U_j_L = U_i_j - 1 / 2 * delta_j
-        U_j_R = U_i_j + 1 / 2 * delta_j
-
-        # Advance by half timestep
-        F_i_L = get_fluxes_2d(U_i_L, gamma, "x")
-        F_i_R = get_fluxes_2d(U_i_R, gamma, "x")
-        G_j_L = get_fluxes_2d(U_j_L, gamma, "y")
-        G_j_R = get_fluxes_2d(U_j_R, gamma, "y")
-
-        int_flux = 1 / 2 * dt / pmesh.dx1 * (F_i_L - F_i_R) + 1 / 2 * dt / pmesh.dx2 * (
-            G_j_L - G_j_R
+        set_cache_dir(args.cache_dir)
+
+    if args.command == "warmup":
+        from src.jit import HAVE_NUMBA, cache_dir
+        from src.warmup import warmup
+
+        timings = warmup(args.problems or None)
+
+        if HAVE_NUMBA:
+            print(f"Kernels          |   Time (s)")
+            for group, seconds in timings.items():
+                print(f"{group:<16} |   {seconds:.3f}")
+
+            print(f"Kernels cached in {cache_dir()}")
+        else:
+            print("Numba is not installed, there are no kernels to compile")
+
+    elif args.command == "sweep":
+        from src.sweep import run_sweep
+
+        output_dir = args.output or os.path.join(
+            "sweeps", os.path.splitext(os.path.basename(args.sweep_file))[0]
         )
+        index = run_sweep(args.sweep_file, run, args.workers, output_dir)
 
-        U_i_L += int_flux
-        U_i_R += int_flux
-        U_j_L += int_flux
-        U_j_R += int_flux
-
-        # Riemann Problem
-        # Set up Riemann states
-        U_l_i_riemann = U_i_R[:, :-1, :]
-        U_r_i_riemann = U_i_L[:, 1:, :]
-        U_l_j_riemann = U_j_R[:, :, :-1]
-        U_r_j_riemann = U_j_L[:, :, 1:]
-
-        # Do the solve
-        F = solve_riemann(U_l_i_riemann, U_r_i_riemann, gamma, "x")
-        G = solve_riemann(U_l_j_riemann, U_r_j_riemann, gamma, "y")
-
-        # Conservative update
-        pmesh.Un[:, 2:-2, 2:-2] += dt / pmesh.dx1 * (
-            F[:, :-1, 1:-1] - F[:, 1:, 1:-1]
-        ) + dt / pmesh.dx2 * (G[:, 1:-1, :-1] - G[:, 1:-1, 1:])
-
-        # Save Data
-        if iter % print_freq == 0:
-            pout.save_data(pmesh.Un, t, tmax, gamma, iter)
-
-        if iter % print_freq == 0:
-            #######################################
-            # Plot during the run
-            #######################################
-            plotter = Plotter(pmesh)
-            plotter.create_plot(
-                pin.value_dict["variables_to_plot"],
-                pin.value_dict["labels"],
-                pin.value_dict["cmaps"],
-                pin.value_dict["stability_name"],
-                pin.value_dict["style_mode"],
-                iter,
-                t,
-            )
-            #######################################
-            print(f"{iter}       {t}       {dt}")
+        print(f"Case   |   Wall time   |   Status")
+        for row in index:
+            print(f"{row['case']}       {row['wall_time']:.3f}       {row['status']}")
+
+    elif args.problem is None and args.restart is None:
+        parser.error("Please give the problem name with -p, or a checkpoint with -r")
 
-        t += dt
-        iter += 1
+    else:
+        run(
+            args.problem,
+            f"inputs/{args.problem}.in" if args.problem is not None else None,
+            args.threads,
+            args.procs,
+            args.restart,
+            args.profile,
+        )
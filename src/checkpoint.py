@@ -0,0 +1,116 @@
+###################################################################
+#                                                                 #
+#    Contains functions for checkpointing and restarting a run    #
+#                                                                 #
+###################################################################
+
+import json
+import numpy as np
+import os
+import sys
+from typing import Union
+
+sys.path.append("..")
+from src.input import PsychoInput
+from src.mesh import PsychoArray
+
+
+def save_checkpoint(
+    checkpoint_fname: str,
+    problem_name: str,
+    pin: PsychoInput,
+    pmesh: PsychoArray,
+    t: Union[float, np.ndarray],
+    iter: int,
+) -> None:
+    """Saves the full state of the solver to a checkpoint file
+
+    The conserved variables (ghost cells included), time, iteration, state
+    of the `np.random` generator and parsed input are written with
+    `np.savez` to a temporary file, which then replaces the checkpoint file.
+    A run stopped while writing therefore leaves the previous checkpoint
+    intact.
+
+    Parameters
+    ----------
+    checkpoint_fname : str
+        The name of the checkpoint file
+    problem_name : str
+        Problem name as specified in the problem generation file
+    pin : PsychoInput
+        Contains the problem information stored in the PsychoInput
+        object
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+        and the conserved variables Un
+    t : Union[float, ndarray]
+        The current time, or the time of every ensemble member
+    iter : int
+        The current iteration
+
+    """
+
+    rng_name, rng_keys, rng_pos, rng_has_gauss, rng_gauss = np.random.get_state()
+
+    tmp_fname = checkpoint_fname + ".tmp"
+
+    with open(tmp_fname, "wb") as f:
+        np.savez(
+            f,
+            Un=pmesh.Un,
+            t=t,
+            iter=iter,
+            problem_name=problem_name,
+            value_dict=json.dumps(pin.value_dict),
+            rng_name=rng_name,
+            rng_keys=rng_keys,
+            rng_pos=rng_pos,
+            rng_has_gauss=rng_has_gauss,
+            rng_gauss=rng_gauss,
+        )
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_fname, checkpoint_fname)
+
+
+def load_checkpoint(checkpoint_fname: str) -> dict:
+    """Loads the state of the solver from a checkpoint file
+
+    The state of the `np.random` generator is restored as well, so that a
+    restarted run continues exactly as the original one would have.
+
+    Parameters
+    ----------
+    checkpoint_fname : str
+        The name of the checkpoint file
+
+    Returns
+    -------
+    dict
+        The conserved variables `Un`, time `t`, iteration `iter`,
+        `problem_name` and parsed input `value_dict`
+
+    """
+
+    with np.load(checkpoint_fname) as data:
+
+        np.random.set_state(
+            (
+                str(data["rng_name"]),
+                data["rng_keys"],
+                int(data["rng_pos"]),
+                int(data["rng_has_gauss"]),
+                float(data["rng_gauss"]),
+            )
+        )
+
+        t = data["t"]
+
+        return {
+            "Un": data["Un"],
+            "t": float(t) if t.ndim == 0 else t,
+            "iter": int(data["iter"]),
+            "problem_name": str(data["problem_name"]),
+            "value_dict": json.loads(str(data["value_dict"])),
+        }
@@ -7,8 +7,16 @@ sys.path.append("../..")
 import src.mesh
 import src.input
 from src.tools import get_primitive_variables_2d
+import io
+import json
 import numpy as np
-import h5py
+import os
+import zlib
+from typing import TYPE_CHECKING
+
+# h5py is only imported for the hdf5 output, and for type checking
+if TYPE_CHECKING:
+    import h5py
 
 
 class PsychoOutput:
@@ -22,16 +30,27 @@ class PsychoOutput:
     input_fname : str
         File name for the output file
 
+    suffix : str
+        Appended to the names of the output files, e.g. to keep the
+        members of an ensemble apart
+
     """
 
-    def __init__(self, input_fname: str):
+    def __init__(self, input_fname: str, suffix: str = ""):
 
         self.input_fname = input_fname
+        self.suffix = suffix
 
         # Dictionary containing all problem information
         self.value_dict = dict()
 
-    def data_preferences(self, pin: src.input.PsychoInput) -> None:
+    def data_preferences(
+        self,
+        pin: src.input.PsychoInput,
+        restart: bool = False,
+        stream: str = None,
+        restart_iter: int = None,
+    ) -> None:
         """
         This function is called in `psycho.py` and sets the data preferences
         specified in the problem input (pin).
@@ -42,67 +61,554 @@ class PsychoOutput:
             Contains the problem information stored in the PsychoInput
             object
 
+        restart : bool
+            Append to the existing output files of a restarted run instead
+            of starting them again
+
+        stream : str, optional
+            Name of an output stream listed in `output_streams`, which writes
+            the region, stride and cadence set by its `<stream>_*` keys
+            instead of the full domain
+
+        restart_iter : int, optional
+            Iteration of the checkpoint a run is restarted from. The
+            snapshots of this and later iterations were written after the
+            checkpoint and are removed from the output files, as the
+            restarted run writes them again
+
         """
 
-        self.Nx = pin.value_dict["nx1"]
+        self.ng = pin.value_dict["ng"]
 
-        self.Ny = pin.value_dict["nx2"]
+        self._set_region(pin, stream)
 
         self.shape = (self.Nx, self.Ny)
 
         # Get output variables as a list
         self.variables = pin.value_dict["output_variables"]
 
-        # Get output frequency
-        self.frequency = pin.value_dict["output_frequency"]
+        # Get output frequency, in iterations
+        self.frequency = int(float(pin.value_dict["output_frequency"]))
+
+        if stream is not None:
+            self.frequency = pin.value_dict.get(f"{stream}_frequency", self.frequency)
+
+        if self.frequency < 1:
+            raise ValueError("Please use a positive output frequency")
 
         # Get output file type
         self.file_type = pin.value_dict["data_file_type"]
 
         self.file_type_check = 0
 
+        mode = "a" if restart else "w"
+
         if "txt" in self.file_type:
 
-            self.density_file = open("density.txt", "w").close()
-            self.xvelocity_file = open("x-velocity.txt", "w").close()
-            self.yvelocity_file = open("y-velocity.txt", "w").close()
-            self.pressure_file = open("pressure.txt", "w").close()
-            self.iter_time_file = open("iter_time.txt", "w").close()
+            if restart and restart_iter is not None:
+                self._trim_text("txt", restart_iter)
 
-            self.density_file = open("density.txt", "w")
-            self.xvelocity_file = open("x-velocity.txt", "w")
-            self.yvelocity_file = open("y-velocity.txt", "w")
-            self.pressure_file = open("pressure.txt", "w")
-            self.iter_time_file = open("iter_time.txt", "w")
+            self.density_file = open(f"density{self.suffix}.txt", mode).close()
+            self.xvelocity_file = open(f"x-velocity{self.suffix}.txt", mode).close()
+            self.yvelocity_file = open(f"y-velocity{self.suffix}.txt", mode).close()
+            self.pressure_file = open(f"pressure{self.suffix}.txt", mode).close()
+            self.iter_time_file = open(f"iter_time{self.suffix}.txt", mode).close()
+
+            self.density_file = open(f"density{self.suffix}.txt", mode)
+            self.xvelocity_file = open(f"x-velocity{self.suffix}.txt", mode)
+            self.yvelocity_file = open(f"y-velocity{self.suffix}.txt", mode)
+            self.pressure_file = open(f"pressure{self.suffix}.txt", mode)
+            self.iter_time_file = open(f"iter_time{self.suffix}.txt", mode)
 
             self.file_type_check = 1
 
         if "csv" in self.file_type:
 
-            self.density_file = open("density.csv", "w").close()
-            self.xvelocity_file = open("x-velocity.csv", "w").close()
-            self.yvelocity_file = open("y-velocity.csv", "w").close()
-            self.pressure_file = open("pressure.csv", "w").close()
-            self.iter_time_file = open("iter_time.csv", "w").close()
+            if restart and restart_iter is not None:
+                self._trim_text("csv", restart_iter)
+
+            self.density_file = open(f"density{self.suffix}.csv", mode).close()
+            self.xvelocity_file = open(f"x-velocity{self.suffix}.csv", mode).close()
+            self.yvelocity_file = open(f"y-velocity{self.suffix}.csv", mode).close()
+            self.pressure_file = open(f"pressure{self.suffix}.csv", mode).close()
+            self.iter_time_file = open(f"iter_time{self.suffix}.csv", mode).close()
 
-            self.density_file = open("density.csv", "w")
-            self.xvelocity_file = open("x-velocity.csv", "w")
-            self.yvelocity_file = open("y-velocity.csv", "w")
-            self.pressure_file = open("pressure.csv", "w")
-            self.iter_time_file = open("iter_time.csv", "w")
+            self.density_file = open(f"density{self.suffix}.csv", mode)
+            self.xvelocity_file = open(f"x-velocity{self.suffix}.csv", mode)
+            self.yvelocity_file = open(f"y-velocity{self.suffix}.csv", mode)
+            self.pressure_file = open(f"pressure{self.suffix}.csv", mode)
+            self.iter_time_file = open(f"iter_time{self.suffix}.csv", mode)
 
             self.file_type_check = 2
 
         if "hdf5" in self.file_type:
 
+            # h5py is only imported for the hdf5 output
+            import h5py
+
+            # A single file holds the whole run, each variable is a dataset of
+            # shape (ntime, nx1, nx2) extended by one snapshot per output
+            self.f = h5py.File(f"data{self.suffix}.hdf5", mode)
+
+            compression = pin.value_dict.get("hdf5_compression", "none")
+
+            if compression not in ["none", "gzip", "lzf"]:
+                raise ValueError("Please use an implemented HDF5 compression")
+
+            options = dict(shuffle=bool(pin.value_dict.get("hdf5_shuffle", 0)))
+
+            if compression != "none":
+                options["compression"] = compression
+
+            if compression == "gzip":
+                options["compression_opts"] = pin.value_dict.get(
+                    "hdf5_compression_level", 4
+                )
+
+            # Cells of the domain held in the datasets
+            self.f.attrs["index_box"] = self.box
+            self.f.attrs["stride"] = self.stride
+            self.f.attrs["average"] = self.average
+
+            self.dset_time = self._get_dataset("time", ())
+            self.dset_iter = self._get_dataset("iter", (), dtype=np.int64)
+
+            if restart and restart_iter is not None:
+                nsnap = int(np.count_nonzero(self.dset_iter[:] < restart_iter))
+
+                for name in self.f:
+                    if self.f[name].shape[0] > nsnap:
+                        self.f[name].resize(nsnap, axis=0)
+
+            if "x-velocity" in self.variables:
+                self.dset_xvelocity = self._get_dataset(
+                    "xvelocity", self.shape, **options
+                )
+
+            if "y-velocity" in self.variables:
+                self.dset_yvelocity = self._get_dataset(
+                    "yvelocity", self.shape, **options
+                )
+
+            if "density" in self.variables:
+                self.dset_density = self._get_dataset("density", self.shape, **options)
+
+            if "pressure" in self.variables:
+                self.dset_pressure = self._get_dataset(
+                    "pressure", self.shape, **options
+                )
+
             self.file_type_check = 3
 
+        if "npymmap" in self.file_type:
+
+            # A single .npy store of shape (nsnap, nvar, nx1, nx2) written in
+            # place through a memmap, grown by `npymmap_chunk` snapshots when
+            # full, with the times and iterations kept in a JSON header
+            self.npy_fname = f"data{self.suffix}.npy"
+            self.json_fname = f"data{self.suffix}.json"
+
+            self.chunk = pin.value_dict.get("npymmap_chunk", 16)
+
+            if self.chunk < 1:
+                raise ValueError("Please use a positive npymmap chunk")
+
+            self.store_variables = [
+                var
+                for var in ["x-velocity", "y-velocity", "density", "pressure"]
+                if var in self.variables
+            ]
+
+            header = None
+
+            if restart and os.path.isfile(self.json_fname):
+
+                with open(self.json_fname) as f:
+                    header = json.load(f)
+
+                # Snapshots written after the checkpoint are dropped, the
+                # store beyond them is written over
+                if restart_iter is not None:
+                    nsnap = sum(iter < restart_iter for iter in header["iters"])
+                    header["times"] = header["times"][:nsnap]
+                    header["iters"] = header["iters"][:nsnap]
+
+            # A store without snapshots is started again rather than mapped
+            if header is not None and header["times"]:
+
+                if header["variables"] != self.store_variables or tuple(
+                    header["shape"]
+                ) != (self.Nx, self.Ny):
+                    raise ValueError(
+                        "Please restart with the output variables and mesh of the run"
+                    )
+
+                self.times = header["times"]
+                self.iters = header["iters"]
+                self.mmap = np.load(self.npy_fname, mmap_mode="r+")
+                self._write_store_header()
+
+            else:
+
+                self.times = []
+                self.iters = []
+                self.mmap = np.lib.format.open_memmap(
+                    self.npy_fname,
+                    mode="w+",
+                    dtype=np.float64,
+                    shape=(self.chunk, len(self.store_variables), self.Nx, self.Ny),
+                )
+
+            self.file_type_check = 4
+
+        if "lossy" in self.file_type:
+
+            # Snapshots are appended to data.psz, each as a line of JSON
+            # describing its fields followed by the encoded fields
+            self.codec = LossyCodec(
+                pin.value_dict.get("lossy_abs_error", 0.0),
+                pin.value_dict.get("lossy_rel_error", 0.0),
+                pin.value_dict.get("lossy_keyframe", 10),
+            )
+
+            if restart and restart_iter is not None:
+                self._trim_lossy(f"data{self.suffix}.psz", restart_iter)
+
+            self.lossy_file = open(f"data{self.suffix}.psz", mode + "b")
+
+            self.file_type_check = 5
+
         if self.file_type_check == 0:
 
             raise ValueError(
                 "No correctly spelled output file type specified in input."
             )
 
+    @staticmethod
+    def _truncate_lines(fname: str, nlines: int) -> None:
+        """Truncates a text file after its first `nlines` lines"""
+
+        if not os.path.isfile(fname):
+            return
+
+        with open(fname, "r+b") as f:
+            for _ in range(nlines):
+                if not f.readline():
+                    break
+
+            f.truncate()
+
+    def _trim_text(self, ext: str, restart_iter: int) -> None:
+        """Removes the snapshots from `restart_iter` on from the text files
+
+        Each snapshot is a row of the iteration and time file and a line per
+        column of the output region in the file of each variable.
+
+        """
+
+        nsnap = 0
+
+        if os.path.isfile(f"iter_time{self.suffix}.{ext}"):
+
+            with open(f"iter_time{self.suffix}.{ext}") as f:
+                for line in f:
+                    if int(line.replace(",", " ").split()[0]) >= restart_iter:
+                        break
+
+                    nsnap += 1
+
+        self._truncate_lines(f"iter_time{self.suffix}.{ext}", nsnap)
+
+        for var in ["density", "x-velocity", "y-velocity", "pressure"]:
+            nlines = nsnap * self.Ny if var in self.variables else 0
+            self._truncate_lines(f"{var}{self.suffix}.{ext}", nlines)
+
+    @staticmethod
+    def _trim_lossy(fname: str, restart_iter: int) -> None:
+        """Removes the snapshots from `restart_iter` on from the lossy file"""
+
+        if not os.path.isfile(fname):
+            return
+
+        with open(fname, "r+b") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+
+                if not line:
+                    break
+
+                record = json.loads(line)
+
+                if record["iter"] >= restart_iter:
+                    f.seek(offset)
+                    f.truncate()
+                    break
+
+                for meta in record["fields"]:
+                    f.seek(meta["nbytes"], os.SEEK_CUR)
+
+    def _set_region(self, pin: src.input.PsychoInput, stream: str) -> None:
+        """Sets the cells written by the output
+
+        The full domain is written unless `stream` is given, in which case
+        the cells are limited to `<stream>_index_box`, a list of the first
+        and one past the last interior cell in x1 and x2, or `<stream>_box`,
+        a list of the x1 and x2 bounds of the cell centres to keep. The box
+        is then thinned to every `<stream>_stride` cells in each direction,
+        or averaged over blocks of that many cells when `<stream>_average`
+        is 1.
+
+        """
+
+        nx1 = pin.value_dict["nx1"]
+        nx2 = pin.value_dict["nx2"]
+
+        box = [0, nx1, 0, nx2]
+        self.stride = 1
+        self.average = 0
+
+        if stream is not None:
+
+            if f"{stream}_index_box" in pin.value_dict:
+                box = [int(i) for i in pin.value_dict[f"{stream}_index_box"]]
+
+            elif f"{stream}_box" in pin.value_dict:
+                x1lo, x1hi, x2lo, x2hi = pin.value_dict[f"{stream}_box"]
+
+                dx1 = (pin.value_dict["x1max"] - pin.value_dict["x1min"]) / nx1
+                dx2 = (pin.value_dict["x2max"] - pin.value_dict["x2min"]) / nx2
+
+                # Cells whose centres lie inside the box
+                box = [
+                    int(np.ceil((x1lo - pin.value_dict["x1min"]) / dx1 - 0.5)),
+                    int(np.floor((x1hi - pin.value_dict["x1min"]) / dx1 - 0.5)) + 1,
+                    int(np.ceil((x2lo - pin.value_dict["x2min"]) / dx2 - 0.5)),
+                    int(np.floor((x2hi - pin.value_dict["x2min"]) / dx2 - 0.5)) + 1,
+                ]
+                box = [
+                    min(max(box[0], 0), nx1),
+                    min(max(box[1], 0), nx1),
+                    min(max(box[2], 0), nx2),
+                    min(max(box[3], 0), nx2),
+                ]
+
+            self.stride = pin.value_dict.get(f"{stream}_stride", 1)
+            self.average = pin.value_dict.get(f"{stream}_average", 0)
+
+        if not (0 <= box[0] < box[1] <= nx1 and 0 <= box[2] < box[3] <= nx2):
+            raise ValueError("Please use an output box inside the domain")
+
+        if self.stride < 1:
+            raise ValueError("Please use a positive output stride")
+
+        self.box = box
+        self.window = (
+            slice(self.ng + box[0], self.ng + box[1]),
+            slice(self.ng + box[2], self.ng + box[3]),
+        )
+
+        if self.average:
+            self.Nx = (box[1] - box[0]) // self.stride
+            self.Ny = (box[3] - box[2]) // self.stride
+
+            if self.Nx == 0 or self.Ny == 0:
+                raise ValueError("Please use an output stride no larger than the box")
+
+        else:
+            self.Nx = len(range(box[0], box[1], self.stride))
+            self.Ny = len(range(box[2], box[3], self.stride))
+
+    def _extract(self, field: np.ndarray) -> np.ndarray:
+        """Returns a copy of the region of a field written by the output"""
+
+        box = field[self.window]
+        s = self.stride
+
+        if self.average:
+            box = box[: self.Nx * s, : self.Ny * s]
+            return box.reshape(self.Nx, s, self.Ny, s).mean(axis=(1, 3))
+
+        return box[::s, ::s].copy()
+
+    def _get_dataset(
+        self, name: str, shape: tuple, dtype: np.dtype = np.float64, **options
+    ) -> "h5py.Dataset":
+        """Returns a time series dataset of the HDF5 file, creating it if needed
+
+        The dataset has shape (ntime, *shape) and is chunked per snapshot.
+        The datasets of a restarted run already exist and are appended to.
+
+        """
+
+        if name in self.f:
+            return self.f[name]
+
+        return self.f.create_dataset(
+            name,
+            shape=(0, *shape),
+            maxshape=(None, *shape),
+            chunks=(1, *shape) if shape else (1024,),
+            dtype=dtype,
+            **options,
+        )
+
+    def _append(self, dset: "h5py.Dataset", data) -> None:
+        """Appends a snapshot to a time series dataset"""
+
+        n = dset.shape[0]
+        dset.resize(n + 1, axis=0)
+        dset[n] = data
+
+    def _resize_store(self, nsnap: int) -> None:
+        """Resizes the .npy store to hold `nsnap` snapshots
+
+        The header of the file is rewritten in place with the new shape and
+        the file is extended or truncated, so the snapshots already written
+        are not copied. numpy pads the header so that its length does not
+        depend on the number of snapshots; should it change, the store is
+        copied into a new file instead.
+
+        """
+
+        shape = (nsnap, *self.mmap.shape[1:])
+        offset = self.mmap.offset
+        dtype = self.mmap.dtype
+
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(
+            header,
+            {
+                "descr": np.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": shape,
+            },
+        )
+
+        self.mmap.flush()
+
+        if header.tell() == offset:
+
+            self.mmap = None
+
+            with open(self.npy_fname, "r+b") as f:
+                f.write(header.getvalue())
+                f.truncate(offset + int(np.prod(shape)) * dtype.itemsize)
+
+            if nsnap > 0:
+                self.mmap = np.memmap(
+                    self.npy_fname, dtype=dtype, mode="r+", offset=offset, shape=shape
+                )
+
+            return
+
+        nold = min(len(self.times), nsnap)
+
+        tmp_fname = self.npy_fname + ".tmp"
+        new = np.lib.format.open_memmap(tmp_fname, mode="w+", dtype=dtype, shape=shape)
+        new[:nold] = self.mmap[:nold]
+        new.flush()
+        del new
+
+        self.mmap = None
+        os.replace(tmp_fname, self.npy_fname)
+
+        if nsnap > 0:
+            self.mmap = np.load(self.npy_fname, mmap_mode="r+")
+
+    def _write_store_header(self) -> None:
+        """Writes the JSON header of the .npy store, replacing the old one"""
+
+        tmp_fname = self.json_fname + ".tmp"
+
+        with open(tmp_fname, "w") as f:
+            json.dump(
+                {
+                    "variables": self.store_variables,
+                    "shape": [self.Nx, self.Ny],
+                    "index_box": self.box,
+                    "stride": self.stride,
+                    "average": self.average,
+                    "times": self.times,
+                    "iters": self.iters,
+                },
+                f,
+            )
+
+        os.replace(tmp_fname, self.json_fname)
+
+    def flush(self) -> None:
+        """Writes the buffered output to the files, e.g. before a checkpoint"""
+
+        if self.file_type_check == 3:
+
+            self.f.flush()
+
+        elif self.file_type_check == 4:
+
+            if self.mmap is not None:
+                self.mmap.flush()
+
+        elif self.file_type_check == 5:
+
+            self.lossy_file.flush()
+
+        elif self.file_type_check in [1, 2]:
+
+            self.density_file.flush()
+            self.xvelocity_file.flush()
+            self.yvelocity_file.flush()
+            self.pressure_file.flush()
+            self.iter_time_file.flush()
+
+    def close(self) -> None:
+        """Closes the output files, called at the end of the run"""
+
+        if self.file_type_check == 3:
+
+            self.f.close()
+
+        elif self.file_type_check == 4:
+
+            if self.mmap is not None:
+                # The store is trimmed to the snapshots written
+                self._resize_store(len(self.times))
+                self.mmap = None
+
+        elif self.file_type_check == 5:
+
+            if not self.lossy_file.closed:
+                self.lossy_file.close()
+
+                print(
+                    f"Lossy output compressed {self.codec.ratio:.1f} times, "
+                    f"maximum error {self.codec.max_error:.3g}"
+                )
+
+        elif self.file_type_check in [1, 2]:
+
+            self.density_file.close()
+            self.xvelocity_file.close()
+            self.yvelocity_file.close()
+            self.pressure_file.close()
+            self.iter_time_file.close()
+
+    def _write_text(self, f, field: np.ndarray, delimiter: str) -> None:
+        """Writes a field as text in a single call
+
+        Each line holds one column of the field, from the last to the first,
+        with every value formatted as `str` does and followed by the
+        delimiter.
+
+        """
+
+        f.write(
+            "".join(
+                delimiter.join(map(repr, column)) + delimiter + "\n"
+                for column in field.T[::-1].tolist()
+            )
+        )
+
     def save_data(
         self,
         pmesh: src.mesh.PsychoArray,
@@ -123,7 +629,8 @@ class PsychoOutput:
             The current time
 
         tmax : float
-            The maximum time or the time the simulations runs until
+            The maximum time or the time the simulations runs until. The
+            files stay open until `close` is called at the end of the run
 
         gamma : float
             Specific heat ratio
@@ -146,10 +653,19 @@ class PsychoOutput:
 
         if self.file_type_check == 3:
 
-            file_name = str(iter)
-            self.f = h5py.File(f"iter_{file_name}.hdf5", "w")
+            self._append(self.dset_time, t)
+            self._append(self.dset_iter, iter)
 
-            self.dset_time = self.f.create_dataset("time_dataset", data=t)
+        if self.file_type_check == 4:
+
+            if len(self.times) == self.mmap.shape[0]:
+                self._resize_store(len(self.times) + self.chunk)
+
+            snap = self.mmap[len(self.times)]
+
+        if self.file_type_check == 5:
+
+            fields = []
 
         rho, u, v, p = get_primitive_variables_2d(pmesh, gamma)
 
@@ -159,177 +675,349 @@ class PsychoOutput:
 
             var_check = 1
 
-            self.xvelocity = np.empty(self.shape, dtype=float)
+            self.xvelocity = self._extract(u)
 
-            for j in reversed(range(u.shape[0] - 4)):
+            if self.file_type_check == 1:  # writing to txt file
+                self._write_text(self.xvelocity_file, self.xvelocity, " ")
 
-                for i in range(u.shape[1] - 4):
+            if self.file_type_check == 2:  # writing to csv file
+                self._write_text(self.xvelocity_file, self.xvelocity, ",")
 
-                    self.xvelocity[i][j] = u[i + 2][j + 2]
+            if self.file_type_check == 3:  # writing to hdf5 file
 
-            if self.file_type_check == 1:  # writing to txt file
+                self._append(self.dset_xvelocity, self.xvelocity)
 
-                for j in reversed(range(self.xvelocity.shape[0])):
+            if self.file_type_check == 4:  # write to npy store
+                snap[self.store_variables.index("x-velocity")] = self.xvelocity
 
-                    for i in range(self.xvelocity.shape[1]):
+            if self.file_type_check == 5:  # write to lossy file
+                fields.append(self.codec.encode("xvelocity", self.xvelocity))
 
-                        self.xvelocity_file.write(str(self.xvelocity[i][j]))
-                        self.xvelocity_file.write(" ")
+        if "y-velocity" in self.variables:
 
-                    self.xvelocity_file.write("\n")
+            var_check = 1
 
-            if self.file_type_check == 2:  # writing to csv file
+            self.yvelocity = self._extract(v)
 
-                for j in reversed(range(self.xvelocity.shape[0])):
+            if self.file_type_check == 1:  # write to txt
+                self._write_text(self.yvelocity_file, self.yvelocity, " ")
 
-                    for i in range(self.xvelocity.shape[1]):
+            if self.file_type_check == 2:  # write to csv file
+                self._write_text(self.yvelocity_file, self.yvelocity, ",")
 
-                        self.xvelocity_file.write(str(self.xvelocity[i][j]))
-                        self.xvelocity_file.write(",")
+            if self.file_type_check == 3:  # write to hdf5
 
-                    self.xvelocity_file.write("\n")
+                self._append(self.dset_yvelocity, self.yvelocity)
 
-            if self.file_type_check == 3:  # writing to hdf5 file
+            if self.file_type_check == 4:  # write to npy store
+                snap[self.store_variables.index("y-velocity")] = self.yvelocity
 
-                self.dset_xvelocity = self.f.create_dataset(
-                    "xvelocity_dataset", data=self.xvelocity
-                )
+            if self.file_type_check == 5:  # write to lossy file
+                fields.append(self.codec.encode("yvelocity", self.yvelocity))
 
-        if "y-velocity" in self.variables:
+        if "density" in self.variables:
 
             var_check = 1
 
-            self.yvelocity = np.empty(self.shape, dtype=float)
+            self.density = self._extract(rho)
+
+            if self.file_type_check == 1:  # write to txt
+                self._write_text(self.density_file, self.density, " ")
+
+            if self.file_type_check == 2:  # write to csv file
+                self._write_text(self.density_file, self.density, ",")
+
+            if self.file_type_check == 3:  # write to hdf5
 
-            for j in reversed(range(v.shape[0] - 4)):
+                self._append(self.dset_density, self.density)
 
-                for i in range(v.shape[1] - 4):
+            if self.file_type_check == 4:  # write to npy store
+                snap[self.store_variables.index("density")] = self.density
 
-                    self.yvelocity[i][j] = v[i + 2][j + 2]
+            if self.file_type_check == 5:  # write to lossy file
+                fields.append(self.codec.encode("density", self.density))
+
+        if "pressure" in self.variables:
+
+            var_check = 1
+
+            self.pressure = self._extract(p)
 
             if self.file_type_check == 1:  # write to txt
+                self._write_text(self.pressure_file, self.pressure, " ")
 
-                for j in reversed(range(self.yvelocity.shape[0])):
+            if self.file_type_check == 2:  # write to csv
+                self._write_text(self.pressure_file, self.pressure, ",")
 
-                    for i in range(self.yvelocity.shape[1]):
+            if self.file_type_check == 3:  # write to hdf5
+                self._append(self.dset_pressure, self.pressure)
 
-                        self.yvelocity_file.write(str(self.yvelocity[i][j]))
-                        self.yvelocity_file.write(" ")
+            if self.file_type_check == 4:  # write to npy store
+                snap[self.store_variables.index("pressure")] = self.pressure
 
-                    self.yvelocity_file.write("\n")
+            if self.file_type_check == 5:  # write to lossy file
+                fields.append(self.codec.encode("pressure", self.pressure))
 
-            if self.file_type_check == 2:  # write to csv file
+        if var_check == 0:
 
-                for j in reversed(range(self.yvelocity.shape[0])):
+            raise ValueError(
+                "No correctly spelled output variables specified in input."
+            )
 
-                    for i in range(self.yvelocity.shape[1]):
+        if self.file_type_check == 3:
 
-                        self.yvelocity_file.write(str(self.yvelocity[i][j]))
-                        self.yvelocity_file.write(",")
+            # Readable up to this snapshot even if the run stops early
+            self.f.flush()
 
-                    self.yvelocity_file.write("\n")
+        if self.file_type_check == 4:
 
-            if self.file_type_check == 3:  # write to hdf5
+            # The snapshot is counted in the header once it is fully written
+            self.times.append(float(t))
+            self.iters.append(int(iter))
+            self._write_store_header()
 
-                self.dset_yvelocity = self.f.create_dataset(
-                    "yvelocity_dataset", data=self.yvelocity
-                )
+        if self.file_type_check == 5:
 
-        if "density" in self.variables:
+            record = dict(time=float(t), iter=int(iter))
+            record["fields"] = [meta for meta, _ in fields]
 
-            var_check = 1
+            self.lossy_file.write(json.dumps(record).encode() + b"\n")
+            for _, payload in fields:
+                self.lossy_file.write(payload)
 
-            self.density = np.empty(self.shape, dtype=float)
+            self.lossy_file.flush()
+            self.codec.next_snapshot()
 
-            for j in reversed(range(rho.shape[0] - 4)):
 
-                for i in range(rho.shape[1] - 4):
+class LossyCodec:
+    """Error-bounded lossy codec for the snapshots of the output variables
 
-                    self.density[i][j] = rho[i + 2][j + 2]
+    Each field is stored within an absolute error bound, taken as the
+    smaller of `abs_error` and `rel_error` times the range of the field.
+    The field is quantized to integer multiples of twice the bound after
+    subtracting its reconstruction at the previous snapshot, so smooth
+    evolution leaves mostly small integers, which are stored in the
+    narrowest integer type that holds them and then deflated with zlib.
+    A plain float32 or float16 copy is stored instead when it is within
+    the bound and smaller. Every `keyframe` snapshots, and after a
+    restart, the fields are quantized on their own so that a reader does
+    not have to decode the whole run.
 
-            if self.file_type_check == 1:  # write to txt
+    Parameters
+    ----------
+    abs_error : float
+        Absolute error bound, unused when 0
+    rel_error : float
+        Error bound relative to the range of each field, unused when 0
+    keyframe : int
+        Number of snapshots between fields stored without the previous one
 
-                for j in reversed(range(self.density.shape[0])):
+    Attributes
+    ----------
+    raw_bytes : int
+        Size of the fields encoded so far, as float64
+    stored_bytes : int
+        Size of the encoded fields
+    max_error : float
+        Largest error of the encoded fields
 
-                    for i in range(self.density.shape[1]):
+    """
 
-                        self.density_file.write(str(self.density[i][j]))
-                        self.density_file.write(" ")
+    def __init__(
+        self, abs_error: float = 0.0, rel_error: float = 0.0, keyframe: int = 10
+    ) -> None:
 
-                    self.density_file.write("\n")
+        if abs_error < 0 or rel_error < 0 or max(abs_error, rel_error) <= 0:
+            raise ValueError("Please use a positive error bound for the lossy output")
 
-            if self.file_type_check == 2:  # write to csv file
+        if keyframe < 1:
+            raise ValueError("Please use a positive lossy keyframe interval")
 
-                for j in reversed(range(self.density.shape[0])):
+        self.abs_error = abs_error
+        self.rel_error = rel_error
+        self.keyframe = keyframe
 
-                    for i in range(self.density.shape[1]):
+        self.nsnap = 0
+        self.previous = dict()
 
-                        self.density_file.write(str(self.density[i][j]))
-                        self.density_file.write(",")
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.max_error = 0.0
 
-                    self.density_file.write("\n")
+    def error_bound(self, field: np.ndarray) -> float:
+        """Returns the absolute error bound of a field"""
 
-            if self.file_type_check == 3:  # write to hdf5
+        bounds = []
 
-                self.dset_density = self.f.create_dataset(
-                    "density_dataset", data=self.density
-                )
+        if self.abs_error > 0:
+            bounds.append(self.abs_error)
 
-        if "pressure" in self.variables:
+        if self.rel_error > 0:
+            bounds.append(self.rel_error * float(np.ptp(field)))
 
-            var_check = 1
+        return min(bounds)
 
-            self.pressure = np.empty(self.shape, dtype=float)
+    def encode(self, name: str, field: np.ndarray) -> tuple:
+        """Encodes a field of the current snapshot
 
-            for j in reversed(range(p.shape[0] - 4)):
+        Parameters
+        ----------
+        name : str
+            Name of the variable, whose previous snapshot is predicted from
+        field : ndarray[float]
+            The field to encode
+
+        Returns
+        -------
+        dict
+            Description of the encoded field, as needed by `decode`
+        bytes
+            The encoded field
 
-                for i in range(p.shape[1] - 4):
+        """
 
-                    self.pressure[i][j] = p[i + 2][j + 2]
+        field = np.ascontiguousarray(field, dtype=np.float64)
+        bound = self.error_bound(field)
 
-            if self.file_type_check == 1:  # write to txt
+        delta = self.nsnap % self.keyframe != 0 and name in self.previous
+        previous = self.previous[name] if delta else 0.0
 
-                for j in reversed(range(self.pressure.shape[0])):
+        meta = dict(name=name, shape=list(field.shape), bound=bound, delta=delta)
 
-                    for i in range(self.pressure.shape[1]):
+        # A field without spread, e.g. uniform with a relative bound, is
+        # stored exactly
+        data = field
+        meta.update(mode="float", dtype="float64")
 
-                        self.pressure_file.write(str(self.pressure[i][j]))
-                        self.pressure_file.write(" ")
+        if bound > 0:
 
-                    self.pressure_file.write("\n")
+            # The step is kept just under twice the bound so rounding the
+            # reconstruction cannot push the error past it
+            step = 2.0 * bound * (1.0 - 2.0**-20)
+            q = np.rint((field - previous) / step)
+            qmax = np.abs(q).max()
 
-            if self.file_type_check == 2:  # write to csv
+            for dtype in [np.int8, np.int16, np.int32]:
+                if qmax <= np.iinfo(dtype).max:
+                    recon = previous + q * step
 
-                for j in reversed(range(self.pressure.shape[0])):
+                    if np.abs(field - recon).max() <= bound:
+                        data = q.astype(dtype)
+                        meta.update(mode="quantized", dtype=dtype.__name__, step=step)
+                    break
 
-                    for i in range(self.pressure.shape[1]):
+            for dtype in [np.float16, np.float32]:
+                if np.dtype(dtype).itemsize >= data.itemsize:
+                    break
 
-                        self.pressure_file.write(str(self.pressure[i][j]))
-                        self.pressure_file.write(",")
+                cast = field.astype(dtype)
 
-                    self.pressure_file.write("\n")
+                if np.all(np.isfinite(cast)) and (np.abs(field - cast).max() <= bound):
+                    data = cast
+                    meta.update(mode="float", dtype=dtype.__name__, delta=False)
+                    break
 
-            if self.file_type_check == 3:  # write to hdf5
-                self.dset_pressure = self.f.create_dataset(
-                    "pressure_dataset", data=self.pressure
-                )
+        payload = zlib.compress(data.tobytes(), 1)
+        recon = self.decode(meta, payload, previous)
 
-        if var_check == 0:
+        meta["nbytes"] = len(payload)
+        meta["max_error"] = float(np.abs(field - recon).max())
 
-            raise ValueError(
-                "No correctly spelled output variables specified in input."
-            )
+        self.previous[name] = recon
 
-        if t >= tmax:
+        self.raw_bytes += field.nbytes
+        self.stored_bytes += len(payload)
+        self.max_error = max(self.max_error, meta["max_error"])
 
-            if "hdf5" in self.file_type:
+        return meta, payload
 
-                self.f.close()
+    @staticmethod
+    def decode(meta: dict, payload: bytes, previous=0.0) -> np.ndarray:
+        """Reconstructs a field from `encode`
 
-            else:
+        Parameters
+        ----------
+        meta : dict
+            Description of the encoded field
+        payload : bytes
+            The encoded field
+        previous : ndarray[float], optional
+            Reconstruction of the variable at the previous snapshot, needed
+            when the field was encoded with `delta`
+
+        Returns
+        -------
+        ndarray[float]
+            The field, within `meta["bound"]` of the original
+
+        """
+
+        data = np.frombuffer(zlib.decompress(payload), dtype=meta["dtype"])
+        data = data.reshape(meta["shape"])
+
+        if meta["mode"] == "float":
+            return data.astype(np.float64)
+
+        if not meta["delta"]:
+            previous = 0.0
+
+        return previous + data * meta["step"]
+
+    def next_snapshot(self) -> None:
+        """Moves on to the next snapshot once all its fields are encoded"""
+
+        self.nsnap += 1
+
+    @property
+    def ratio(self) -> float:
+        """Compression ratio of the fields encoded so far"""
+
+        return self.raw_bytes / max(self.stored_bytes, 1)
+
+
+def read_lossy_data(fname: str) -> dict:
+    """Reads the snapshots written with `data_file_type = lossy`
+
+    Parameters
+    ----------
+    fname : str
+        Name of the lossy output file, e.g. `data.psz`
+
+    Returns
+    -------
+    dict
+        `time` and `iter` arrays, an array of shape (ntime, nx1, nx2) for
+        each output variable, and `bound` and `max_error` arrays of shape
+        (ntime,) for each variable under `<variable>_bound` and
+        `<variable>_max_error`
+
+    """
+
+    data = dict(time=[], iter=[])
+    previous = dict()
+
+    with open(fname, "rb") as f:
+        while True:
+            line = f.readline()
+
+            if not line:
+                break
+
+            record = json.loads(line)
+
+            data["time"].append(record["time"])
+            data["iter"].append(record["iter"])
+
+            for meta in record["fields"]:
+                name = meta["name"]
+
+                field = LossyCodec.decode(
+                    meta, f.read(meta["nbytes"]), previous.get(name, 0.0)
+                )
+                previous[name] = field
+
+                data.setdefault(name, []).append(field)
+                data.setdefault(f"{name}_bound", []).append(meta["bound"])
+                data.setdefault(f"{name}_max_error", []).append(meta["max_error"])
 
-                self.density_file.close()
-                self.xvelocity_file.close()
-                self.yvelocity_file.close()
-                self.pressure_file.close()
-                self.iter_time_file.close()
+    return {key: np.array(value) for key, value in data.items()}
@@ -0,0 +1,295 @@
+###################################################################
+#                                                                 #
+#  Contains the shared memory domain decomposition over processes #
+#                                                                 #
+###################################################################
+
+import multiprocessing as mp
+import numpy as np
+import sys
+from multiprocessing.shared_memory import SharedMemory
+
+sys.path.append("..")
+from src.mesh import PsychoArray
+from src.reconstruct import BETA
+from src.step import muscl_hancock_step_rows
+from src.tools import calculate_timestep
+
+# Commands sent from the main process to the workers
+_TIMESTEP = 0
+_STEP = 1
+_STOP = 2
+
+
+class PsychoTile:
+    """Class which contains the rows of the mesh owned by one worker
+
+    Parameters
+    ----------
+    pmesh : PsychoArray
+        PsychoArray mesh which is being decomposed
+
+    i_start, i_end : int
+        Range of rows of Un (ghost cells included) owned by the tile
+
+    Attributes
+    ----------
+    i_start, i_end : int
+        Range of rows of Un (ghost cells included) owned by the tile
+
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+
+    Un : ndarray[float]
+        Conserved variables of the owned rows, set by the worker to a
+        view of the shared array for the current timestep
+
+    """
+
+    def __init__(self, pmesh: PsychoArray, i_start: int, i_end: int) -> None:
+
+        self.i_start = i_start
+        self.i_end = i_end
+
+        self.dx1 = pmesh.dx1
+        self.dx2 = pmesh.dx2
+
+        self.Un = None
+
+
+def _worker(
+    tile: PsychoTile,
+    shm_names: list,
+    shape: tuple,
+    dtype: np.dtype,
+    control: mp.RawArray,
+    dts: mp.RawArray,
+    rank: int,
+    barrier: mp.Barrier,
+    cfl: float,
+    gamma: float,
+    limiter: int,
+    beta: float,
+) -> None:
+    """Loop run by each worker process until told to stop"""
+
+    shms = [SharedMemory(name=name) for name in shm_names]
+    Un = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm in shms]
+
+    try:
+        while True:
+
+            barrier.wait()
+
+            command = int(control[0])
+            current = int(control[2])
+
+            if command == _STOP:
+                break
+
+            if command == _TIMESTEP:
+                tile.Un = Un[current][:, tile.i_start : tile.i_end, :]
+                dts[rank] = calculate_timestep(tile, cfl, gamma)
+
+            elif command == _STEP:
+                muscl_hancock_step_rows(
+                    Un[current],
+                    control[1],
+                    tile.dx1,
+                    tile.dx2,
+                    gamma,
+                    Un[1 - current],
+                    tile.i_start,
+                    tile.i_end,
+                    limiter,
+                    beta,
+                )
+
+            barrier.wait()
+
+    except Exception:
+        barrier.abort()
+        raise
+
+    finally:
+        tile.Un = None
+        del Un
+        for shm in shms:
+            shm.close()
+
+
+class PsychoDecomposition:
+    """Advances a PsychoArray with the rows shared out between worker processes
+
+    The conserved variables and the array receiving the next timestep are
+    moved into `multiprocessing.shared_memory`, and the rows (ghost cells
+    included) are split into one tile per worker. Each worker advances its
+    tile with `muscl_hancock_step_rows`, reading the ghost rows it needs
+    directly from its neighbours in the shared array, so no copies are made
+    to exchange them. The timestep is the minimum of `calculate_timestep`
+    over the tiles, and the boundary conditions are enforced on the whole
+    shared array by the main process. The results are the same, bit for bit,
+    as the single process fused step.
+
+    `pmesh.Un` always points at the shared array holding the current
+    timestep, so output and plotting work as before.
+
+    Parameters
+    ----------
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+        and the conserved variables Un
+
+    nprocs : int
+        Number of worker processes
+
+    cfl : float
+        Courant-Freidrichs-Lewy condition necessary for stability when
+        choosing the timestep
+
+    gamma : float
+        Specific heat ratio
+
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    """
+
+    def __init__(
+        self,
+        pmesh: PsychoArray,
+        nprocs: int,
+        cfl: float,
+        gamma: float,
+        limiter: int = BETA,
+        beta: float = 1.0,
+    ) -> None:
+
+        self.pmesh = pmesh
+        self.nprocs = nprocs
+
+        shape = pmesh.Un.shape
+        dtype = pmesh.Un.dtype
+
+        if nprocs > shape[1] - 4:
+            raise ValueError("Please use fewer processes than rows in the mesh")
+
+        # Shared arrays for the current and next timestep
+        self.shms = [SharedMemory(create=True, size=pmesh.Un.nbytes) for _ in range(2)]
+        self.Un = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm in self.shms]
+        self.Un[0][...] = pmesh.Un
+        self.Un[1][...] = pmesh.Un
+
+        self.current = 0
+        pmesh.Un = self.Un[self.current]
+
+        # Workers are started from a fresh server process rather than forked
+        # from this one, as forking once the numba threading layer is running
+        # leaves the main process hanging at exit
+        ctx = mp.get_context("forkserver")
+
+        # Command, timestep and index of the current array
+        self.control = ctx.RawArray("d", 3)
+        self.dts = ctx.RawArray("d", nprocs)
+        self.barrier = ctx.Barrier(nprocs + 1)
+
+        # Rows of the interior are split evenly, the ghost rows go to the end tiles
+        nrows = shape[1] - 4
+        bounds = [2 + (rank * nrows) // nprocs for rank in range(nprocs + 1)]
+        bounds[0] = 0
+        bounds[-1] = shape[1]
+
+        self.workers = []
+        for rank in range(nprocs):
+            tile = PsychoTile(pmesh, bounds[rank], bounds[rank + 1])
+            worker = ctx.Process(
+                target=_worker,
+                args=(
+                    tile,
+                    [shm.name for shm in self.shms],
+                    shape,
+                    dtype,
+                    self.control,
+                    self.dts,
+                    rank,
+                    self.barrier,
+                    cfl,
+                    gamma,
+                    limiter,
+                    beta,
+                ),
+                daemon=True,
+            )
+            worker.start()
+            self.workers.append(worker)
+
+    def _run(self, command: int, dt: float = 0.0) -> None:
+        """Has every worker carry out a command and waits for them to finish"""
+
+        self.control[0] = command
+        self.control[1] = dt
+        self.control[2] = self.current
+
+        self.barrier.wait()
+        if command != _STOP:
+            self.barrier.wait()
+
+    def calculate_timestep(self) -> float:
+        """Calculates the timestep as the minimum over the tiles
+
+        Returns
+        -------
+        float
+            The calculated timestep for the current conserved variables
+
+        """
+
+        self._run(_TIMESTEP)
+
+        return min(self.dts)
+
+    def step(self, dt: float) -> None:
+        """Advances the conserved variables by one timestep
+
+        Boundary conditions need to be enforced on `pmesh` beforehand.
+
+        Parameters
+        ----------
+        dt : float
+            Timestep
+
+        """
+
+        self._run(_STEP, dt)
+
+        self.current = 1 - self.current
+        self.pmesh.Un = self.Un[self.current]
+
+    def close(self) -> None:
+        """Stops the workers and releases the shared memory
+
+        `pmesh.Un` is replaced by a private copy of the current timestep.
+
+        """
+
+        self._run(_STOP)
+
+        for worker in self.workers:
+            worker.join()
+
+        self.pmesh.Un = self.Un[self.current].copy()
+
+        del self.Un
+        for shm in self.shms:
+            shm.unlink()
+
+            # Views held elsewhere (e.g. by a Plotter) keep the mapping alive
+            # until they are garbage collected
+            try:
+                shm.close()
+            except BufferError:
+                pass
@@ -0,0 +1,396 @@
+###################################################################
+#                                                                 #
+#    Contains the in-situ diagnostics computed during the run     #
+#                                                                 #
+###################################################################
+
+import numpy as np
+import os
+import sys
+from typing import Callable
+
+sys.path.append("..")
+from src.input import PsychoInput
+from src.mesh import PsychoArray
+from src.jit import HAVE_NUMBA, njit, prange
+
+# Integrals computed together in a single pass over the mesh
+INTEGRALS = ["mass", "energy", "vertical_kinetic_energy", "enstrophy"]
+
+# Diagnostics derived from the time series of an integral, as the relative
+# drift from its first value or as the growth rate of the perturbation
+# amplitude, i.e. half the growth rate of an energy
+DERIVED = {
+    "mass_drift": ("mass", "drift"),
+    "energy_drift": ("energy", "drift"),
+    "growth_rate": ("vertical_kinetic_energy", "growth"),
+}
+
+# Diagnostics added with `register_diagnostic`
+DIAGNOSTICS = dict()
+
+
+def register_diagnostic(name: str) -> Callable:
+    """Registers a diagnostic, to be listed in `diagnostics` in the input
+
+    Parameters
+    ----------
+    name : str
+        Name of the diagnostic, used for its column of the time series
+
+    Returns
+    -------
+    Callable
+        Decorator registering a function of `(Un, ng, dx1, dx2, gamma)`
+        which returns the diagnostic as a float
+
+    """
+
+    def decorator(func: Callable) -> Callable:
+        DIAGNOSTICS[name] = func
+        return func
+
+    return decorator
+
+
+@njit(parallel=True, nogil=True)
+def _integrals_cells(
+    Un: np.ndarray, ng: int, dx1: float, dx2: float, out: np.ndarray
+) -> None:
+    """Integrals of `INTEGRALS` over the interior, looping over the cells
+
+    The vorticity is taken from central differences which use the ghost
+    cells, so the boundary conditions have to be enforced beforehand.
+
+    """
+
+    nx1 = Un.shape[1] - 2 * ng
+    nx2 = Un.shape[2] - 2 * ng
+
+    mass = 0.0
+    energy = 0.0
+    vertical_kinetic_energy = 0.0
+    enstrophy = 0.0
+
+    for i in prange(ng, nx1 + ng):
+        for j in range(ng, nx2 + ng):
+            rho = Un[0, i, j]
+
+            mass += rho
+            energy += Un[3, i, j]
+            vertical_kinetic_energy += 0.5 * Un[2, i, j] * Un[2, i, j] / rho
+
+            dv_dx1 = (
+                Un[2, i + 1, j] / Un[0, i + 1, j] - Un[2, i - 1, j] / Un[0, i - 1, j]
+            ) / (2.0 * dx1)
+            du_dx2 = (
+                Un[1, i, j + 1] / Un[0, i, j + 1] - Un[1, i, j - 1] / Un[0, i, j - 1]
+            ) / (2.0 * dx2)
+
+            enstrophy += 0.5 * (dv_dx1 - du_dx2) ** 2
+
+    dA = dx1 * dx2
+
+    out[0] = mass * dA
+    out[1] = energy * dA
+    out[2] = vertical_kinetic_energy * dA
+    out[3] = enstrophy * dA
+
+
+def _integrals_arrays(
+    Un: np.ndarray, ng: int, dx1: float, dx2: float, out: np.ndarray
+) -> None:
+    """Integrals of `INTEGRALS` over the interior, using whole arrays"""
+
+    interior = (slice(ng, -ng), slice(ng, -ng))
+
+    u = Un[1] / Un[0]
+    v = Un[2] / Un[0]
+
+    dv_dx1 = (v[ng + 1 : -ng + 1, ng:-ng] - v[ng - 1 : -ng - 1, ng:-ng]) / (2.0 * dx1)
+    du_dx2 = (u[ng:-ng, ng + 1 : -ng + 1] - u[ng:-ng, ng - 1 : -ng - 1]) / (2.0 * dx2)
+
+    dA = dx1 * dx2
+
+    out[0] = np.sum(Un[0][interior]) * dA
+    out[1] = np.sum(Un[3][interior]) * dA
+    out[2] = np.sum(0.5 * Un[2][interior] * v[interior]) * dA
+    out[3] = np.sum(0.5 * (dv_dx1 - du_dx2) ** 2) * dA
+
+
+def get_integrals(Un: np.ndarray, ng: int, dx1: float, dx2: float) -> dict:
+    """Returns the integrals of `INTEGRALS` over the interior of the mesh
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables of a single member, with its boundary
+        conditions enforced
+    ng : int
+        Number of ghost cells
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+
+    Returns
+    -------
+    dict
+        Total mass and energy, kinetic energy of the x2 velocity and
+        enstrophy, half the integral of the squared vorticity
+
+    """
+
+    out = np.empty(len(INTEGRALS))
+
+    if HAVE_NUMBA:
+        _integrals_cells(Un, ng, dx1, dx2, out)
+    else:
+        _integrals_arrays(Un, ng, dx1, dx2, out)
+
+    return dict(zip(INTEGRALS, out))
+
+
+def get_mixing_thickness(Un: np.ndarray, ng: int, dx2: float) -> float:
+    """Returns the thickness of the mixing layers across x2
+
+    The density is averaged over x1 and scaled to a mixing fraction f
+    between its lowest and highest value, and the thickness is the integral
+    of 4 f (1 - f) over x2, summed over every layer. It is 0 for sharp
+    interfaces.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables of a single member
+    ng : int
+        Number of ghost cells
+    dx2 : float
+        Step size in the x2 direction
+
+    Returns
+    -------
+    float
+        The thickness of the mixing layers
+
+    """
+
+    profile = Un[0, ng:-ng, ng:-ng].mean(axis=0)
+
+    spread = profile.max() - profile.min()
+
+    if spread == 0:
+        return 0.0
+
+    f = (profile - profile.min()) / spread
+
+    return float(np.sum(4.0 * f * (1.0 - f)) * dx2)
+
+
+class PsychoDiagnostics:
+    """Computes diagnostics during the run and writes them as a time series
+
+    The diagnostics listed in `diagnostics` in the problem input are
+    computed every `diagnostics_frequency` timesteps and appended as a row
+    of `diagnostics.csv`, after the iteration and time. They can be any of
+    `INTEGRALS`, `mixing_thickness`, `DERIVED` or a diagnostic added with
+    `register_diagnostic`. The integrals a derived diagnostic is computed
+    from are written as well.
+
+    Parameters
+    ----------
+    pin : PsychoInput
+        Contains the problem information stored in the PsychoInput
+        object
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+    suffix : str, optional
+        Appended to the name of the time series file, e.g. to keep the
+        members of an ensemble apart
+    restart : bool, optional
+        Append to the time series of a restarted run, whose first and last
+        rows the derived diagnostics carry on from
+    restart_iter : int, optional
+        Iteration of the checkpoint a run is restarted from. The rows of
+        this and later iterations were written after the checkpoint and are
+        removed, as the restarted run writes them again
+
+    """
+
+    def __init__(
+        self,
+        pin: PsychoInput,
+        pmesh: PsychoArray,
+        suffix: str = "",
+        restart: bool = False,
+        restart_iter: int = None,
+    ) -> None:
+
+        names = [name.strip() for name in pin.value_dict.get("diagnostics", [])]
+
+        for name in names:
+            if not (
+                name in INTEGRALS
+                or name == "mixing_thickness"
+                or name in DERIVED
+                or name in DIAGNOSTICS
+            ):
+                raise ValueError("Please use implemented diagnostics")
+
+        # Integrals needed by the derived diagnostics are written too
+        self.columns = list(names)
+        for name in names:
+            if name in DERIVED and DERIVED[name][0] not in self.columns:
+                self.columns.append(DERIVED[name][0])
+
+        self.frequency = pin.value_dict.get("diagnostics_frequency", 1)
+
+        if self.frequency < 1:
+            raise ValueError("Please use a positive diagnostics frequency")
+
+        self.ng = pmesh.ng
+        self.dx1 = pmesh.dx1
+        self.dx2 = pmesh.dx2
+        self.gamma = float(pin.value_dict["gamma"])
+
+        self.fname = f"diagnostics{suffix}.csv"
+
+        # First and previous rows, as time and values
+        self.first = None
+        self.previous = None
+
+        header = ",".join(["iter", "time"] + self.columns)
+
+        if restart and os.path.isfile(self.fname):
+
+            with open(self.fname) as f:
+                lines = f.read().splitlines()
+
+            if lines[0] != header:
+                raise ValueError("Please restart with the diagnostics of the run")
+
+            if restart_iter is not None:
+                nrows = len(lines)
+                lines = [lines[0]] + [
+                    line for line in lines[1:] if int(line.split(",")[0]) < restart_iter
+                ]
+
+                if len(lines) < nrows:
+                    with open(self.fname, "w") as f:
+                        f.write("\n".join(lines) + "\n")
+
+            if len(lines) > 1:
+                self.first = self._parse(lines[1])
+                self.previous = self._parse(lines[-1])
+
+            self.f = open(self.fname, "a")
+
+        else:
+
+            self.f = open(self.fname, "w")
+            self.f.write(header + "\n")
+
+    def _parse(self, line: str) -> tuple:
+        """Returns the time and values of a row of the time series"""
+
+        row = line.split(",")
+
+        return float(row[1]), dict(zip(self.columns, map(float, row[2:])))
+
+    def compute(self, Un: np.ndarray, t: float) -> dict:
+        """Computes the diagnostics of a snapshot
+
+        Parameters
+        ----------
+        Un : ndarray[float]
+            Conserved variables of a single member, with its boundary
+            conditions enforced
+        t : float
+            The current time
+
+        Returns
+        -------
+        dict
+            Value of each column of the time series
+
+        """
+
+        values = dict()
+
+        if any(name in INTEGRALS for name in self.columns):
+            values.update(get_integrals(Un, self.ng, self.dx1, self.dx2))
+
+        for name in self.columns:
+
+            if name == "mixing_thickness":
+                values[name] = get_mixing_thickness(Un, self.ng, self.dx2)
+
+            elif name in DIAGNOSTICS:
+                values[name] = float(
+                    DIAGNOSTICS[name](Un, self.ng, self.dx1, self.dx2, self.gamma)
+                )
+
+        first = self.first if self.first is not None else (t, values)
+
+        for name in self.columns:
+
+            if name not in DERIVED:
+                continue
+
+            integral, kind = DERIVED[name]
+
+            if kind == "drift":
+                reference = first[1][integral]
+                values[name] = (values[integral] - reference) / reference
+
+            elif self.previous is None or t == self.previous[0]:
+                values[name] = 0.0
+
+            else:
+                t_prev, previous = self.previous
+                values[name] = (
+                    0.5 * np.log(values[integral] / previous[integral]) / (t - t_prev)
+                )
+
+        return {name: values[name] for name in self.columns}
+
+    def record(self, Un: np.ndarray, t: float, iter: int) -> dict:
+        """Computes the diagnostics of a snapshot and appends them to the file
+
+        Parameters
+        ----------
+        Un : ndarray[float]
+            Conserved variables of a single member, with its boundary
+            conditions enforced
+        t : float
+            The current time
+        iter : int
+            The current iteration
+
+        Returns
+        -------
+        dict
+            Value of each column of the time series
+
+        """
+
+        values = self.compute(Un, t)
+
+        self.f.write(
+            ",".join(
+                [str(iter), repr(float(t))]
+                + [repr(float(values[name])) for name in self.columns]
+            )
+            + "\n"
+        )
+        self.f.flush()
+
+        if self.first is None:
+            self.first = (t, values)
+
+        self.previous = (t, values)
+
+        return values
+
+    def close(self) -> None:
+        """Closes the time series file, called at the end of the run"""
+
+        self.f.close()
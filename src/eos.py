@@ -6,7 +6,7 @@
 
 import numpy as np
 from typing import Union
-from numba import njit
+from src.jit import njit
 
 
 @njit()
@@ -53,8 +53,16 @@ class PsychoInput:
                     key = line.split("=")[0].strip()
                     val = line.split("=")[1].strip()
 
+                    # Boxes are stored as lists of numbers, floats if they
+                    # have a `.`, otherwise ints
+                    if key.endswith("_box"):
+                        val = val.strip("[]")
+                        self.value_dict[key] = [
+                            float(num) if "." in num else int(num)
+                            for num in val.split(",")
+                        ]
                     # Numbers with `.` are stored as floats, otherwise ints
-                    if "." in val:
+                    elif "." in val:
                         self.value_dict[key] = float(val)
                     elif (
                         key == "left_bc"
@@ -65,11 +73,21 @@ class PsychoInput:
                         or key == "output_variables"
                         or key == "output_frequency"
                         or key == "data_file_type"
+                        or key == "step_kernel"
+                        or key == "riemann_backend"
+                        or key == "slope_limiter"
+                        or key == "ensemble_dt"
+                        or key == "plot_drop_policy"
+                        or key == "plot_method"
+                        or key == "frame_format"
+                        or key == "hdf5_compression"
                     ):
                         self.value_dict[key] = str(val)
                     elif (
                         key == "output_variables"
                         or key == "variables_to_plot"
+                        or key == "output_streams"
+                        or key == "diagnostics"
                         or key == "labels"
                         or key == "cmaps"
                     ):
@@ -0,0 +1,114 @@
+###################################################################
+#                                                                 #
+#    Contains the compilation decorators used by the kernels      #
+#                                                                 #
+###################################################################
+
+# Numba is used when it can be imported. Otherwise the kernels are left as
+# plain Python functions, which is only practical for the vectorized ones,
+# i.e. the staged step with the numpy Riemann backend.
+#
+# The compiled kernels are cached on disk, so a run only compiles the
+# signatures no earlier run has. The cache is kept in the `__pycache__`
+# directories next to the sources, or under NUMBA_CACHE_DIR when it is set.
+# Numba fixes the cache location when a kernel is decorated, so
+# `set_cache_dir` points the kernels decorated so far at a new directory.
+
+import os
+
+try:
+    import numba
+    from numba import config, prange, get_num_threads, set_num_threads
+
+    HAVE_NUMBA = True
+
+    # Every kernel decorated with `njit` which is cached
+    KERNELS = []
+
+    def njit(*args, **kwargs):
+        """`numba.njit` caching the compiled kernels on disk by default"""
+
+        kwargs.setdefault("cache", True)
+
+        def decorator(func):
+            kernel = numba.njit(**kwargs)(func)
+            if kwargs["cache"]:
+                KERNELS.append(kernel)
+            return kernel
+
+        if len(args) == 1 and callable(args[0]):
+            return decorator(args[0])
+
+        return decorator
+
+    def set_cache_dir(path: str) -> None:
+        """Caches the compiled kernels in a directory
+
+        The directory is also passed on to the worker processes started
+        afterwards through NUMBA_CACHE_DIR. Kernels compiled beforehand are
+        kept in memory but are saved to the new directory only when they
+        compile another signature.
+
+        Parameters
+        ----------
+        path : str
+            Directory receiving the cache, created when it does not exist
+
+        """
+
+        path = os.path.abspath(path)
+        os.makedirs(path, exist_ok=True)
+
+        config.CACHE_DIR = path
+        os.environ["NUMBA_CACHE_DIR"] = path
+
+        for kernel in KERNELS:
+            kernel.enable_caching()
+
+    def cache_dir() -> str:
+        """Returns the directory the compiled kernels are cached in"""
+
+        if config.CACHE_DIR:
+            return os.path.abspath(config.CACHE_DIR)
+
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+
+    # Largest thread count accepted by set_num_threads, set by NUMBA_NUM_THREADS
+    MAX_NUM_THREADS = config.NUMBA_NUM_THREADS
+
+except ImportError:
+
+    HAVE_NUMBA = False
+
+    MAX_NUM_THREADS = 1
+
+    KERNELS = []
+
+    prange = range
+
+    def cache_dir() -> str:
+        """Stand-in returning None, nothing is compiled without numba"""
+
+        return None
+
+    def set_cache_dir(path: str) -> None:
+        """Stand-in ignoring the directory, nothing is compiled without numba"""
+
+    def njit(*args, **kwargs):
+        """Stand-in for `numba.njit` which returns the function unchanged"""
+
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        return lambda func: func
+
+    def get_num_threads() -> int:
+        """Stand-in for `numba.get_num_threads`, always a single thread"""
+
+        return 1
+
+    def set_num_threads(n: int) -> None:
+        """Stand-in for `numba.set_num_threads`, only a single thread is allowed"""
+
+        if n != 1:
+            raise ValueError("Running with more than one thread requires numba")
@@ -4,8 +4,10 @@
 #                                                                 #
 ###################################################################
 
+import copy
 import numpy as np
 import sys
+from typing import Callable
 
 sys.path.append("..")
 from src.input import PsychoInput
@@ -47,8 +49,13 @@ class PsychoArray:
     dx1, dx2 : float
         Step size in the x1 and x2 directions
 
+    nens : int
+        Number of ensemble members, i.e. independent realizations of the
+        problem advanced together
+
     Un : ndarray[dtype]
-        Conserved variables
+        Conserved variables, with a leading ensemble dimension when there
+        is more than one ensemble member
 
     """
 
@@ -67,15 +74,20 @@ class PsychoArray:
         self.dx1 = (self.x1max - self.x1min) / self.nx1
         self.dx2 = (self.x2max - self.x2min) / self.nx2
 
-        self.Un = np.zeros(
-            (self.nvar, self.nx1 + 2 * self.ng, self.nx2 + 2 * self.ng), dtype=dtype
-        )
+        self.nens = pin.value_dict.get("nens", 1)
+
+        shape = (self.nvar, self.nx1 + 2 * self.ng, self.nx2 + 2 * self.ng)
+
+        if self.nens > 1:
+            shape = (self.nens,) + shape
+
+        self.Un = np.zeros(shape, dtype=dtype)
 
     def enforce_bcs(self, pin: PsychoInput) -> None:
         """Implements the desired boundary conditions
 
             Will enforce the boundary conditions set in the PsychoInput class
-            on the conserved variables, Un.
+            on the conserved variables, Un, of every ensemble member.
 
         pin : PsychoInput
             Contains the problem information stored in the PsychoInput
@@ -85,10 +97,10 @@ class PsychoArray:
 
         # Left boundary
         if pin.value_dict["left_bc"] == "transmissive":
-            self.Un[:, : self.ng, :] = self.Un[:, self.ng : 2 * self.ng, :]
+            self.Un[..., : self.ng, :] = self.Un[..., self.ng : 2 * self.ng, :]
 
         elif pin.value_dict["left_bc"] == "periodic":
-            self.Un[:, : self.ng, :] = self.Un[:, -2 * self.ng : -self.ng, :]
+            self.Un[..., : self.ng, :] = self.Un[..., -2 * self.ng : -self.ng, :]
 
         elif pin.value_dict["left_bc"] == "wall":
             pass
@@ -98,10 +110,10 @@ class PsychoArray:
 
         # Right boundary
         if pin.value_dict["right_bc"] == "transmissive":
-            self.Un[:, -self.ng :, :] = self.Un[:, -2 * self.ng : -self.ng, :]
+            self.Un[..., -self.ng :, :] = self.Un[..., -2 * self.ng : -self.ng, :]
 
         elif pin.value_dict["right_bc"] == "periodic":
-            self.Un[:, -self.ng :, :] = self.Un[:, self.ng : 2 * self.ng, :]
+            self.Un[..., -self.ng :, :] = self.Un[..., self.ng : 2 * self.ng, :]
 
         elif pin.value_dict["right_bc"] == "wall":
             pass
@@ -111,10 +123,10 @@ class PsychoArray:
 
         # Top boundary
         if pin.value_dict["top_bc"] == "transmissive":
-            self.Un[:, :, : self.ng] = self.Un[:, :, self.ng : 2 * self.ng]
+            self.Un[..., :, : self.ng] = self.Un[..., :, self.ng : 2 * self.ng]
 
         elif pin.value_dict["top_bc"] == "periodic":
-            self.Un[:, : self.ng] = self.Un[:, -2 * self.ng : -self.ng, :]
+            self.Un[..., : self.ng, :] = self.Un[..., -2 * self.ng : -self.ng, :]
 
         elif pin.value_dict["top_bc"] == "wall":
             pass
@@ -124,10 +136,10 @@ class PsychoArray:
 
         # Bottom boundary
         if pin.value_dict["bottom_bc"] == "transmissive":
-            self.Un[:, :, : self.ng] = self.Un[:, :, self.ng : 2 * self.ng]
+            self.Un[..., :, : self.ng] = self.Un[..., :, self.ng : 2 * self.ng]
 
         elif pin.value_dict["bottom_bc"] == "periodic":
-            self.Un[:, :, : self.ng] = self.Un[:, :, -2 * self.ng : -self.ng]
+            self.Un[..., :, : self.ng] = self.Un[..., :, -2 * self.ng : -self.ng]
 
         elif pin.value_dict["bottom_bc"] == "wall":
             pass
@@ -135,10 +147,141 @@ class PsychoArray:
         else:
             raise ValueError("Please use an implemented boundary condition type")
 
+    def member(self, m: int) -> "PsychoArray":
+        """Returns a PsychoArray sharing the conserved variables of one member
+
+        Parameters
+        ----------
+        m : int
+            Index of the ensemble member
+
+        Returns
+        -------
+        PsychoArray
+            Mesh whose Un is a view of the conserved variables of member m
+
+        """
+
+        if self.nens == 1:
+            return self
+
+        pmember = copy.copy(self)
+        pmember.nens = 1
+        pmember.Un = self.Un[m]
+
+        return pmember
+
     def print_value(self, indvar: int, indx1: int, indx2: int) -> None:
         print(self.arr[indvar, indx1, indx2])
 
 
+def generate_members(
+    problem_generator: Callable, pin: PsychoInput, pmesh: PsychoArray
+) -> None:
+    """Sets the initial conditions of every ensemble member
+
+    When `seed` is given in the input, the random numbers of member m are
+    drawn with `np.random.seed(seed + m)`, so each member is a different
+    realization and a single run with that seed reproduces it.
+
+    Parameters
+    ----------
+    problem_generator : Callable
+        Problem generator with the signature of `kh.ProblemGenerator`
+
+    pin : PsychoInput
+        Contains the problem information stored in the PsychoInput
+        object
+
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+        and the conserved variables Un
+
+    """
+
+    seed = pin.value_dict.get("seed")
+
+    for m in range(pmesh.nens):
+
+        if seed is not None:
+            np.random.seed(seed + m)
+
+        problem_generator(pin, pmesh.member(m))
+
+
+class Workspace:
+    """Class which owns the scratch arrays of the staged step
+
+    The arrays are allocated once, when the object is created, and every
+    stage of `muscl_hancock_staged_step` writes into them. With the numba
+    Riemann solver the step then does not create any arrays the size of the
+    grid; `solve_riemann_numpy`, and `get_fluxes_2d` when numba is missing,
+    still create NumPy temporaries.
+
+    Parameters
+    ----------
+    pmesh : PsychoArray
+        PsychoArray mesh which contains all of the current mesh information
+        and the conserved variables Un
+
+    Attributes
+    ----------
+    delta_i, delta_j : ndarray[dtype]
+        Limited slopes in the x1 and x2 directions
+
+    slope_scratch : ndarray[dtype]
+        Intermediate values used by the slope limiter
+
+    U_i_L, U_i_R, U_j_L, U_j_R : ndarray[dtype]
+        Boundary extrapolated values at the left and right faces
+        in the x1 and x2 directions
+
+    F_i_L, F_i_R, G_j_L, G_j_R : ndarray[dtype]
+        Fluxes of the boundary extrapolated values
+
+    int_flux : ndarray[dtype]
+        Change of the boundary extrapolated values over half a timestep
+
+    F, G : ndarray[dtype]
+        Fluxes through the faces in the x1 and x2 directions from the
+        Riemann problem
+
+    dU_i, dU_j : ndarray[dtype]
+        Change of the conserved variables in the interior cells
+        from the x1 and x2 fluxes
+
+    """
+
+    def __init__(self, pmesh: PsychoArray) -> None:
+
+        nvar = pmesh.nvar
+        nx1 = pmesh.nx1 + 2 * pmesh.ng
+        nx2 = pmesh.nx2 + 2 * pmesh.ng
+        dtype = pmesh.Un.dtype
+
+        self.delta_i = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.delta_j = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.slope_scratch = np.zeros((5, nvar, nx1 - 2, nx2 - 2), dtype=dtype)
+
+        self.U_i_L = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.U_i_R = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.U_j_L = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.U_j_R = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+
+        self.F_i_L = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.F_i_R = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.G_j_L = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+        self.G_j_R = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+
+        self.int_flux = get_interm_array(nvar, nx1 - 2, nx2 - 2, dtype)
+
+        self.F = get_interm_array(nvar, nx1 - 3, nx2 - 2, dtype)
+        self.G = get_interm_array(nvar, nx1 - 2, nx2 - 3, dtype)
+
+        self.dU_i = get_interm_array(nvar, nx1 - 4, nx2 - 4, dtype)
+        self.dU_j = get_interm_array(nvar, nx1 - 4, nx2 - 4, dtype)
+
+
 def get_interm_array(nvar: int, nx1: int, nx2: int, dtype: np.dtype) -> np.ndarray:
     """Generates empty scratch array for intermediate calculations
 
@@ -0,0 +1,224 @@
+###################################################################
+#                                                                 #
+#     Contains the timers of the stages of the simulation loop    #
+#                                                                 #
+###################################################################
+
+import contextlib
+import json
+import numpy as np
+import threading
+import time
+from array import array
+
+
+class _Stage:
+    """Context manager timing one call of a stage"""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "PsychoProfiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+
+class PsychoProfiler:
+    """Times the stages of the simulation loop
+
+    Each stage is timed by wrapping it in `with profiler.stage(name):`.
+    The duration of every call is kept to report totals and percentiles,
+    and the first `max_events` calls are kept as events of a Chrome trace,
+    which can be opened in chrome://tracing or https://ui.perfetto.dev.
+    Stages may be timed from several threads, e.g. the output writer.
+
+    When disabled, `stage` returns a shared context manager which does
+    nothing, so the timers cost a function call per stage.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether the stages are timed
+    max_events : int, optional
+        Number of calls kept for the Chrome trace
+
+    """
+
+    def __init__(self, enabled: bool = True, max_events: int = 200000) -> None:
+
+        self.enabled = enabled
+        self.max_events = max_events
+
+        self.durations = dict()
+        self.events = []
+        self.threads = dict()
+
+        self.t0 = time.perf_counter()
+        self.wall_time = None
+
+        self._null = contextlib.nullcontext()
+
+    def stage(self, name: str):
+        """Returns a context manager timing a call of a stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+
+        """
+
+        if not self.enabled:
+            return self._null
+
+        return _Stage(self, name)
+
+    def record(self, name: str, start: float, end: float) -> None:
+        """Records a call of a stage from its `time.perf_counter` bounds"""
+
+        if name not in self.durations:
+            self.durations[name] = array("d")
+
+        self.durations[name].append(end - start)
+
+        if len(self.events) < self.max_events:
+            thread = threading.current_thread().name
+
+            if thread not in self.threads:
+                self.threads[thread] = len(self.threads)
+
+            self.events.append((name, self.threads[thread], start, end))
+
+    def start(self) -> None:
+        """Starts the wall clock of the loop"""
+
+        self.t0 = time.perf_counter()
+
+    def stop(self) -> None:
+        """Stops the wall clock of the loop"""
+
+        self.wall_time = time.perf_counter() - self.t0
+
+    def summary(self, cell_updates: int = 0) -> dict:
+        """Returns the statistics of every stage
+
+        Parameters
+        ----------
+        cell_updates : int, optional
+            Number of cells advanced during the run, summed over every step
+
+        Returns
+        -------
+        dict
+            Wall time of the loop, cell updates per second and, for each
+            stage, the number of calls, their total and the share of the
+            wall time, and their mean, median, 90th and 99th percentile
+            durations in seconds
+
+        """
+
+        wall_time = self.wall_time
+        if wall_time is None:
+            wall_time = time.perf_counter() - self.t0
+
+        stages = dict()
+        for name, durations in self.durations.items():
+            d = np.frombuffer(durations, dtype=np.float64)
+            p50, p90, p99 = np.percentile(d, [50, 90, 99])
+
+            stages[name] = dict(
+                calls=len(d),
+                total=float(d.sum()),
+                share=float(d.sum() / wall_time) if wall_time > 0 else 0.0,
+                mean=float(d.mean()),
+                p50=float(p50),
+                p90=float(p90),
+                p99=float(p99),
+            )
+
+        return dict(
+            wall_time=wall_time,
+            cell_updates_per_second=cell_updates / wall_time if wall_time > 0 else 0.0,
+            stages=stages,
+        )
+
+    def report(self, cell_updates: int = 0) -> str:
+        """Returns a table of the statistics of every stage
+
+        Parameters
+        ----------
+        cell_updates : int, optional
+            Number of cells advanced during the run, summed over every step
+
+        Returns
+        -------
+        str
+            The table, with durations in milliseconds
+
+        """
+
+        summary = self.summary(cell_updates)
+
+        lines = [
+            f"Profile of {summary['wall_time']:.3f} s, "
+            f"{summary['cell_updates_per_second']:.4g} cell updates per second, "
+            f"stage durations in ms",
+            f"{'Stage':<14}{'Calls':>8}{'Total (s)':>12}{'Share':>8}"
+            f"{'Mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}",
+        ]
+
+        for name, s in sorted(
+            summary["stages"].items(), key=lambda item: -item[1]["total"]
+        ):
+            lines.append(
+                f"{name:<14}{s['calls']:>8}{s['total']:>12.3f}{s['share']:>8.1%}"
+                f"{1e3 * s['mean']:>10.3f}{1e3 * s['p50']:>10.3f}"
+                f"{1e3 * s['p90']:>10.3f}{1e3 * s['p99']:>10.3f}"
+            )
+
+        return "\n".join(lines)
+
+    def save(self, fname_base: str = "profile", cell_updates: int = 0) -> None:
+        """Saves the statistics and the Chrome trace of the run
+
+        Parameters
+        ----------
+        fname_base : str, optional
+            The statistics are written to `<fname_base>.json` and the trace
+            to `<fname_base>_trace.json`
+        cell_updates : int, optional
+            Number of cells advanced during the run, summed over every step
+
+        """
+
+        with open(f"{fname_base}.json", "w") as f:
+            json.dump(self.summary(cell_updates), f, indent=2)
+
+        # Complete events, in microseconds from the start of the loop
+        trace = [
+            dict(name="thread_name", ph="M", pid=0, tid=tid, args=dict(name=thread))
+            for thread, tid in self.threads.items()
+        ]
+        trace += [
+            dict(
+                name=name,
+                ph="X",
+                pid=0,
+                tid=tid,
+                ts=1e6 * (start - self.t0),
+                dur=1e6 * (end - start),
+            )
+            for name, tid, start, end in self.events
+        ]
+
+        with open(f"{fname_base}_trace.json", "w") as f:
+            json.dump(dict(traceEvents=trace, displayTimeUnit="ms"), f)
+
+
+# Profiler used when none is given, which times nothing
+NULL_PROFILER = PsychoProfiler(enabled=False)
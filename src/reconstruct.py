@@ -1,4 +1,59 @@
 import numpy as np
+from typing import Optional, Tuple
+from src.jit import HAVE_NUMBA, njit
+
+# Slope limiters, passed to the compiled kernels as integers. The beta
+# family spans minmod (beta = 1) to superbee (beta = 2)
+BETA = 0
+VAN_LEER = 1
+MC = 2
+
+# Limiter and beta of each name accepted by `slope_limiter` in the input,
+# the beta family taking `limiter_beta`
+LIMITERS = {
+    "minmod": (BETA, 1.0),
+    "superbee": (BETA, 2.0),
+    "beta": (BETA, None),
+    "van_leer": (VAN_LEER, 1.0),
+    "mc": (MC, 1.0),
+}
+
+
+def get_limiter(pin) -> Tuple[int, float]:
+    """Returns the slope limiter chosen in the problem input
+
+    Parameters
+    ----------
+    pin : PsychoInput
+        Contains the problem information stored in the PsychoInput
+        object, where `slope_limiter` names one of `LIMITERS` (minmod by
+        default) and `limiter_beta` sets beta for the beta family
+
+    Returns
+    -------
+    limiter : int
+        One of `BETA`, `VAN_LEER` or `MC`
+    beta : float
+        Weight of the beta family, between 1 and 2
+
+    """
+
+    name = pin.value_dict.get("slope_limiter", "minmod")
+
+    if name not in LIMITERS:
+        raise ValueError(
+            f"Please use an implemented slope limiter: {', '.join(LIMITERS)}"
+        )
+
+    limiter, beta = LIMITERS[name]
+
+    if beta is None:
+        beta = float(pin.value_dict.get("limiter_beta", 1.0))
+
+        if not 1.0 <= beta <= 2.0:
+            raise ValueError("Please use a limiter beta between 1 and 2")
+
+    return limiter, beta
 
 
 def get_unlimited_slopes(
@@ -60,6 +115,106 @@ def get_unlimited_slopes(
     return delta_i, delta_j
 
 
+def _limit_into(
+    delta_m: np.ndarray, delta_p: np.ndarray, beta: float, scratch: np.ndarray
+) -> None:
+    """Limits the slopes in place, delta_m receives the limited slope
+
+    For beta > 0 the limit for a positive forward difference is never
+    negative and the limit for a negative one is never positive, so the
+    branch that does not apply is exactly zero and the two can be summed
+    instead of selected with a mask.
+
+    """
+    A, B, C, D = scratch
+
+    np.multiply(beta, delta_m, out=A)
+    np.multiply(beta, delta_p, out=B)
+
+    # Positive slope limits
+    np.minimum(A, delta_p, out=C)
+    np.minimum(delta_m, B, out=D)
+    np.maximum(C, D, out=C)
+    np.maximum(0.0, C, out=C)
+
+    # Negative slope limits
+    np.maximum(A, delta_p, out=A)
+    np.maximum(delta_m, B, out=D)
+    np.minimum(A, D, out=A)
+    np.minimum(0.0, A, out=A)
+
+    np.add(C, A, out=delta_m)
+
+
+def _limit_into_van_leer(
+    delta_m: np.ndarray, delta_p: np.ndarray, scratch: np.ndarray
+) -> None:
+    """Limits the slopes in place with van Leer, delta_m receives the limited slope"""
+    A, B = scratch[:2]
+
+    np.multiply(delta_m, delta_p, out=A)
+    np.add(delta_m, delta_p, out=B)
+    A *= 2.0
+
+    delta_m[...] = 0.0
+    np.divide(A, B, out=delta_m, where=A > 0.0)
+
+
+def _limit_into_mc(
+    delta_m: np.ndarray, delta_p: np.ndarray, scratch: np.ndarray
+) -> None:
+    """Limits the slopes in place with MC, delta_m receives the limited slope
+
+    The positive and negative limits are summed as in `_limit_into`.
+
+    """
+    A, B, C, D = scratch
+
+    np.multiply(2.0, delta_m, out=A)
+    np.multiply(2.0, delta_p, out=B)
+    np.add(delta_m, delta_p, out=C)
+    C *= 0.5
+
+    # Positive slope limits
+    np.minimum(A, B, out=D)
+    np.minimum(D, C, out=D)
+    np.maximum(0.0, D, out=D)
+
+    # Negative slope limits
+    np.maximum(A, B, out=A)
+    np.maximum(A, C, out=A)
+    np.minimum(0.0, A, out=A)
+
+    np.add(D, A, out=delta_m)
+
+
+@njit()
+def _limited_slopes_cells(
+    U_i_j: np.ndarray,
+    U_ip1_j: np.ndarray,
+    U_im1_j: np.ndarray,
+    U_i_jp1: np.ndarray,
+    U_i_jm1: np.ndarray,
+    limiter: int,
+    beta: float,
+    delta_i: np.ndarray,
+    delta_j: np.ndarray,
+) -> None:
+    """Limited slopes of all cells written in a single pass over the grid"""
+
+    for n in range(U_i_j.shape[0]):
+        for i in range(U_i_j.shape[1]):
+            for j in range(U_i_j.shape[2]):
+                U = U_i_j[n, i, j]
+
+                delta_i[n, i, j] = limited_slope(
+                    U - U_im1_j[n, i, j], U_ip1_j[n, i, j] - U, limiter, beta
+                )
+                delta_j[n, i, j] = limited_slope(
+                    U - U_i_jm1[n, i, j], U_i_jp1[n, i, j] - U, limiter, beta
+                )
+
+
 def get_limited_slopes(
     U_i_j: np.ndarray,
     U_ip1_j: np.ndarray,
@@ -67,11 +222,17 @@ def get_limited_slopes(
     U_i_jp1: np.ndarray,
     U_i_jm1: np.ndarray,
     beta: float,
+    out: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    scratch: Optional[np.ndarray] = None,
+    limiter: int = BETA,
 ):
-    """Minmod slope limiter to handle discontinuities
+    """Slope limiter to handle discontinuities
 
-    Minimod slope limiter based on page 508 in [1], necessary
-    for handling discontinuities
+    Limits the slopes with the beta family on page 508 in [1], which is
+    minmod for beta = 1 and superbee for beta = 2, or with the van Leer or
+    MC limiter, necessary for handling discontinuities. With numba the
+    slopes are found in a single compiled pass writing straight into the
+    outputs, otherwise with NumPy operations on the scratch array.
 
     Parameters
     ----------
@@ -95,6 +256,17 @@ def get_limited_slopes(
         Default value is 1.0 which represents a
         minmod limiter
 
+    out : tuple[ndarray[float], ndarray[float]], optional
+        Arrays shaped like U_i_j to receive delta_i and delta_j
+
+    scratch : ndarray[float], optional
+        Array of shape (5, *U_i_j.shape) used for intermediate values
+        without numba
+
+    limiter : int, optional
+        One of `BETA` (the default), `VAN_LEER` or `MC`, beta is only
+        used by the beta family
+
     Returns
     -------
     delta_i : ndarray[float]
@@ -109,54 +281,104 @@ def get_limited_slopes(
     A practical introduction. Springer.
 
     """
-    delta_imoh = U_i_j - U_im1_j
-    delta_ipoh = U_ip1_j - U_i_j
-    delta_jmoh = U_i_j - U_i_jm1
-    delta_jpoh = U_i_jp1 - U_i_j
+    if limiter not in [BETA, VAN_LEER, MC]:
+        raise ValueError("Please use an implemented slope limiter")
+
+    if out is None:
+        out = (np.empty_like(U_i_j), np.empty_like(U_i_j))
+
+    delta_i, delta_j = out
+
+    if HAVE_NUMBA:
+        _limited_slopes_cells(
+            U_i_j, U_ip1_j, U_im1_j, U_i_jp1, U_i_jm1, limiter, beta, delta_i, delta_j
+        )
+
+        return delta_i, delta_j
 
-    i_up = np.where(delta_ipoh > 0.0)
-    i_dn = np.where(delta_ipoh <= 0.0)
-    j_up = np.where(delta_jpoh > 0.0)
-    j_dn = np.where(delta_jpoh <= 0.0)
-
-    zero_arr = np.zeros_like(U_i_j)
-    delta_i = np.zeros_like(U_i_j)
-    delta_j = np.zeros_like(U_i_j)
-
-    # Positive slope limits in x direction
-    delta_i[i_up] = np.maximum(
-        zero_arr[i_up],
-        np.maximum(
-            np.minimum(beta * delta_imoh[i_up], delta_ipoh[i_up]),
-            np.minimum(delta_imoh[i_up], beta * delta_ipoh[i_up]),
-        ),
-    )
-
-    # Negative slope limits in x direction
-    delta_i[i_dn] = np.minimum(
-        zero_arr[i_dn],
-        np.minimum(
-            np.maximum(beta * delta_imoh[i_dn], delta_ipoh[i_dn]),
-            np.maximum(delta_imoh[i_dn], beta * delta_ipoh[i_dn]),
-        ),
-    )
-
-    # Positive slope limits in y direction
-    delta_j[j_up] = np.maximum(
-        zero_arr[j_up],
-        np.maximum(
-            np.minimum(beta * delta_jmoh[j_up], delta_jpoh[j_up]),
-            np.minimum(delta_jmoh[j_up], beta * delta_jpoh[j_up]),
-        ),
-    )
-
-    # Negative slope limits in y direction
-    delta_j[j_dn] = np.minimum(
-        zero_arr[j_dn],
-        np.minimum(
-            np.maximum(beta * delta_jmoh[j_dn], delta_jpoh[j_dn]),
-            np.maximum(delta_jmoh[j_dn], beta * delta_jpoh[j_dn]),
-        ),
-    )
+    if scratch is None:
+        scratch = np.empty((5,) + U_i_j.shape, dtype=U_i_j.dtype)
+
+    delta_p = scratch[0]
+
+    for delta, U_p, U_m in [(delta_i, U_ip1_j, U_im1_j), (delta_j, U_i_jp1, U_i_jm1)]:
+        np.subtract(U_i_j, U_m, out=delta)
+        np.subtract(U_p, U_i_j, out=delta_p)
+
+        if limiter == VAN_LEER:
+            _limit_into_van_leer(delta, delta_p, scratch[1:])
+        elif limiter == MC:
+            _limit_into_mc(delta, delta_p, scratch[1:])
+        else:
+            _limit_into(delta, delta_p, beta, scratch[1:])
 
     return delta_i, delta_j
+
+
+@njit()
+def limit_slope(delta_m: float, delta_p: float, beta: float) -> float:
+    """Limited slope for a single cell and variable
+
+    Scalar form of the limiter used in `get_limited_slopes`, for use inside
+    compiled loops where building the shifted arrays is not wanted.
+
+    Parameters
+    ----------
+    delta_m : float
+        Backward difference, U_i - U_{i-1}
+
+    delta_p : float
+        Forward difference, U_{i+1} - U_i
+
+    beta : float
+        Weight value determining type of limiter.
+        A value of 1.0 represents a minmod limiter
+
+    Returns
+    -------
+    float
+        Limited slope
+
+    """
+    if delta_p > 0.0:
+        return max(0.0, max(min(beta * delta_m, delta_p), min(delta_m, beta * delta_p)))
+
+    return min(0.0, min(max(beta * delta_m, delta_p), max(delta_m, beta * delta_p)))
+
+
+@njit()
+def limited_slope(delta_m: float, delta_p: float, limiter: int, beta: float) -> float:
+    """Limited slope for a single cell and variable with any of the limiters
+
+    Parameters
+    ----------
+    delta_m : float
+        Backward difference, U_i - U_{i-1}
+
+    delta_p : float
+        Forward difference, U_{i+1} - U_i
+
+    limiter : int
+        One of `BETA`, `VAN_LEER` or `MC`
+
+    beta : float
+        Weight of the beta family, 1.0 for minmod and 2.0 for superbee
+
+    Returns
+    -------
+    float
+        Limited slope
+
+    """
+    if limiter == BETA:
+        return limit_slope(delta_m, delta_p, beta)
+
+    if limiter == VAN_LEER:
+        product = delta_m * delta_p
+        return 2.0 * product / (delta_m + delta_p) if product > 0.0 else 0.0
+
+    centred = 0.5 * (delta_m + delta_p)
+    if delta_p > 0.0:
+        return max(0.0, min(min(2.0 * delta_m, 2.0 * delta_p), centred))
+
+    return min(0.0, max(max(2.0 * delta_m, 2.0 * delta_p), centred))
@@ -0,0 +1,616 @@
+###################################################################
+#                                                                 #
+#      Contains the kernels advancing Un by a single timestep     #
+#                                                                 #
+###################################################################
+
+import numpy as np
+import sys
+from typing import Callable
+
+sys.path.append("..")
+from src.mesh import Workspace
+from src.reconstruct import BETA, get_limited_slopes, limit_slope, limited_slope
+from src.tools import get_fluxes_2d, get_fluxes_point
+from src.riemann import solve_riemann, hllc_flux_point
+from src.jit import njit, prange, get_num_threads
+from src.profiler import NULL_PROFILER, PsychoProfiler
+
+
+@njit()
+def _reconstruct_row(
+    Un: np.ndarray, i: int, W: np.ndarray, limiter: int, beta: float
+) -> None:
+    """Boundary extrapolated values of one row, written into W
+
+    Minmod, the default, has a loop of its own with beta fixed to 1, which
+    compiles to the same code as before the limiter could be chosen.
+
+    """
+
+    if limiter == BETA and beta == 1.0:
+        for j in range(1, Un.shape[2] - 1):
+            for n in range(4):
+                U = Un[n, i, j]
+                delta_i = limit_slope(U - Un[n, i - 1, j], Un[n, i + 1, j] - U, 1.0)
+                delta_j = limit_slope(U - Un[n, i, j - 1], Un[n, i, j + 1] - U, 1.0)
+
+                W[0, n, j] = U - 1 / 2 * delta_i
+                W[1, n, j] = U + 1 / 2 * delta_i
+                W[2, n, j] = U - 1 / 2 * delta_j
+                W[3, n, j] = U + 1 / 2 * delta_j
+
+        return
+
+    for j in range(1, Un.shape[2] - 1):
+        for n in range(4):
+            U = Un[n, i, j]
+            delta_i = limited_slope(
+                U - Un[n, i - 1, j], Un[n, i + 1, j] - U, limiter, beta
+            )
+            delta_j = limited_slope(
+                U - Un[n, i, j - 1], Un[n, i, j + 1] - U, limiter, beta
+            )
+
+            W[0, n, j] = U - 1 / 2 * delta_i
+            W[1, n, j] = U + 1 / 2 * delta_i
+            W[2, n, j] = U - 1 / 2 * delta_j
+            W[3, n, j] = U + 1 / 2 * delta_j
+
+
+@njit()
+def _predict_row(
+    Un: np.ndarray,
+    i: int,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    W: np.ndarray,
+    limiter: int,
+    beta: float,
+) -> None:
+    """Boundary extrapolated values advanced by half a timestep for one row
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables
+    i : int
+        Index of the row in the x1 direction
+    dt : float
+        Timestep
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    W : ndarray[float]
+        Output of shape (4, nvar, nx2 + 2 * ng) holding the left and right
+        values in x followed by the left and right values in y
+    limiter : int
+        Slope limiter, one of the limiters of `src.reconstruct`
+    beta : float
+        Weight of the beta family of limiters
+
+    """
+
+    hx = 1 / 2 * dt / dx1
+    hy = 1 / 2 * dt / dx2
+
+    # Data reconstruction
+    _reconstruct_row(Un, i, W, limiter, beta)
+
+    for j in range(1, Un.shape[2] - 1):
+
+        # Advance by half timestep, y fluxes come back as (normal, tangential)
+        F_L = get_fluxes_point(W[0, 0, j], W[0, 1, j], W[0, 2, j], W[0, 3, j], gamma)
+        F_R = get_fluxes_point(W[1, 0, j], W[1, 1, j], W[1, 2, j], W[1, 3, j], gamma)
+        G_L = get_fluxes_point(W[2, 0, j], W[2, 2, j], W[2, 1, j], W[2, 3, j], gamma)
+        G_R = get_fluxes_point(W[3, 0, j], W[3, 2, j], W[3, 1, j], W[3, 3, j], gamma)
+
+        int_flux_0 = hx * (F_L[0] - F_R[0]) + hy * (G_L[0] - G_R[0])
+        int_flux_1 = hx * (F_L[1] - F_R[1]) + hy * (G_L[2] - G_R[2])
+        int_flux_2 = hx * (F_L[2] - F_R[2]) + hy * (G_L[1] - G_R[1])
+        int_flux_3 = hx * (F_L[3] - F_R[3]) + hy * (G_L[3] - G_R[3])
+
+        for k in range(4):
+            W[k, 0, j] += int_flux_0
+            W[k, 1, j] += int_flux_1
+            W[k, 2, j] += int_flux_2
+            W[k, 3, j] += int_flux_3
+
+
+@njit()
+def _x_fluxes(W_l: np.ndarray, W_r: np.ndarray, gamma: float, F: np.ndarray) -> None:
+    """Fluxes through the x faces between two predicted rows"""
+
+    for j in range(2, W_l.shape[2] - 2):
+        F[0, j], F[1, j], F[2, j], F[3, j] = hllc_flux_point(
+            W_l[1, 0, j],
+            W_l[1, 1, j],
+            W_l[1, 2, j],
+            W_l[1, 3, j],
+            W_r[0, 0, j],
+            W_r[0, 1, j],
+            W_r[0, 2, j],
+            W_r[0, 3, j],
+            gamma,
+        )
+
+
+@njit()
+def _y_flux(W: np.ndarray, j: int, gamma: float):
+    """Flux through the y face between cells j and j + 1 of a predicted row"""
+
+    g_rho, g_n, g_t, g_E = hllc_flux_point(
+        W[3, 0, j],
+        W[3, 2, j],
+        W[3, 1, j],
+        W[3, 3, j],
+        W[2, 0, j + 1],
+        W[2, 2, j + 1],
+        W[2, 1, j + 1],
+        W[2, 3, j + 1],
+        gamma,
+    )
+
+    return g_rho, g_t, g_n, g_E
+
+
+@njit()
+def _advance_rows(
+    Un: np.ndarray,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    i_start: int,
+    i_end: int,
+    limiter: int,
+    beta: float,
+) -> None:
+    """Advance the rows i_start <= i < i_end of Un into out
+
+    Sweeps the rows in order, keeping only the predicted values of the
+    current and next row and the fluxes through the x faces bounding the
+    current row, so the scratch memory is proportional to a single row.
+
+    """
+
+    nx2 = Un.shape[2]
+
+    W_cur = np.empty((4, 4, nx2))
+    W_next = np.empty((4, 4, nx2))
+    F_lo = np.empty((4, nx2))
+    F_hi = np.empty((4, nx2))
+
+    _predict_row(Un, i_start - 1, dt, dx1, dx2, gamma, W_next, limiter, beta)
+    _predict_row(Un, i_start, dt, dx1, dx2, gamma, W_cur, limiter, beta)
+    _x_fluxes(W_next, W_cur, gamma, F_lo)
+
+    for i in range(i_start, i_end):
+
+        _predict_row(Un, i + 1, dt, dx1, dx2, gamma, W_next, limiter, beta)
+        _x_fluxes(W_cur, W_next, gamma, F_hi)
+
+        G_lo = _y_flux(W_cur, 1, gamma)
+
+        for j in range(2, nx2 - 2):
+
+            G_hi = _y_flux(W_cur, j, gamma)
+
+            # Conservative update
+            for n in range(4):
+                out[n, i, j] = Un[n, i, j] + (
+                    dt / dx1 * (F_lo[n, j] - F_hi[n, j])
+                    + dt / dx2 * (G_lo[n] - G_hi[n])
+                )
+
+            G_lo = G_hi
+
+        for n in range(4):
+            out[n, i, :2] = Un[n, i, :2]
+            out[n, i, nx2 - 2 :] = Un[n, i, nx2 - 2 :]
+
+        W_cur, W_next = W_next, W_cur
+        F_lo, F_hi = F_hi, F_lo
+
+
+@njit()
+def muscl_hancock_step_rows(
+    Un: np.ndarray,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    i_start: int,
+    i_end: int,
+    limiter: int = BETA,
+    beta: float = 1.0,
+) -> None:
+    """Advance the rows i_start <= i < i_end by one MUSCL-Hancock timestep
+
+    Same as `muscl_hancock_step` restricted to a range of rows in the x1
+    direction, so that the grid can be shared out between workers. Rows in
+    the range that lie in the two layers next to the boundaries are copied
+    over unchanged.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables at the current time, with boundary conditions
+        already enforced
+    dt : float
+        Timestep
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    out : ndarray[float]
+        Array with the shape of Un which receives the conserved variables
+        at the next time. Must not be the same array as Un
+    i_start, i_end : int
+        Range of rows of Un to advance
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    """
+
+    nx1 = Un.shape[1]
+
+    for i in range(i_start, min(i_end, 2)):
+        out[:, i, :] = Un[:, i, :]
+
+    for i in range(max(i_start, nx1 - 2), i_end):
+        out[:, i, :] = Un[:, i, :]
+
+    if max(i_start, 2) < min(i_end, nx1 - 2):
+        _advance_rows(
+            Un,
+            dt,
+            dx1,
+            dx2,
+            gamma,
+            out,
+            max(i_start, 2),
+            min(i_end, nx1 - 2),
+            limiter,
+            beta,
+        )
+
+
+@njit(nogil=True)
+def muscl_hancock_step(
+    Un: np.ndarray,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    limiter: int = BETA,
+    beta: float = 1.0,
+) -> None:
+    """Advance the conserved variables by one MUSCL-Hancock timestep
+
+    Fuses the slope limiting, boundary extrapolation, half timestep
+    predictor, Riemann solves and conservative update into a single sweep
+    over the cells, without creating any intermediate arrays the size of
+    the grid. The result is the same as `muscl_hancock_staged_step` to
+    round-off.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables at the current time, with boundary conditions
+        already enforced
+    dt : float
+        Timestep
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    out : ndarray[float]
+        Array with the shape of Un which receives the conserved variables
+        at the next time. Must not be the same array as Un
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    References
+    ----------
+    [1] Toro, E. F. (2011). Riemann solvers and Numerical Methods for fluid dynamics:
+    A practical introduction. Springer.
+
+    """
+
+    muscl_hancock_step_rows(Un, dt, dx1, dx2, gamma, out, 0, Un.shape[1], limiter, beta)
+
+
+def muscl_hancock_step_parallel(
+    Un: np.ndarray,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    limiter: int = BETA,
+    beta: float = 1.0,
+) -> None:
+    """Advance the conserved variables by one MUSCL-Hancock timestep using threads
+
+    Same as `muscl_hancock_step`, with the rows split into one contiguous
+    block per thread. Each block keeps its own row scratch and recomputes
+    the predicted values of the row just outside it, so the result is
+    identical to the serial kernel. The number of threads is set with
+    `numba.set_num_threads`.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables at the current time, with boundary conditions
+        already enforced
+    dt : float
+        Timestep
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    out : ndarray[float]
+        Array with the shape of Un which receives the conserved variables
+        at the next time. Must not be the same array as Un
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    """
+
+    # The thread count is read outside the compiled kernel, which could
+    # not be cached with the numba call in it
+    nblocks = min(get_num_threads(), Un.shape[1] - 4)
+    _step_blocks(Un, dt, dx1, dx2, gamma, out, nblocks, limiter, beta)
+
+
+@njit(parallel=True, nogil=True)
+def _step_blocks(
+    Un: np.ndarray,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    nblocks: int,
+    limiter: int,
+    beta: float,
+) -> None:
+    """`muscl_hancock_step_parallel` with the rows split into nblocks blocks"""
+
+    nx1 = Un.shape[1]
+
+    out[:, :2, :] = Un[:, :2, :]
+    out[:, nx1 - 2 :, :] = Un[:, nx1 - 2 :, :]
+
+    nrows = nx1 - 4
+
+    for b in prange(nblocks):
+        i_start = 2 + (b * nrows) // nblocks
+        i_end = 2 + ((b + 1) * nrows) // nblocks
+        _advance_rows(Un, dt, dx1, dx2, gamma, out, i_start, i_end, limiter, beta)
+
+
+@njit(nogil=True)
+def muscl_hancock_step_ensemble(
+    Un: np.ndarray,
+    dt: np.ndarray,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    limiter: int = BETA,
+    beta: float = 1.0,
+) -> None:
+    """Advance every member of an ensemble by one MUSCL-Hancock timestep
+
+    Applies `muscl_hancock_step` to each member of Un in a single compiled
+    call, so each member is advanced exactly as it would be on its own.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables of shape (nens, nvar, nx1 + 2 * ng, nx2 + 2 * ng)
+        at the current time, with boundary conditions already enforced
+    dt : ndarray[float]
+        Timestep of each member
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    out : ndarray[float]
+        Array with the shape of Un which receives the conserved variables
+        at the next time. Must not be the same array as Un
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    """
+
+    for m in range(Un.shape[0]):
+        muscl_hancock_step_rows(
+            Un[m], dt[m], dx1, dx2, gamma, out[m], 0, Un.shape[2], limiter, beta
+        )
+
+
+@njit(parallel=True, nogil=True)
+def muscl_hancock_step_ensemble_parallel(
+    Un: np.ndarray,
+    dt: np.ndarray,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    out: np.ndarray,
+    limiter: int = BETA,
+    beta: float = 1.0,
+) -> None:
+    """Advance every member of an ensemble by one MUSCL-Hancock timestep using threads
+
+    Same as `muscl_hancock_step_ensemble`, with the members distributed
+    across threads. The number of threads is set with
+    `numba.set_num_threads`.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables of shape (nens, nvar, nx1 + 2 * ng, nx2 + 2 * ng)
+        at the current time, with boundary conditions already enforced
+    dt : ndarray[float]
+        Timestep of each member
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    out : ndarray[float]
+        Array with the shape of Un which receives the conserved variables
+        at the next time. Must not be the same array as Un
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    """
+
+    for m in prange(Un.shape[0]):
+        muscl_hancock_step_rows(
+            Un[m], dt[m], dx1, dx2, gamma, out[m], 0, Un.shape[2], limiter, beta
+        )
+
+
+def muscl_hancock_staged_step(
+    Un: np.ndarray,
+    dt: float,
+    dx1: float,
+    dx2: float,
+    gamma: float,
+    ws: Workspace,
+    riemann_solver: Callable = solve_riemann,
+    profiler: PsychoProfiler = NULL_PROFILER,
+    limiter: int = BETA,
+    beta: float = 1.0,
+) -> None:
+    """Advance the conserved variables by one MUSCL-Hancock timestep in place
+
+    Applies each stage of the scheme to the whole grid in turn. This is
+    slower than `muscl_hancock_step`, but each stage can be swapped out or
+    inspected on its own. Every stage writes into the arrays owned by the
+    workspace, so with `solve_riemann` no arrays the size of the grid are
+    created. `solve_riemann_numpy`, and `get_fluxes_2d` when numba is
+    missing, still create NumPy temporaries.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables, with boundary conditions already enforced
+    dt : float
+        Timestep
+    dx1, dx2 : float
+        Step size in the x1 and x2 directions
+    gamma : float
+        Specific heat ratio
+    ws : Workspace
+        Scratch arrays for the intermediate stages
+    riemann_solver : Callable
+        Function with the signature of `solve_riemann` used to find the
+        fluxes through the faces
+    profiler : PsychoProfiler, optional
+        Times the slopes, predictor, both Riemann solves and the update
+    limiter : int, optional
+        Slope limiter, one of the limiters of `src.reconstruct`, `BETA` by
+        default
+    beta : float, optional
+        Weight of the beta family of limiters, 1.0 (minmod) by default
+
+    """
+
+    # Data Reconstruction
+
+    # Getting arrays with shifted indices to calculate slopes
+    U_i_j = Un[:, 1:-1, 1:-1]
+    U_ip1_j = Un[:, 2:, 1:-1]
+    U_im1_j = Un[:, :-2, 1:-1]
+    U_i_jp1 = Un[:, 1:-1, 2:]
+    U_i_jm1 = Un[:, 1:-1, :-2]
+
+    with profiler.stage("slopes"):
+        delta_i, delta_j = get_limited_slopes(
+            U_i_j,
+            U_ip1_j,
+            U_im1_j,
+            U_i_jp1,
+            U_i_jm1,
+            beta=beta,
+            out=(ws.delta_i, ws.delta_j),
+            scratch=ws.slope_scratch,
+            limiter=limiter,
+        )
+
+    # Evolution step
+    # Boundary extrapolated values
+    with profiler.stage("predictor"):
+        delta_i *= 1 / 2
+        delta_j *= 1 / 2
+
+        np.subtract(U_i_j, delta_i, out=ws.U_i_L)
+        np.add(U_i_j, delta_i, out=ws.U_i_R)
+        np.subtract(U_i_j, delta_j, out=ws.U_j_L)
+        np.add(U_i_j, delta_j, out=ws.U_j_R)
+
+        # Advance by half timestep
+        get_fluxes_2d(ws.U_i_L, gamma, "x", out=ws.F_i_L)
+        get_fluxes_2d(ws.U_i_R, gamma, "x", out=ws.F_i_R)
+        get_fluxes_2d(ws.U_j_L, gamma, "y", out=ws.G_j_L)
+        get_fluxes_2d(ws.U_j_R, gamma, "y", out=ws.G_j_R)
+
+        np.subtract(ws.F_i_L, ws.F_i_R, out=ws.int_flux)
+        ws.int_flux *= 1 / 2 * dt / dx1
+        ws.G_j_L -= ws.G_j_R
+        ws.G_j_L *= 1 / 2 * dt / dx2
+        ws.int_flux += ws.G_j_L
+
+        ws.U_i_L += ws.int_flux
+        ws.U_i_R += ws.int_flux
+        ws.U_j_L += ws.int_flux
+        ws.U_j_R += ws.int_flux
+
+    # Riemann Problem
+    # Set up Riemann states
+    U_l_i_riemann = ws.U_i_R[:, :-1, :]
+    U_r_i_riemann = ws.U_i_L[:, 1:, :]
+    U_l_j_riemann = ws.U_j_R[:, :, :-1]
+    U_r_j_riemann = ws.U_j_L[:, :, 1:]
+
+    # Do the solve
+    with profiler.stage("riemann_x"):
+        F = riemann_solver(U_l_i_riemann, U_r_i_riemann, gamma, "x", out=ws.F)
+
+    with profiler.stage("riemann_y"):
+        G = riemann_solver(U_l_j_riemann, U_r_j_riemann, gamma, "y", out=ws.G)
+
+    # Conservative update
+    with profiler.stage("update"):
+        np.subtract(F[:, :-1, 1:-1], F[:, 1:, 1:-1], out=ws.dU_i)
+        ws.dU_i *= dt / dx1
+        np.subtract(G[:, 1:-1, :-1], G[:, 1:-1, 1:], out=ws.dU_j)
+        ws.dU_j *= dt / dx2
+        ws.dU_i += ws.dU_j
+
+        Un[:, 2:-2, 2:-2] += ws.dU_i
@@ -0,0 +1,224 @@
+###################################################################
+#                                                                 #
+#     Contains the runner for sweeps over the input parameters    #
+#                                                                 #
+###################################################################
+
+import csv
+import itertools
+import multiprocessing as mp
+import numpy as np
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from typing import Callable
+
+sys.path.append("..")
+from src.jit import HAVE_NUMBA
+from src.reconstruct import BETA
+from src.step import muscl_hancock_step
+from src.tools import get_primitive_variables_2d
+
+
+class PsychoSweep:
+    """Class containing a sweep over the parameters of an input file
+
+    The sweep file names the base input file with `base` and lists the
+    values of each parameter in brackets, e.g. `rho1 = [1.5, 2.0]`. Every
+    combination of the values is run as one case. Parameters separated by
+    commas, e.g. `nx1, nx2 = [64, 128]`, take the same value together.
+    Values are copied into the input file of each case as written, so they
+    are parsed exactly as if the base input file had been edited by hand.
+
+    Parameters
+    ----------
+    sweep_fname : str
+        The name of the sweep file
+
+    Attributes
+    ----------
+    base_fname : str
+        The name of the base input file
+
+    problem_name : str
+        Problem name, taken from the name of the base input file
+
+    parameters : list[tuple[str, ...]]
+        Groups of parameters that are varied together
+
+    values : list[list[str]]
+        Values taken by each group of parameters
+
+    """
+
+    def __init__(self, sweep_fname: str):
+
+        self.base_fname = None
+        self.parameters = []
+        self.values = []
+
+        with open(sweep_fname) as f:
+
+            lines = (line.strip() for line in f)
+            lines = (line for line in lines if line and not line.startswith("#"))
+
+            for line in lines:
+                key = line.split("=")[0].strip()
+                val = line.split("=")[1].strip()
+
+                if key == "base":
+                    self.base_fname = val
+                else:
+                    self.parameters.append(tuple(k.strip() for k in key.split(",")))
+                    self.values.append([v.strip() for v in val.strip("[]").split(",")])
+
+        if self.base_fname is None:
+            raise ValueError("Please give the base input file of the sweep")
+
+        self.problem_name = os.path.splitext(os.path.basename(self.base_fname))[0]
+
+    def cases(self) -> list:
+        """Returns the parameters of every case in the sweep
+
+        Returns
+        -------
+        list[dict]
+            The value of each parameter for every combination of values
+
+        """
+
+        cases = []
+        for combination in itertools.product(*self.values):
+            case = dict()
+            for keys, val in zip(self.parameters, combination):
+                for key in keys:
+                    case[key] = val
+            cases.append(case)
+
+        return cases
+
+    def write_input_file(self, case: dict, input_fname: str) -> None:
+        """Writes the base input file with the parameters of one case
+
+        Parameters
+        ----------
+        case : dict
+            The value of each parameter which is changed
+        input_fname : str
+            The name of the input file to write
+
+        """
+
+        remaining = dict(case)
+
+        with open(self.base_fname) as f_base, open(input_fname, "w") as f:
+            for line in f_base:
+                key = line.split("=")[0].strip()
+
+                if not line.startswith("#") and key in remaining:
+                    line = f"{key} = {remaining.pop(key)}\n"
+
+                f.write(line)
+
+            for key, val in remaining.items():
+                f.write(f"\n{key} = {val}\n")
+
+
+def _warm_up() -> None:
+    """Compiles the default kernels once when a worker starts"""
+
+    if HAVE_NUMBA:
+        Un = np.ones((4, 8, 8))
+        muscl_hancock_step(Un, 0.0, 1.0, 1.0, 1.4, np.empty_like(Un), BETA, 1.0)
+        get_primitive_variables_2d(Un, 1.4)
+
+
+def _run_case(run: Callable, problem_name: str, case_dir: str) -> tuple:
+    """Runs one case inside its own directory, returns the wall time and status"""
+
+    cwd = os.getcwd()
+    os.chdir(case_dir)
+
+    start = time.perf_counter()
+
+    try:
+        with open("log.txt", "w") as log, redirect_stdout(log):
+            run(problem_name, f"{problem_name}.in")
+        status = "ok"
+
+    except Exception as e:
+        status = f"failed: {e!r}"
+
+    finally:
+        os.chdir(cwd)
+
+    return time.perf_counter() - start, status
+
+
+def run_sweep(sweep_fname: str, run: Callable, nworkers: int, output_dir: str) -> list:
+    """Runs every case of a sweep on a pool of worker processes
+
+    The workers live for the whole sweep, so the numba kernels are compiled
+    once per worker rather than once per case. Each case runs in its own
+    directory `output_dir/case_XXXX`, which holds its input file, its log
+    and its output. The parameters, wall time and status of every case are
+    written to `output_dir/index.csv`.
+
+    Parameters
+    ----------
+    sweep_fname : str
+        The name of the sweep file, see `PsychoSweep`
+    run : Callable
+        Function with the signature of `psycho.run` which runs one case
+    nworkers : int
+        Number of worker processes
+    output_dir : str
+        Directory receiving the cases and the index
+
+    Returns
+    -------
+    list[dict]
+        The rows of the index, one per case
+
+    """
+
+    sweep = PsychoSweep(sweep_fname)
+    cases = sweep.cases()
+
+    case_dirs = []
+    for n, case in enumerate(cases):
+        case_dir = os.path.abspath(os.path.join(output_dir, f"case_{n:04d}"))
+        os.makedirs(case_dir, exist_ok=True)
+        sweep.write_input_file(case, os.path.join(case_dir, f"{sweep.problem_name}.in"))
+        case_dirs.append(case_dir)
+
+    # The workers are not forked, as forking once the numba threading layer
+    # is running leaves the main process hanging at exit
+    ctx = mp.get_context("forkserver")
+
+    with ctx.Pool(nworkers, initializer=_warm_up) as pool:
+        results = pool.starmap(
+            _run_case,
+            [(run, sweep.problem_name, case_dir) for case_dir in case_dirs],
+            chunksize=1,
+        )
+
+    index = []
+    for n, (case, case_dir, (wall_time, status)) in enumerate(
+        zip(cases, case_dirs, results)
+    ):
+        row = {"case": n, "directory": case_dir}
+        row.update(case)
+        row["wall_time"] = wall_time
+        row["status"] = status
+        index.append(row)
+
+    with open(os.path.join(output_dir, "index.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=["case", "directory", *cases[0].keys(), "wall_time", "status"]
+        )
+        writer.writeheader()
+        writer.writerows(index)
+
+    return index
@@ -1,10 +1,11 @@
 import numpy as np
 import sys
+from typing import Union
 
 sys.path.append("..")
 from src.mesh import PsychoArray
 from src.eos import p_EOS
-from numba import njit
+from src.jit import HAVE_NUMBA, njit
 
 
 @njit()
@@ -43,12 +44,13 @@ def get_primitive_variables_1d(Un: np.ndarray, gamma: float):
     return rho, u, v, p
 
 
-@njit()
+@njit(nogil=True)
 def get_primitive_variables_2d(Un: np.ndarray, gamma: float):
     """Returns the primitive variables for all points provided Un.
 
     This function returns the primitive variables for all points
-    provided the conserved variables Un are provided.
+    provided the conserved variables Un are provided. A leading ensemble
+    dimension of Un is kept in the primitive variables.
 
     Parameters
     ----------
@@ -70,10 +72,10 @@ def get_primitive_variables_2d(Un: np.ndarray, gamma: float):
 
     """
 
-    rho = Un[0, :, :]
-    u = Un[1, :, :] / rho
-    v = Un[2, :, :] / rho
-    e = Un[3, :, :] / rho - 1 / 2 * rho * (u * u + v * v)
+    rho = Un[..., 0, :, :]
+    u = Un[..., 1, :, :] / rho
+    v = Un[..., 2, :, :] / rho
+    e = Un[..., 3, :, :] / rho - 1 / 2 * rho * (u * u + v * v)
 
     p = p_EOS(rho, e, gamma)
 
@@ -124,29 +126,124 @@ def get_fluxes_1d(Un: np.ndarray, gamma: float, direction: str) -> np.ndarray:
 
 
 @njit()
-def get_fluxes_2d(Un: np.ndarray, gamma: float, direction: str) -> np.ndarray:
-    """Returns fluxes provided the conserved variables, Un, for all cells
+def get_primitive_variables_point(
+    rho: float, mom_x: float, mom_y: float, E: float, gamma: float
+):
+    """Returns the primitive variables at a point provided scalar Un.
 
-    This function returns the fluxes in the x or y direction for all cells
-    provided the conserved variables, Un.
+    Scalar counterpart of `get_primitive_variables_1d` for use inside
+    compiled loops, which avoids building a conserved variable vector
+    for every cell or interface.
 
     Parameters
     ----------
-    Un : ndarray[float]
-        Conserved variables
+    rho : float
+        Density
+    mom_x : float
+        Density times horizontal velocity
+    mom_y : float
+        Density times vertical velocity
+    E : float
+        Total energy
     gamma : float
         Specific heat ratio
-    direction : str
-        Specify the 'x' or 'y' direction
 
     Returns
     -------
-    F : ndarray[float]
-        The computed flux vector at all cells in the specified direction
+    rho : float
+        Density
+    u : float
+        Horizontal velocity
+    v : float
+        Vertical velocity
+    p : float
+        Pressure
 
     """
+    u = mom_x / rho
+    v = mom_y / rho
+    e = E / rho - 1 / 2 * rho * (u * u + v * v)
+
+    p = p_EOS(rho, e, gamma)
+
+    return rho, u, v, p
+
+
+@njit()
+def get_fluxes_point(rho: float, mom_n: float, mom_t: float, E: float, gamma: float):
+    """Returns the normal flux at a point provided scalar Un.
+
+    Scalar counterpart of `get_fluxes_1d`. The momentum is given in the
+    frame of the face, so that the x flux is obtained by passing
+    (mom_x, mom_y) and the y flux by passing (mom_y, mom_x); the returned
+    momentum fluxes follow the same (normal, tangential) ordering. Only
+    arithmetic is used, so arrays can be passed in place of the scalars.
+
+    Parameters
+    ----------
+    rho : float
+        Density
+    mom_n : float
+        Momentum normal to the face
+    mom_t : float
+        Momentum tangential to the face
+    E : float
+        Total energy
+    gamma : float
+        Specific heat ratio
+
+    Returns
+    -------
+    f_rho, f_n, f_t, f_E : float
+        Mass, normal momentum, tangential momentum and energy fluxes
+
+    """
+    rho, un, ut, p = get_primitive_variables_point(rho, mom_n, mom_t, E, gamma)
+
+    return rho * un, rho * un * un + p, rho * un * ut, un * (E + p)
+
+
+@njit(error_model="numpy")
+def _get_fluxes_2d_cells(
+    Un: np.ndarray, gamma: float, direction: str, F: np.ndarray
+) -> None:
+    """Fluxes of all cells written into F one cell at a time
+
+    The primitives are computed here rather than with
+    `get_primitive_variables_point`, whose cached compilation would bring
+    back the Python error model and raise on empty cells.
+
+    """
+
+    for i in range(Un.shape[1]):
+        for j in range(Un.shape[2]):
+
+            rho = Un[0, i, j]
+            u = Un[1, i, j] / rho
+            v = Un[2, i, j] / rho
+            e = Un[3, i, j] / rho - 1 / 2 * rho * (u * u + v * v)
+            p = rho * (gamma - 1.0) * e
+
+            if direction == "x":
+
+                F[0, i, j] = rho * u
+                F[1, i, j] = rho * u * u + p
+                F[2, i, j] = rho * u * v
+                F[3, i, j] = u * (Un[3, i, j] + p)
+
+            elif direction == "y":
+
+                F[0, i, j] = rho * v
+                F[1, i, j] = rho * u * v
+                F[2, i, j] = rho * v * v + p
+                F[3, i, j] = v * (Un[3, i, j] + p)
+
+
+def _get_fluxes_2d_arrays(
+    Un: np.ndarray, gamma: float, direction: str, F: np.ndarray
+) -> None:
+    """Fluxes of all cells written into F with NumPy expressions"""
 
-    F = np.zeros_like(Un)
     rho, u, v, p = get_primitive_variables_2d(Un, gamma)
 
     if direction == "x":
@@ -163,10 +260,52 @@ def get_fluxes_2d(Un: np.ndarray, gamma: float, direction: str) -> np.ndarray:
         F[2, :, :] = rho * v * v + p
         F[3, :, :] = v * (Un[3, :, :] + p)
 
+
+def get_fluxes_2d(
+    Un: np.ndarray, gamma: float, direction: str, out: np.ndarray = None
+) -> np.ndarray:
+    """Returns fluxes provided the conserved variables, Un, for all cells
+
+    This function returns the fluxes in the x or y direction for all cells
+    provided the conserved variables, Un. With numba the fluxes are found
+    one cell at a time and written straight into the output, so no arrays
+    are created when `out` is given. Without numba NumPy expressions are
+    used instead, which create temporary arrays the size of Un.
+
+    Parameters
+    ----------
+    Un : ndarray[float]
+        Conserved variables
+    gamma : float
+        Specific heat ratio
+    direction : str
+        Specify the 'x' or 'y' direction
+    out : ndarray[float], optional
+        Array shaped like Un to receive the fluxes
+
+    Returns
+    -------
+    F : ndarray[float]
+        The computed flux vector at all cells in the specified direction
+
+    """
+
+    if out is None:
+        F = np.zeros_like(Un)
+    else:
+        F = out
+
+    if HAVE_NUMBA:
+        _get_fluxes_2d_cells(Un, gamma, direction, F)
+    else:
+        _get_fluxes_2d_arrays(Un, gamma, direction, F)
+
     return F
 
 
-def calculate_timestep(pmesh: PsychoArray, cfl: float, gamma: float) -> float:
+def calculate_timestep(
+    pmesh: PsychoArray, cfl: float, gamma: float
+) -> Union[float, np.ndarray]:
     """Calculates the maximum timestep allowed for a given CFL to remain stable
 
 
@@ -184,8 +323,9 @@ def calculate_timestep(pmesh: PsychoArray, cfl: float, gamma: float) -> float:
 
     Returns
     -------
-    float
-        The calculated timestep for the provided conditions
+    Union[float, ndarray]
+        The calculated timestep for the provided conditions, or the timestep
+        of every member when Un has a leading ensemble dimension
 
     """
     # print(type(cfl), type(gamma))
@@ -194,6 +334,11 @@ def calculate_timestep(pmesh: PsychoArray, cfl: float, gamma: float) -> float:
     a = np.sqrt(gamma * p / rho)
     # print(np.abs(u) + a)
 
-    max_vel = max(np.amax(np.abs(u) + a), np.amax(np.abs(v) + a))
+    if pmesh.Un.ndim == 4:
+        max_vel = np.maximum(
+            np.amax(np.abs(u) + a, axis=(1, 2)), np.amax(np.abs(v) + a, axis=(1, 2))
+        )
+    else:
+        max_vel = max(np.amax(np.abs(u) + a), np.amax(np.abs(v) + a))
 
     return cfl * pmesh.dx1 / max_vel
@@ -0,0 +1,195 @@
+###################################################################
+#                                                                 #
+#   Compiles the kernels of the built-in problems into the cache  #
+#                                                                 #
+###################################################################
+
+import numpy as np
+import sys
+import time
+
+sys.path.append("..")
+from src.input import PsychoInput
+from src.mesh import PsychoArray, Workspace, generate_members
+from src.pgen import kh
+from src.step import (
+    muscl_hancock_step,
+    muscl_hancock_step_parallel,
+    muscl_hancock_step_ensemble,
+    muscl_hancock_step_ensemble_parallel,
+    muscl_hancock_step_rows,
+    muscl_hancock_staged_step,
+)
+from src.tools import calculate_timestep
+from src.riemann import solve_riemann, solve_riemann_parallel
+from src.diagnostics import get_integrals
+from src.reconstruct import get_limiter
+from src.jit import HAVE_NUMBA
+
+# Problem generators of the built-in problems, with their input files
+PROBLEMS = {"kh": (kh.ProblemGenerator, "inputs/kh.in")}
+
+
+def _small_mesh(problem_name: str, n: int, nens: int = 1) -> tuple:
+    """Input and initial state of a built-in problem on an n x n grid"""
+
+    problem_generator, input_fname = PROBLEMS[problem_name]
+
+    pin = PsychoInput(input_fname=input_fname)
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = n
+    pin.value_dict["nx2"] = n
+    pin.value_dict["nens"] = nens
+
+    pmesh = PsychoArray(pin, np.float64)
+    generate_members(problem_generator, pin, pmesh)
+    pmesh.enforce_bcs(pin)
+
+    return pin, pmesh
+
+
+def _warm_timestep(pin: PsychoInput, pmesh: PsychoArray, ens: PsychoArray) -> None:
+    """Timestep of a mesh, of an ensemble and of the rows of a worker tile"""
+
+    cfl = pin.value_dict["CFL"]
+    gamma = pin.value_dict["gamma"]
+
+    calculate_timestep(pmesh, cfl, gamma)
+    calculate_timestep(ens, cfl, gamma)
+
+    # Worker processes take the timestep of a view of their rows
+    Un = pmesh.Un
+    pmesh.Un = Un[:, pmesh.ng : -pmesh.ng, :]
+    try:
+        calculate_timestep(pmesh, cfl, gamma)
+    finally:
+        pmesh.Un = Un
+
+
+def _warm_fused(pin: PsychoInput, pmesh: PsychoArray, ens: PsychoArray) -> None:
+    """Fused step of a mesh, serial and threaded"""
+
+    gamma = pin.value_dict["gamma"]
+    dt = calculate_timestep(pmesh, pin.value_dict["CFL"], gamma)
+    Unp1 = np.empty_like(pmesh.Un)
+
+    for step in [muscl_hancock_step, muscl_hancock_step_parallel]:
+        step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, Unp1, *get_limiter(pin))
+
+
+def _warm_ensemble(pin: PsychoInput, pmesh: PsychoArray, ens: PsychoArray) -> None:
+    """Fused step of an ensemble, serial and threaded"""
+
+    gamma = pin.value_dict["gamma"]
+    dt = calculate_timestep(ens, pin.value_dict["CFL"], gamma)
+    Unp1 = np.empty_like(ens.Un)
+
+    for step in [muscl_hancock_step_ensemble, muscl_hancock_step_ensemble_parallel]:
+        step(ens.Un, dt, ens.dx1, ens.dx2, gamma, Unp1, *get_limiter(pin))
+
+
+def _warm_rows(pin: PsychoInput, pmesh: PsychoArray, ens: PsychoArray) -> None:
+    """Step of a range of rows, as run by the worker processes"""
+
+    gamma = pin.value_dict["gamma"]
+    dt = calculate_timestep(pmesh, pin.value_dict["CFL"], gamma)
+    Unp1 = np.empty_like(pmesh.Un)
+
+    muscl_hancock_step_rows(
+        pmesh.Un,
+        dt,
+        pmesh.dx1,
+        pmesh.dx2,
+        gamma,
+        Unp1,
+        0,
+        pmesh.Un.shape[1],
+        *get_limiter(pin),
+    )
+
+
+def _warm_staged(pin: PsychoInput, pmesh: PsychoArray, ens: PsychoArray) -> None:
+    """Staged step with the serial and the threaded Riemann solver"""
+
+    gamma = pin.value_dict["gamma"]
+    dt = calculate_timestep(pmesh, pin.value_dict["CFL"], gamma)
+    ws = Workspace(pmesh)
+    limiter, beta = get_limiter(pin)
+
+    for riemann_solver in [solve_riemann, solve_riemann_parallel]:
+        Un = pmesh.Un.copy()
+        muscl_hancock_staged_step(
+            Un,
+            dt,
+            pmesh.dx1,
+            pmesh.dx2,
+            gamma,
+            ws,
+            riemann_solver,
+            limiter=limiter,
+            beta=beta,
+        )
+
+
+def _warm_diagnostics(pin: PsychoInput, pmesh: PsychoArray, ens: PsychoArray) -> None:
+    """Integrals of a mesh and of a member of an ensemble"""
+
+    get_integrals(pmesh.Un, pmesh.ng, pmesh.dx1, pmesh.dx2)
+    get_integrals(ens.member(0).Un, ens.ng, ens.dx1, ens.dx2)
+
+
+# Groups of kernels compiled by `warmup`, each run on a mesh and an ensemble
+GROUPS = {
+    "timestep": _warm_timestep,
+    "fused_step": _warm_fused,
+    "ensemble_step": _warm_ensemble,
+    "rows_step": _warm_rows,
+    "staged_step": _warm_staged,
+    "diagnostics": _warm_diagnostics,
+}
+
+
+def warmup(problems: list = None, n: int = 16) -> dict:
+    """Compiles every kernel signature used by the built-in problems
+
+    Each group of kernels is run on a small grid, so numba compiles the
+    signatures a run uses and saves them to the cache, see `src.jit`. The
+    first warm-up compiles them, after which it and the runs only load them.
+
+    Parameters
+    ----------
+    problems : list, optional
+        Names of the problems to compile the kernels of, all of `PROBLEMS`
+        by default
+    n : int, optional
+        Number of cells of the small grid in each direction
+
+    Returns
+    -------
+    dict
+        Time in seconds spent in each group of kernels, empty without numba
+
+    """
+
+    if problems is None:
+        problems = list(PROBLEMS)
+
+    for problem_name in problems:
+        if problem_name not in PROBLEMS:
+            raise ValueError("Please use an implemented problem type")
+
+    timings = dict()
+
+    if not HAVE_NUMBA:
+        return timings
+
+    for problem_name in problems:
+        pin, pmesh = _small_mesh(problem_name, n)
+        _, ens = _small_mesh(problem_name, n, nens=2)
+
+        for group, warm in GROUPS.items():
+            start = time.perf_counter()
+            warm(pin, pmesh, ens)
+            timings[group] = timings.get(group, 0.0) + time.perf_counter() - start
+
+    return timings
@@ -0,0 +1,161 @@
+###################################################################
+#                                                                 #
+#      Contains the background writer for the simulation output   #
+#                                                                 #
+###################################################################
+
+import numpy as np
+import queue
+import sys
+import threading
+
+sys.path.append("..")
+from src.profiler import NULL_PROFILER, PsychoProfiler
+
+
+class PsychoWriter:
+    """Writes the output of a run on a background thread
+
+    `submit` copies the conserved variables into one of a fixed number of
+    snapshot buffers and returns straight away, so the solver carries on
+    while the snapshot is converted to primitives and written by
+    `PsychoOutput.save_data` on the writer thread. When every buffer is
+    waiting to be written, `submit` blocks until one is free, so at most
+    `nbuffers` snapshots are held in memory. The solver kernels release the
+    GIL, so the writer runs alongside them.
+
+    Errors raised while writing are raised again by the next call to
+    `submit`, `flush` or `close`.
+
+    Parameters
+    ----------
+    pouts : list[PsychoOutput]
+        Output of each ensemble member, with its data preferences set
+    shape : tuple
+        Shape of the conserved variables Un
+    dtype : np.dtype
+        Data type of the conserved variables
+    nbuffers : int
+        Number of snapshot buffers, two by default
+    profiler : PsychoProfiler, optional
+        Times `save_data` on the writer thread
+
+    """
+
+    def __init__(
+        self,
+        pouts: list,
+        shape: tuple,
+        dtype: np.dtype,
+        nbuffers: int = 2,
+        profiler: PsychoProfiler = NULL_PROFILER,
+    ) -> None:
+
+        if nbuffers < 1:
+            raise ValueError("Please use at least one output buffer")
+
+        self.pouts = pouts
+        self.profiler = profiler
+        self.error = None
+
+        # Buffers free to receive a snapshot and snapshots waiting to be written
+        self.free = queue.Queue()
+        self.pending = queue.Queue()
+
+        for _ in range(nbuffers):
+            self.free.put(np.empty(shape, dtype=dtype))
+
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def _write(self) -> None:
+        """Loop run by the writer thread until it receives None"""
+
+        while True:
+            item = self.pending.get()
+
+            if item is None:
+                self.pending.task_done()
+                break
+
+            Un, t, tmax, gamma, iter, outputs = item
+
+            try:
+                if self.error is None:
+                    for m, pout in outputs:
+                        with self.profiler.stage("save_data"):
+                            pout.save_data(
+                                Un[m] if Un.ndim == 4 else Un,
+                                t[m],
+                                tmax,
+                                gamma,
+                                iter,
+                            )
+
+            except Exception as e:
+                self.error = e
+
+            finally:
+                self.free.put(Un)
+                self.pending.task_done()
+
+    def _raise_error(self) -> None:
+        """Raises an error met by the writer thread in the main thread"""
+
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(
+        self,
+        Un: np.ndarray,
+        t: list,
+        tmax: float,
+        gamma: float,
+        iter: int,
+        outputs: list = None,
+    ) -> None:
+        """Hands a snapshot of the conserved variables to the writer thread
+
+        Parameters
+        ----------
+        Un : ndarray[float]
+            Conserved variables, copied before returning
+        t : list[float]
+            The current time of each ensemble member
+        tmax : float
+            The maximum time or the time the simulations runs until
+        gamma : float
+            Specific heat ratio
+        iter : int
+            The current iteration
+        outputs : list[tuple], optional
+            Pairs of the ensemble member and output to write the snapshot
+            to, every output in `pouts` for its member by default
+
+        """
+
+        self._raise_error()
+
+        if outputs is None:
+            outputs = list(enumerate(self.pouts))
+
+        buffer = self.free.get()
+        np.copyto(buffer, Un)
+
+        self.pending.put((buffer, list(t), tmax, gamma, iter, outputs))
+
+    def flush(self) -> None:
+        """Waits for every snapshot submitted so far to be written"""
+
+        self.pending.join()
+
+        self._raise_error()
+
+    def close(self) -> None:
+        """Waits for every snapshot to be written and stops the writer thread"""
+
+        self.pending.put(None)
+        self.thread.join()
+
+        self._raise_error()
@@ -1,23 +1,63 @@
+import json
 import sys
 import numpy as np
 import os
+import subprocess
+import tracemalloc
 
 sys.path.append("..")
 
 from src.input import PsychoInput
-from src.mesh import PsychoArray, get_interm_array
+from src.mesh import PsychoArray, Workspace, generate_members, get_interm_array
 from src.pgen.sample import sampleProblemGenerator
 from src.pgen.kh import ProblemGenerator
 from src.eos import p_EOS, e_EOS
-from src.reconstruct import get_limited_slopes
+from src.reconstruct import (
+    BETA,
+    MC,
+    VAN_LEER,
+    _limit_into,
+    _limit_into_mc,
+    _limit_into_van_leer,
+    get_limited_slopes,
+    get_limiter,
+    limited_slope,
+)
 from src.tools import (
     get_primitive_variables_1d,
     get_primitive_variables_2d,
     get_fluxes_1d,
     get_fluxes_2d,
+    _get_fluxes_2d_cells,
+)
+from src.step import (
+    muscl_hancock_step,
+    muscl_hancock_step_parallel,
+    muscl_hancock_step_ensemble,
+    muscl_hancock_staged_step,
+)
+from src.riemann import solve_riemann, solve_riemann_parallel, solve_riemann_numpy
+from src.decomposition import PsychoDecomposition
+from src.sweep import PsychoSweep, run_sweep
+from src.checkpoint import save_checkpoint, load_checkpoint
+from src.data_saver import PsychoOutput, LossyCodec, read_lossy_data
+from src.writer import PsychoWriter
+from src.profiler import PsychoProfiler
+from src.diagnostics import (
+    DIAGNOSTICS,
+    PsychoDiagnostics,
+    _integrals_arrays,
+    get_integrals,
+    get_mixing_thickness,
+    register_diagnostic,
 )
-from src.data_saver import PsychoOutput
-from plotting.plotter import Plotter
+from src.tools import calculate_timestep
+from src.warmup import GROUPS, warmup
+from src.jit import KERNELS, njit
+from plotting.plotter import Plotter, get_plot_primitives
+from plotting.pool import PlotPool
+from plotting.frames import FrameRenderer, VideoStream, get_colormap_lut, rgb_to_yuv444
+import psycho
 from numpy import genfromtxt
 
 
@@ -147,6 +187,23 @@ def test_psycho_mesh():
         assert np.all(interm.shape == (pmesh.nvar, pmesh.nx1, pmesh.nx2))
 
 
+def test_psycho_workspace():
+    """Tests that the scratch arrays of the Workspace match the slices of Un used by the staged step"""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+
+    pmesh = PsychoArray(pin, np.float64)
+
+    ws = Workspace(pmesh)
+    assert ws.delta_i.shape == pmesh.Un[:, 1:-1, 1:-1].shape
+    assert ws.slope_scratch.shape == (5,) + pmesh.Un[:, 1:-1, 1:-1].shape
+    assert ws.U_i_L.shape == pmesh.Un[:, 1:-1, 1:-1].shape
+    assert ws.F_i_L.shape == pmesh.Un[:, 1:-1, 1:-1].shape
+    assert ws.F.shape == pmesh.Un[:, 1:-2, 1:-1].shape
+    assert ws.G.shape == pmesh.Un[:, 1:-1, 1:-2].shape
+    assert ws.dU_i.shape == pmesh.Un[:, 2:-2, 2:-2].shape
+
+
 def test_left_bc_enforced():
     """Check left side of domain boundary condition enforcement"""
 
@@ -249,6 +306,84 @@ def test_psycho_reconstruct():
     assert np.all(abs(delta_j) <= 1.0)
 
 
+def test_psycho_slope_limiters():
+    """Tests the compiled slope limiters against their NumPy forms, minmod bit for bit, the limiters on known slopes, and the fused step with each limiter against the staged step."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 64
+    pin.value_dict["nx2"] = 64
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.enforce_bcs(pin)
+
+    Un = pmesh.Un
+    shifted = (
+        Un[:, 1:-1, 1:-1],
+        Un[:, 2:, 1:-1],
+        Un[:, :-2, 1:-1],
+        Un[:, 1:-1, 2:],
+        Un[:, 1:-1, :-2],
+    )
+    delta_m = Un[:, 1:-1, 1:-1] - Un[:, :-2, 1:-1]
+    delta_p = Un[:, 2:, 1:-1] - Un[:, 1:-1, 1:-1]
+    scratch = np.empty((4,) + delta_m.shape)
+
+    for limiter, beta, limit_into in [
+        (BETA, 1.0, lambda d: _limit_into(d, delta_p, 1.0, scratch)),
+        (BETA, 2.0, lambda d: _limit_into(d, delta_p, 2.0, scratch)),
+        (VAN_LEER, 1.0, lambda d: _limit_into_van_leer(d, delta_p, scratch)),
+        (MC, 1.0, lambda d: _limit_into_mc(d, delta_p, scratch)),
+    ]:
+        expected = delta_m.copy()
+        limit_into(expected)
+
+        delta_i, delta_j = get_limited_slopes(*shifted, beta=beta, limiter=limiter)
+
+        assert np.array_equal(delta_i, expected)
+
+    # Slopes of 1 and 2 either side, and of opposite signs
+    assert limited_slope(1.0, 2.0, BETA, 1.0) == 1.0
+    assert limited_slope(1.0, 2.0, BETA, 2.0) == 2.0
+    assert limited_slope(1.0, 2.0, VAN_LEER, 1.0) == 4.0 / 3.0
+    assert limited_slope(1.0, 2.0, MC, 1.0) == 1.5
+    assert limited_slope(-1.0, -2.0, MC, 1.0) == -1.5
+    for limiter in [BETA, VAN_LEER, MC]:
+        assert limited_slope(1.0, -2.0, limiter, 2.0) == 0.0
+        assert limited_slope(0.0, 0.0, limiter, 2.0) == 0.0
+
+    pin.value_dict["slope_limiter"] = "beta"
+    pin.value_dict["limiter_beta"] = 1.5
+    assert get_limiter(pin) == (BETA, 1.5)
+
+    pin.value_dict["slope_limiter"] = "van_leer"
+    assert get_limiter(pin) == (VAN_LEER, 1.0)
+
+    gamma = pin.value_dict["gamma"]
+    dt = 0.25 * pmesh.dx1
+
+    for name in ["superbee", "van_leer", "mc"]:
+        pin.value_dict["slope_limiter"] = name
+        limiter, beta = get_limiter(pin)
+
+        U_staged = Un.copy()
+        U_fused = np.empty_like(Un)
+
+        muscl_hancock_staged_step(
+            U_staged,
+            dt,
+            pmesh.dx1,
+            pmesh.dx2,
+            gamma,
+            Workspace(pmesh),
+            limiter=limiter,
+            beta=beta,
+        )
+        muscl_hancock_step(Un, dt, pmesh.dx1, pmesh.dx2, gamma, U_fused, limiter, beta)
+
+        assert np.allclose(U_fused, U_staged, rtol=1e-12, atol=1e-12)
+
+
 def test_psycho_1d_variables():
     """Tests that array dimensions in get_primitive_variables_1d() in tools.py are correct."""
     pin = PsychoInput(f"inputs/kh.in")
@@ -324,6 +459,340 @@ def test_psycho_2d_fluxes():
     assert Fy.size == (pmesh.nvar * nx * ny)
 
 
+def test_psycho_fused_step():
+    """Tests that the fused step kernel matches the staged MUSCL-Hancock step to round-off."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 64
+    pin.value_dict["nx2"] = 64
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.enforce_bcs(pin)
+
+    gamma = pin.value_dict["gamma"]
+    dt = 0.25 * pmesh.dx1
+
+    U_staged = pmesh.Un.copy()
+    U_fused = np.empty_like(pmesh.Un)
+
+    muscl_hancock_staged_step(
+        U_staged, dt, pmesh.dx1, pmesh.dx2, gamma, Workspace(pmesh)
+    )
+    muscl_hancock_step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, U_fused)
+
+    assert np.allclose(U_fused, U_staged, rtol=1e-12, atol=1e-12)
+
+
+def test_psycho_staged_step_allocations():
+    """Tests that the staged step with a Workspace creates no arrays the size of the grid, neither NumPy temporaries nor heap allocations inside the compiled kernels."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.enforce_bcs(pin)
+
+    gamma = pin.value_dict["gamma"]
+    dt = 0.25 * pmesh.dx1
+    ws = Workspace(pmesh)
+
+    # The first step compiles the kernels
+    muscl_hancock_staged_step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, ws)
+
+    # NumPy reports the memory of its arrays to tracemalloc
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    muscl_hancock_staged_step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, ws)
+    peak = tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+
+    assert peak < pmesh.Un.nbytes / 8
+
+    # Arrays created inside compiled kernels show up as NRT allocations,
+    # inspected on uncached copies as the cached code cannot be inspected
+    for kernel in [_get_fluxes_2d_cells, solve_riemann]:
+        options = {k: v for k, v in kernel.targetoptions.items() if k != "nopython"}
+        copy = njit(cache=False, **options)(kernel.py_func)
+        for sig in kernel.signatures:
+            copy.compile(sig)
+        for llvm in copy.inspect_llvm().values():
+            assert "NRT_MemInfo_alloc" not in llvm
+
+
+def test_psycho_parallel_kernels():
+    """Tests that the threaded kernels reproduce the serial Riemann solver and step."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 64
+    pin.value_dict["nx2"] = 64
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.enforce_bcs(pin)
+
+    gamma = pin.value_dict["gamma"]
+    dt = 0.25 * pmesh.dx1
+
+    U_l = pmesh.Un[:, :-1, :]
+    U_r = pmesh.Un[:, 1:, :]
+
+    for direction in ["x", "y"]:
+        F = solve_riemann(U_l, U_r, gamma, direction)
+        F_parallel = solve_riemann_parallel(U_l, U_r, gamma, direction)
+        assert np.allclose(F_parallel, F, rtol=1e-12, atol=1e-12)
+
+    U_serial = np.empty_like(pmesh.Un)
+    U_parallel = np.empty_like(pmesh.Un)
+
+    muscl_hancock_step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, U_serial)
+    muscl_hancock_step_parallel(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, U_parallel)
+
+    assert np.array_equal(U_parallel, U_serial)
+
+
+def test_psycho_ensemble():
+    """Tests that every member of an ensemble is advanced exactly like a single run with the member's seed."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 32
+    pin.value_dict["nx2"] = 32
+    pin.value_dict["nens"] = 3
+    pin.value_dict["seed"] = 7
+
+    cfl = pin.value_dict["CFL"]
+    gamma = pin.value_dict["gamma"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    generate_members(ProblemGenerator, pin, pmesh)
+    assert pmesh.Un.shape == (3, pmesh.nvar, 36, 36)
+    assert not np.array_equal(pmesh.Un[0], pmesh.Un[1])
+
+    Unp1 = np.empty_like(pmesh.Un)
+    for _ in range(3):
+        dt = calculate_timestep(pmesh, cfl, gamma)
+        pmesh.enforce_bcs(pin)
+        muscl_hancock_step_ensemble(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, Unp1)
+        pmesh.Un, Unp1 = Unp1, pmesh.Un
+
+    pin.value_dict["nens"] = 1
+
+    for m in range(3):
+        pin.value_dict["seed"] = 7 + m
+
+        pmember = PsychoArray(pin, np.float64)
+        generate_members(ProblemGenerator, pin, pmember)
+
+        Unp1 = np.empty_like(pmember.Un)
+        for _ in range(3):
+            dt = calculate_timestep(pmember, cfl, gamma)
+            pmember.enforce_bcs(pin)
+            muscl_hancock_step(pmember.Un, dt, pmember.dx1, pmember.dx2, gamma, Unp1)
+            pmember.Un, Unp1 = Unp1, pmember.Un
+
+        assert np.array_equal(pmesh.member(m).Un, pmember.Un)
+
+
+def test_psycho_decomposition():
+    """Tests that advancing the mesh with worker processes gives the same result as a single process for periodic and transmissive boundaries."""
+
+    for bc in ["periodic", "transmissive"]:
+        pin = PsychoInput(f"inputs/kh.in")
+        pin.parse_input_file()
+        pin.value_dict["nx1"] = 32
+        pin.value_dict["nx2"] = 32
+        for side in ["left_bc", "right_bc", "top_bc", "bottom_bc"]:
+            pin.value_dict[side] = bc
+
+        cfl = pin.value_dict["CFL"]
+        gamma = pin.value_dict["gamma"]
+
+        pmesh = PsychoArray(pin, np.float64)
+        ProblemGenerator(pin=pin, pmesh=pmesh)
+
+        pmesh_decomp = PsychoArray(pin, np.float64)
+        pmesh_decomp.Un[...] = pmesh.Un
+
+        Unp1 = np.empty_like(pmesh.Un)
+        pdecomp = PsychoDecomposition(pmesh_decomp, 2, cfl, gamma)
+
+        try:
+            for _ in range(5):
+                dt = calculate_timestep(pmesh, cfl, gamma)
+                pmesh.enforce_bcs(pin)
+                muscl_hancock_step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, Unp1)
+                pmesh.Un, Unp1 = Unp1, pmesh.Un
+
+                dt_decomp = pdecomp.calculate_timestep()
+                pmesh_decomp.enforce_bcs(pin)
+                pdecomp.step(dt_decomp)
+
+                assert dt_decomp == dt
+                assert np.array_equal(pmesh_decomp.Un, pmesh.Un)
+        finally:
+            pdecomp.close()
+
+        assert np.array_equal(pmesh_decomp.Un, pmesh.Un)
+
+
+def test_psycho_decomposition_exits():
+    """Tests that a process which has run the threaded kernels before starting the workers still exits once they are closed."""
+
+    script = "; ".join(
+        [
+            "import numpy as np",
+            "from src.input import PsychoInput",
+            "from src.mesh import PsychoArray",
+            "from src.pgen.kh import ProblemGenerator",
+            "from src.step import muscl_hancock_step_parallel",
+            "from src.decomposition import PsychoDecomposition",
+            "pin = PsychoInput('inputs/kh.in')",
+            "pin.parse_input_file()",
+            "pin.value_dict['nx1'] = 16",
+            "pin.value_dict['nx2'] = 16",
+            "pmesh = PsychoArray(pin, np.float64)",
+            "ProblemGenerator(pin=pin, pmesh=pmesh)",
+            "muscl_hancock_step_parallel(pmesh.Un, 1e-3, pmesh.dx1, pmesh.dx2, 1.4, np.empty_like(pmesh.Un))",
+            "pdecomp = PsychoDecomposition(pmesh, 2, 0.5, 1.4)",
+            "pdecomp.step(pdecomp.calculate_timestep())",
+            "pdecomp.close()",
+        ]
+    )
+
+    result = subprocess.run([sys.executable, "-c", script], timeout=600)
+
+    assert result.returncode == 0
+
+
+def test_psycho_sweep(tmp_path):
+    """Tests that a sweep writes one input file per combination of the parameters, runs every case in its own directory and indexes them."""
+    sweep_fname = tmp_path / "kh_sweep.in"
+    sweep_fname.write_text(
+        "\n".join(
+            [
+                f"base = {os.path.abspath('inputs/kh.in')}",
+                "rho1 = [1.5, 2.0]",
+                "nx1, nx2 = [16, 24]",
+                "tmax = [0.01]",
+            ]
+        )
+    )
+
+    sweep = PsychoSweep(str(sweep_fname))
+    cases = sweep.cases()
+
+    assert sweep.problem_name == "kh"
+    assert len(cases) == 4
+    assert cases[1] == {"rho1": "1.5", "nx1": "24", "nx2": "24", "tmax": "0.01"}
+
+    index = run_sweep(str(sweep_fname), psycho.run, 1, str(tmp_path / "out"))
+
+    assert [row["status"] for row in index] == ["ok"] * 4
+    assert os.path.isfile(tmp_path / "out" / "index.csv")
+
+    for row, case in zip(index, cases):
+        pin = PsychoInput(os.path.join(row["directory"], "kh.in"))
+        pin.parse_input_file()
+
+        assert pin.value_dict["rho1"] == float(case["rho1"])
+        assert pin.value_dict["nx1"] == int(case["nx1"])
+        assert pin.value_dict["nx2"] == int(case["nx2"])
+        assert pin.value_dict["u0"] == 0.3
+        assert os.path.isfile(os.path.join(row["directory"], "data.hdf5"))
+
+
+def test_psycho_checkpoint(tmp_path):
+    """Tests that a run continued from a checkpoint is identical to an uninterrupted run."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 32
+    pin.value_dict["nx2"] = 32
+
+    cfl = pin.value_dict["CFL"]
+    gamma = pin.value_dict["gamma"]
+
+    def advance(pmesh, t, nsteps):
+        Unp1 = np.empty_like(pmesh.Un)
+        for _ in range(nsteps):
+            dt = calculate_timestep(pmesh, cfl, gamma)
+            pmesh.enforce_bcs(pin)
+            muscl_hancock_step(pmesh.Un, dt, pmesh.dx1, pmesh.dx2, gamma, Unp1)
+            pmesh.Un, Unp1 = Unp1, pmesh.Un
+            t += dt
+        return t
+
+    np.random.seed(3)
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    t = advance(pmesh, 0.0, 3)
+
+    checkpoint_fname = str(tmp_path / "checkpoint.npz")
+    save_checkpoint(checkpoint_fname, "kh", pin, pmesh, t, 3)
+    draw = np.random.rand(4)
+
+    t = advance(pmesh, t, 3)
+
+    checkpoint = load_checkpoint(checkpoint_fname)
+    assert checkpoint["problem_name"] == "kh"
+    assert checkpoint["value_dict"] == pin.value_dict
+    assert checkpoint["iter"] == 3
+    assert np.array_equal(np.random.rand(4), draw)
+
+    pin_restart = PsychoInput(None)
+    pin_restart.value_dict = checkpoint["value_dict"]
+
+    pmesh_restart = PsychoArray(pin_restart, np.float64)
+    pmesh_restart.Un[...] = checkpoint["Un"]
+    t_restart = advance(pmesh_restart, checkpoint["t"], 3)
+
+    assert t_restart == t
+    assert np.array_equal(pmesh_restart.Un, pmesh.Un)
+
+
+def test_psycho_riemann_numpy():
+    """Tests that the vectorized numpy Riemann solver matches the numba solver to round-off, including the 2-rarefaction and 2-shock estimates."""
+    gamma = 1.4
+    shape = (64, 64)
+    rng = np.random.default_rng(42)
+
+    def random_state():
+        rho = 10.0 ** rng.uniform(-1.0, 1.0, shape)
+        u = rng.uniform(-2.0, 2.0, shape)
+        v = rng.uniform(-2.0, 2.0, shape)
+        p = 10.0 ** rng.uniform(-1.0, 2.0, shape)
+        return np.stack(
+            [rho, rho * u, rho * v, p / (gamma - 1.0) + 0.5 * rho * (u * u + v * v)]
+        )
+
+    U_l = random_state()
+    U_r = random_state()
+
+    for direction in ["x", "y"]:
+        F = solve_riemann(U_l, U_r, gamma, direction)
+        F_numpy = solve_riemann_numpy(U_l, U_r, gamma, direction)
+        assert np.all(np.isfinite(F_numpy))
+        assert np.allclose(F_numpy, F, rtol=1e-12, atol=1e-12)
+
+
+def test_psycho_riemann_supersonic():
+    """Tests that solve_riemann gives the exact flux of a uniform supersonic flow, which is upwinded to the left state at every face. The throughput of the solver is measured by benchmarks/riemann.py."""
+    nx1 = 64
+    nx2 = 64
+    gamma = 1.4
+
+    # Uniform flow moving right at Mach 2
+    U = np.empty((4, nx1 + 1, nx2), dtype=np.float64)
+    U[0] = 1.0
+    U[1] = 2.0 * np.sqrt(gamma)
+    U[2] = 0.1
+    U[3] = 1.0 / (gamma - 1.0) + 0.5 * (U[1] ** 2 + U[2] ** 2)
+
+    F = solve_riemann(U[:, :-1, :], U[:, 1:, :], gamma, "x")
+
+    assert np.allclose(F[:, 0, 0], get_fluxes_1d(U[:, 0, 0].copy(), gamma, "x"))
+    assert np.allclose(F, F[:, :1, :1])
+
+
 def test_psycho_data_file_existence():
     """Tests that correct data files exist."""
     pin = PsychoInput(f"inputs/kh.in")
@@ -366,6 +835,15 @@ def test_psycho_data_file_existence():
 
             assert os.path.isfile("pressure.csv")
 
+    if "hdf5" in pout.file_type:
+
+        assert os.path.isfile("data.hdf5")
+
+    pout.close()
+
+    if "hdf5" in pout.file_type:
+        os.remove("data.hdf5")
+
 
 def test_psycho_data_saved_to_file():
     """Tests that array dimensions in psycho_data_saver.py are correct."""
@@ -440,6 +918,729 @@ def test_psycho_data_saved_to_file():
             assert data.ndim == (nx1, nx2)
             assert data.size % nx1 == 0
 
+    pout.close()
+
+    if "hdf5" in pout.file_type:
+        os.remove("data.hdf5")
+
+
+def test_psycho_data_text_format(tmp_path, monkeypatch):
+    """Tests that the txt and csv output holds each column of the interior, last first, written value by value with str."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 8
+    pin.value_dict["nx2"] = 8
+
+    gamma = pin.value_dict["gamma"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.Un[1] *= 1e17
+
+    ng = pmesh.ng
+    rho, u, v, p = get_primitive_variables_2d(pmesh.Un, gamma)
+
+    for file_type, delimiter in [("txt", " "), ("csv", ",")]:
+        pin.value_dict["data_file_type"] = file_type
+
+        os.makedirs(tmp_path / file_type)
+        monkeypatch.chdir(tmp_path / file_type)
+
+        pout = PsychoOutput(f"inputs/kh.in")
+        pout.data_preferences(pin)
+        pout.save_data(pmesh.Un, 0.5, 0.5, gamma, 7)
+        pout.close()
+
+        for fname, field in [("x-velocity", u), ("density", rho), ("pressure", p)]:
+            expected = ""
+            for j in reversed(range(field.shape[1] - 2 * ng)):
+                for i in range(field.shape[0] - 2 * ng):
+                    expected += str(field[i + ng][j + ng]) + delimiter
+                expected += "\n"
+
+            with open(f"{fname}.{file_type}") as f:
+                assert f.read() == expected
+
+        with open(f"iter_time.{file_type}") as f:
+            assert f.read() == f"7{delimiter}0.5\n"
+
+
+def test_psycho_data_hdf5(tmp_path, monkeypatch):
+    """Tests that the hdf5 output is a single compressed file of time series, appended to on restart."""
+    import h5py
+
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 16
+    pin.value_dict["nx2"] = 12
+    pin.value_dict["data_file_type"] = "hdf5"
+
+    gamma = pin.value_dict["gamma"]
+    ng = pin.value_dict["ng"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+
+    monkeypatch.chdir(tmp_path)
+
+    for compression in ["gzip", "lzf", "none"]:
+        pin.value_dict["hdf5_compression"] = compression
+
+        pout = PsychoOutput(f"inputs/kh.in", suffix=f"_{compression}")
+        pout.data_preferences(pin)
+        for iter in range(3):
+            pout.save_data(pmesh.Un, 0.1 * iter, 1.0, gamma, 10 * iter)
+        pout.close()
+
+        # Two more snapshots from a restarted run
+        pout = PsychoOutput(f"inputs/kh.in", suffix=f"_{compression}")
+        pout.data_preferences(pin, restart=True)
+        for iter in range(3, 5):
+            pout.save_data(pmesh.Un, 0.1 * iter, 1.0, gamma, 10 * iter)
+        pout.close()
+
+        rho, u, v, p = get_primitive_variables_2d(pmesh.Un, gamma)
+
+        with h5py.File(f"data_{compression}.hdf5", "r") as f:
+            assert np.array_equal(f["iter"][:], [0, 10, 20, 30, 40])
+            assert np.array_equal(f["time"][:], [0.1 * iter for iter in range(5)])
+
+            assert f["density"].shape == (5, 16, 12)
+            assert f["density"].chunks == (1, 16, 12)
+            assert f["density"].compression == (
+                None if compression == "none" else compression
+            )
+
+            for name, field in [
+                ("density", rho),
+                ("xvelocity", u),
+                ("yvelocity", v),
+                ("pressure", p),
+            ]:
+                assert np.array_equal(f[name][4], field[ng:-ng, ng:-ng])
+
+
+def test_psycho_data_npymmap(tmp_path, monkeypatch):
+    """Tests that the npymmap store grows in chunks, is trimmed and is appended to on restart."""
+
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 16
+    pin.value_dict["nx2"] = 12
+    pin.value_dict["data_file_type"] = "npymmap"
+    pin.value_dict["npymmap_chunk"] = 2
+    pin.value_dict["output_variables"] = ["density", "pressure"]
+
+    gamma = pin.value_dict["gamma"]
+    ng = pin.value_dict["ng"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+
+    monkeypatch.chdir(tmp_path)
+
+    pout = PsychoOutput(f"inputs/kh.in")
+    pout.data_preferences(pin)
+    for iter in range(3):
+        pout.save_data(pmesh.Un * (iter + 1), 0.1 * iter, 1.0, gamma, 10 * iter)
+
+    # Readable while the run is going, grown to two chunks
+    assert np.load("data.npy", mmap_mode="r").shape == (4, 2, 16, 12)
+    with open("data.json") as f:
+        assert json.load(f)["iters"] == [0, 10, 20]
+
+    pout.close()
+
+    assert np.load("data.npy", mmap_mode="r").shape == (3, 2, 16, 12)
+
+    pout = PsychoOutput(f"inputs/kh.in")
+    pout.data_preferences(pin, restart=True)
+    pout.save_data(pmesh.Un * 4, 0.3, 1.0, gamma, 30)
+    pout.close()
+
+    data = np.load("data.npy", mmap_mode="r")
+    with open("data.json") as f:
+        header = json.load(f)
+
+    assert data.shape == (4, 2, 16, 12)
+    assert header["variables"] == ["density", "pressure"]
+    assert header["times"] == [0.0, 0.1, 0.2, 0.3]
+    assert header["iters"] == [0, 10, 20, 30]
+
+    for iter in range(4):
+        rho, u, v, p = get_primitive_variables_2d(pmesh.Un * (iter + 1), gamma)
+        assert np.array_equal(data[iter, 0], rho[ng:-ng, ng:-ng])
+        assert np.array_equal(data[iter, 1], p[ng:-ng, ng:-ng])
+
+
+def test_psycho_data_lossy(tmp_path, monkeypatch):
+    """Tests that the lossy output is read back within its error bound."""
+
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 32
+    pin.value_dict["nx2"] = 24
+    pin.value_dict["data_file_type"] = "lossy"
+    pin.value_dict["lossy_abs_error"] = 1.0e-3
+    pin.value_dict["lossy_rel_error"] = 0.0
+    pin.value_dict["lossy_keyframe"] = 3
+
+    gamma = pin.value_dict["gamma"]
+    ng = pin.value_dict["ng"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+
+    monkeypatch.chdir(tmp_path)
+
+    snapshots = [pmesh.Un * (1.0 + 0.01 * iter) for iter in range(6)]
+
+    pout = PsychoOutput(f"inputs/kh.in")
+    pout.data_preferences(pin)
+    for iter in range(5):
+        pout.save_data(snapshots[iter], 0.1 * iter, 1.0, gamma, iter)
+    pout.close()
+
+    assert pout.codec.ratio > 2.0
+    assert pout.codec.max_error <= 1.0e-3
+
+    # The first snapshot of a restarted run does not need the previous one
+    pout = PsychoOutput(f"inputs/kh.in")
+    pout.data_preferences(pin, restart=True)
+    pout.save_data(snapshots[5], 0.5, 1.0, gamma, 5)
+    pout.close()
+
+    data = read_lossy_data("data.psz")
+
+    assert np.array_equal(data["iter"], np.arange(6))
+    assert np.allclose(data["time"], 0.1 * np.arange(6))
+
+    for iter, Un in enumerate(snapshots):
+        rho, u, v, p = get_primitive_variables_2d(Un, gamma)
+
+        for name, field in [
+            ("xvelocity", u),
+            ("yvelocity", v),
+            ("density", rho),
+            ("pressure", p),
+        ]:
+            error = np.abs(data[name][iter] - field[ng:-ng, ng:-ng]).max()
+
+            assert data[name].shape == (6, 32, 24)
+            assert error <= data[f"{name}_bound"][iter] == 1.0e-3
+            assert error == data[f"{name}_max_error"][iter]
+
+    # A relative bound follows the range of each field
+    codec = LossyCodec(rel_error=1.0e-2)
+    meta, payload = codec.encode("density", rho)
+
+    assert meta["bound"] == 1.0e-2 * np.ptp(rho)
+    assert np.abs(LossyCodec.decode(meta, payload) - rho).max() <= meta["bound"]
+
+
+def test_psycho_ensemble_finish(tmp_path, monkeypatch):
+    """Tests that ensemble members taking their own timesteps stop being saved once they reach tmax, so a member finishing early is neither saved twice nor written to after its files are closed."""
+    import h5py
+
+    root = os.getcwd()
+
+    input_fname = tmp_path / "kh.in"
+    with open("inputs/kh.in") as f:
+        lines = f.read()
+
+    input_fname.write_text(
+        lines
+        + "\n".join(
+            [
+                "",
+                "nx1 = 16",
+                "nx2 = 16",
+                "nens = 2",
+                "seed = 0",
+                "ensemble_dt = own",
+                "tmax = 0.4205",
+                "output_frequency = 1",
+                "data_file_type = hdf5",
+                "output_buffers = 0",
+                "plot_workers = 0",
+                "plot_method = frames",
+                "frame_format = ppm",
+            ]
+        )
+    )
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(root)
+
+    psycho.run("kh", str(input_fname))
+
+    iters = []
+    for m in range(2):
+        with h5py.File(f"data_{m}.hdf5", "r") as f:
+            iters.append(f["iter"][:])
+            assert np.all(np.diff(f["iter"][:]) > 0)
+            assert np.all(np.diff(f["time"][:]) > 0)
+
+    # tmax falls between the times the members reach after 20 steps, so
+    # the second member finishes a step before the first
+    assert len(iters[0]) != len(iters[1])
+
+    # Saving at tmax no longer closes the files
+    pin = PsychoInput(str(input_fname))
+    pin.parse_input_file()
+    pmesh = PsychoArray(pin, np.float64)
+
+    pout = PsychoOutput(str(input_fname), suffix="_finish")
+    pout.data_preferences(pin)
+    pout.save_data(pmesh.member(0).Un, 0.1, 0.1, 1.4, 0)
+    pout.save_data(pmesh.member(0).Un, 0.1, 0.1, 1.4, 1)
+    pout.close()
+
+    with h5py.File("data_finish.hdf5", "r") as f:
+        assert list(f["iter"][:]) == [0, 1]
+
+
+def test_psycho_restart_output(tmp_path, monkeypatch):
+    """Tests that a run restarted from a checkpoint removes the output written after it, so its output matches that of a run without restart."""
+    import h5py
+    import src.checkpoint
+
+    root = os.getcwd()
+
+    with open("inputs/kh.in") as f:
+        lines = f.read()
+
+    monkeypatch.syspath_prepend(root)
+
+    save = src.checkpoint.save_checkpoint
+
+    # Only the checkpoint of iteration 5 is kept, as if the run stopped
+    # after writing the output of a few more iterations
+    def save_checkpoint_5(checkpoint_fname, problem_name, pin, pmesh, t, iter):
+        if iter == 5:
+            save(checkpoint_fname, problem_name, pin, pmesh, t, iter)
+
+    for file_type in ["csv", "hdf5", "npymmap", "lossy"]:
+        for name in ["reference", "restart"]:
+            os.makedirs(tmp_path / file_type / name)
+            monkeypatch.chdir(tmp_path / file_type / name)
+
+            input_fname = tmp_path / file_type / name / "kh.in"
+            input_fname.write_text(
+                lines
+                + "\n".join(
+                    [
+                        "",
+                        "nx1 = 16",
+                        "nx2 = 16",
+                        "seed = 0",
+                        "tmax = 0.2",
+                        "output_frequency = 1",
+                        f"data_file_type = {file_type}",
+                        "output_buffers = 2",
+                        "diagnostics = [energy,growth_rate]",
+                        "checkpoint_interval = 0",
+                        "plot_workers = 0",
+                        "plot_method = frames",
+                        "frame_format = ppm",
+                    ]
+                )
+            )
+
+            monkeypatch.setattr(src.checkpoint, "save_checkpoint", save_checkpoint_5)
+
+            psycho.run("kh", str(input_fname))
+
+            monkeypatch.setattr(src.checkpoint, "save_checkpoint", save)
+
+            if name == "restart":
+                psycho.run(None, str(input_fname), restart="checkpoint.npz")
+
+        monkeypatch.chdir(tmp_path / file_type)
+
+        if file_type == "csv":
+            for fname in ["iter_time.csv", "density.csv", "pressure.csv"]:
+                with open(f"reference/{fname}") as f:
+                    reference = f.read()
+
+                with open(f"restart/{fname}") as f:
+                    assert f.read() == reference
+
+        if file_type == "hdf5":
+            with (
+                h5py.File("reference/data.hdf5", "r") as f_reference,
+                h5py.File("restart/data.hdf5", "r") as f_restart,
+            ):
+                for dset in ["iter", "time", "density"]:
+                    assert np.array_equal(f_restart[dset][:], f_reference[dset][:])
+
+        if file_type == "npymmap":
+            assert np.array_equal(
+                np.load("restart/data.npy"), np.load("reference/data.npy")
+            )
+
+            with open("reference/data.json") as f_reference:
+                with open("restart/data.json") as f_restart:
+                    assert json.load(f_restart) == json.load(f_reference)
+
+        if file_type == "lossy":
+            reference = read_lossy_data("reference/data.psz")
+            restart = read_lossy_data("restart/data.psz")
+
+            assert np.array_equal(restart["iter"], reference["iter"])
+            assert np.array_equal(restart["time"], reference["time"])
+            assert np.allclose(restart["density"], reference["density"], atol=1e-3)
+
+        with open("reference/diagnostics.csv") as f:
+            reference = f.read()
+
+        with open("restart/diagnostics.csv") as f:
+            assert f.read() == reference
+
+
+def test_psycho_data_streams(tmp_path, monkeypatch):
+    """Tests that output streams write their box, stride or average at their own cadence."""
+    import h5py
+
+    input_fname = tmp_path / "kh.in"
+    with open("inputs/kh.in") as f:
+        lines = f.read()
+
+    input_fname.write_text(
+        lines
+        + "\n".join(
+            [
+                "output_streams = [strip,rows,coarse]",
+                "strip_box = [-0.5, 0.5, 0.2, 0.3]",
+                "strip_frequency = 10",
+                "rows_index_box = [3, 9, 0, 24]",
+                "rows_stride = 2",
+                "coarse_stride = 4",
+                "coarse_average = 1",
+                "coarse_frequency = 20",
+            ]
+        )
+    )
+
+    pin = PsychoInput(str(input_fname))
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 16
+    pin.value_dict["nx2"] = 24
+    pin.value_dict["data_file_type"] = "hdf5"
+
+    assert pin.value_dict["output_streams"] == ["strip", "rows", "coarse"]
+    assert pin.value_dict["strip_box"] == [-0.5, 0.5, 0.2, 0.3]
+    assert pin.value_dict["rows_index_box"] == [3, 9, 0, 24]
+
+    gamma = pin.value_dict["gamma"]
+    ng = pin.value_dict["ng"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+
+    monkeypatch.chdir(tmp_path)
+
+    outputs = []
+    for name in pin.value_dict["output_streams"]:
+        pout = PsychoOutput(str(input_fname), suffix=f"_{name}")
+        pout.data_preferences(pin, stream=name)
+        outputs.append((0, pout))
+
+    pwriter = PsychoWriter([], pmesh.Un.shape, pmesh.Un.dtype)
+    for iter in range(0, 50, 10):
+        due = [(m, pout) for m, pout in outputs if iter % pout.frequency == 0]
+        pwriter.submit(pmesh.Un, [0.01 * iter], 1.0, gamma, iter, due)
+    pwriter.close()
+
+    for _, pout in outputs:
+        pout.close()
+
+    rho = get_primitive_variables_2d(pmesh.Un, gamma)[0][ng:-ng, ng:-ng]
+
+    # Cell centres of x2 from 0.2 to 0.3 are 0.2083 and 0.25 and 0.2917
+    with h5py.File("data_strip.hdf5", "r") as f:
+        assert np.array_equal(f["iter"][:], [0, 10, 20, 30, 40])
+        assert np.array_equal(f["density"][0], rho[:, 17:19])
+        assert list(f.attrs["index_box"]) == [0, 16, 17, 19]
+
+    with h5py.File("data_rows.hdf5", "r") as f:
+        assert np.array_equal(f["iter"][:], [0])
+        assert np.array_equal(f["density"][0], rho[3:9:2, ::2])
+
+    with h5py.File("data_coarse.hdf5", "r") as f:
+        assert np.array_equal(f["iter"][:], [0, 20, 40])
+        assert np.allclose(f["density"][0], rho.reshape(4, 4, 6, 4).mean(axis=(1, 3)))
+
+
+def test_psycho_diagnostics(tmp_path, monkeypatch):
+    """Tests the diagnostics against whole-array reductions, the growth rate of a growing mode and a restart."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 32
+    pin.value_dict["nx2"] = 24
+    pin.value_dict["diagnostics"] = [
+        "mass_drift",
+        "growth_rate",
+        "enstrophy",
+        "mixing_thickness",
+        "max_density",
+    ]
+
+    ng = pin.value_dict["ng"]
+
+    np.random.seed(5)
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    pmesh.enforce_bcs(pin)
+
+    @register_diagnostic("max_density")
+    def max_density(Un, ng, dx1, dx2, gamma):
+        return Un[0, ng:-ng, ng:-ng].max()
+
+    out = np.empty(4)
+    _integrals_arrays(pmesh.Un, ng, pmesh.dx1, pmesh.dx2, out)
+    integrals = get_integrals(pmesh.Un, ng, pmesh.dx1, pmesh.dx2)
+
+    assert np.allclose(list(integrals.values()), out, rtol=1e-12)
+    assert np.isclose(integrals["mass"], np.sum(pmesh.Un[0, ng:-ng, ng:-ng]) / 768)
+
+    monkeypatch.chdir(tmp_path)
+
+    # The x2 velocity grows as exp(3 t), while the mass is unchanged
+    sigma = 3.0
+    Un = pmesh.Un.copy()
+
+    pdiag = PsychoDiagnostics(pin, pmesh)
+    assert pdiag.columns[-2:] == ["mass", "vertical_kinetic_energy"]
+
+    for iter in range(3):
+        Un[2] = pmesh.Un[2] * np.exp(sigma * 0.1 * iter)
+        values = pdiag.record(Un, 0.1 * iter, iter)
+    pdiag.close()
+
+    assert values["mass_drift"] == 0.0
+    assert np.isclose(values["growth_rate"], sigma)
+    assert values["max_density"] == pmesh.Un[0].max()
+    assert values["mixing_thickness"] == 0.0
+
+    # Density rising linearly across x2, whose thickness tends to 2/3
+    f = np.linspace(0.0, 1.0, 24)
+    ramp = pmesh.Un.copy()
+    ramp[0, :, ng:-ng] = 1.0 + f
+    assert np.isclose(
+        get_mixing_thickness(ramp, ng, pmesh.dx2), np.sum(4.0 * f * (1.0 - f)) / 24
+    )
+
+    # A restart carries on from the rows already written
+    pdiag = PsychoDiagnostics(pin, pmesh, restart=True)
+    Un[2] = pmesh.Un[2] * np.exp(sigma * 0.3)
+    Un[0] *= 1.01
+    values = pdiag.record(Un, 0.3, 3)
+    pdiag.close()
+
+    assert np.isclose(values["mass_drift"], 0.01)
+
+    with open("diagnostics.csv") as f:
+        lines = f.read().splitlines()
+
+    assert len(lines) == 5
+    assert lines[0] == (
+        "iter,time,mass_drift,growth_rate,enstrophy,mixing_thickness,max_density,"
+        "mass,vertical_kinetic_energy"
+    )
+    assert lines[4].startswith("3,0.3,")
+
+    del DIAGNOSTICS["max_density"]
+
+
+def test_psycho_profiler(tmp_path, monkeypatch):
+    """Tests that the profiler times the stages of the staged step and exports a Chrome trace, and records nothing when disabled."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 32
+    pin.value_dict["nx2"] = 32
+
+    gamma = pin.value_dict["gamma"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    ws = Workspace(pmesh)
+
+    profiler = PsychoProfiler()
+    disabled = PsychoProfiler(enabled=False)
+
+    profiler.start()
+    for _ in range(3):
+        with profiler.stage("boundaries"), disabled.stage("boundaries"):
+            pmesh.enforce_bcs(pin)
+
+        muscl_hancock_staged_step(
+            pmesh.Un, 1e-4, pmesh.dx1, pmesh.dx2, gamma, ws, profiler=profiler
+        )
+    profiler.stop()
+
+    summary = profiler.summary(cell_updates=3 * 32 * 32)
+
+    assert set(summary["stages"]) == {
+        "boundaries",
+        "slopes",
+        "predictor",
+        "riemann_x",
+        "riemann_y",
+        "update",
+    }
+    assert all(stage["calls"] == 3 for stage in summary["stages"].values())
+    assert sum(stage["total"] for stage in summary["stages"].values()) <= (
+        summary["wall_time"]
+    )
+    assert summary["cell_updates_per_second"] > 0
+    assert "riemann_x" in profiler.report()
+
+    assert disabled.durations == {} and disabled.events == []
+
+    monkeypatch.chdir(tmp_path)
+    profiler.save("profile")
+
+    with open("profile_trace.json") as f:
+        events = json.load(f)["traceEvents"]
+
+    assert len([event for event in events if event["ph"] == "X"]) == 18
+    assert events[0]["args"]["name"] == "MainThread"
+
+    with open("profile.json") as f:
+        assert json.load(f)["stages"]["update"]["calls"] == 3
+
+
+def test_psycho_warmup(tmp_path):
+    """Tests that every kernel is cached on disk, in the directory given to psycho.py, and that the warm-up runs every group of kernels."""
+
+    for kernel in [
+        muscl_hancock_step,
+        muscl_hancock_step_ensemble,
+        solve_riemann,
+        solve_riemann_parallel,
+        _get_fluxes_2d_cells,
+    ]:
+        assert kernel in KERNELS
+        assert type(kernel._cache).__name__ == "FunctionCache"
+
+    timings = warmup()
+    assert list(timings) == list(GROUPS)
+    assert all(seconds >= 0 for seconds in timings.values())
+
+    # The cache directory is applied to the kernels decorated at import
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import os, sys, psycho; from src.jit import KERNELS, cache_dir, set_cache_dir; "
+            "set_cache_dir(sys.argv[1]); "
+            "assert cache_dir() == sys.argv[1]; "
+            "assert os.environ['NUMBA_CACHE_DIR'] == sys.argv[1]; "
+            "assert all(k._cache._cache_path.startswith(sys.argv[1]) for k in KERNELS)",
+            str(tmp_path),
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    assert result.returncode == 0
+
+
+def test_psycho_startup():
+    """Tests that importing psycho.py stays within its startup budget, measured with python -X importtime, and loads none of the heavy modules until they are used."""
+
+    # Budget for importing psycho.py, in seconds, a few times what it takes
+    # with numpy as the only heavy import
+    budget = 0.5
+    heavy = ["numba", "h5py", "matplotlib", "src.decomposition", "src.sweep"]
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys, psycho; assert not {{*sys.modules}} & {{*{heavy}}}",
+        ],
+        cwd=root,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0
+
+    # The last line gives the cumulative import time of psycho in microseconds
+    last = result.stderr.strip().splitlines()[-1].split("|")
+    assert last[2].strip() == "psycho"
+    assert int(last[1]) < 1e6 * budget
+
+    # h5py is only imported once hdf5 output is requested
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; import src.data_saver; assert 'h5py' not in sys.modules",
+        ],
+        cwd=root,
+    )
+
+    assert result.returncode == 0
+
+
+def test_psycho_writer(tmp_path, monkeypatch):
+    """Tests that the background writer saves the same output as writing inline, even when Un changes after submitting, and is flushed on request."""
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 16
+    pin.value_dict["nx2"] = 16
+    pin.value_dict["data_file_type"] = "csv"
+
+    gamma = pin.value_dict["gamma"]
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+    Un = pmesh.Un.copy()
+
+    for name in ["inline", "background"]:
+        os.makedirs(tmp_path / name)
+        monkeypatch.chdir(tmp_path / name)
+
+        pout = PsychoOutput(f"inputs/kh.in")
+        pout.data_preferences(pin)
+
+        pmesh.Un[...] = Un
+
+        if name == "inline":
+            for iter in range(3):
+                pout.save_data(pmesh.Un, 0.1 * iter, 0.2, gamma, iter)
+                pmesh.Un[0] *= 1.5
+            pout.close()
+
+        else:
+            pwriter = PsychoWriter([pout], pmesh.Un.shape, pmesh.Un.dtype)
+            for iter in range(3):
+                pwriter.submit(pmesh.Un, [0.1 * iter], 0.2, gamma, iter)
+                pmesh.Un[0] *= 1.5
+
+            # Flushing writes out every snapshot submitted so far
+            pwriter.flush()
+            pout.flush()
+
+            with open("iter_time.csv") as f:
+                assert len(f.readlines()) == 3
+
+            pwriter.close()
+            pout.close()
+
+    for fname in ["density.csv", "pressure.csv", "iter_time.csv"]:
+        with (
+            open(tmp_path / "inline" / fname) as f_inline,
+            open(tmp_path / "background" / fname) as f_background,
+        ):
+            assert f_inline.read() == f_background.read()
+
 
 def test_plotter_directory():
     """Remove directory if it exists to test the plotter's ability to create it"""
@@ -533,3 +1734,154 @@ def test_plotter_figure():
     assert os.path.exists("./output/plots/0001.png")
 
     os.remove("./output/plots/0001.png")
+
+
+def test_plotter_reuse():
+    """Verify the imshow plotter keeps its figure between frames and averages large fields down to the axes pixels"""
+
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 1024
+    pin.value_dict["nx2"] = 1024
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+
+    test_plotter = Plotter(pmesh)
+
+    for iter in [9010, 9011]:
+        test_plotter.update(get_plot_primitives(pmesh.Un, pmesh.ng))
+        test_plotter.create_plot(
+            ["rho", "u"], ["a", "b"], ["magma", "jet"], "test", False, iter, 0
+        )
+
+        if iter == 9010:
+            fig = test_plotter.fig
+
+        assert test_plotter.fig is fig
+        assert os.path.exists(f"./output/plots/{iter}.png")
+        os.remove(f"./output/plots/{iter}.png")
+
+    for (im, var, factor), ax in zip(test_plotter.images, fig.axes):
+        assert factor > 1
+        assert im.get_array().shape[1] <= ax.get_window_extent().width
+        assert im.get_clim() == (
+            np.amin(test_plotter.primitives[var]),
+            np.amax(test_plotter.primitives[var]),
+        )
+
+    test_plotter.close()
+    assert test_plotter.fig is None
+
+
+def test_plotter_pool():
+    """Tests that the plot pool renders every frame when blocking and accounts for every frame when skipping."""
+
+    pin = PsychoInput(f"inputs/sample.in")
+    pin.parse_input_file()
+
+    pmesh = PsychoArray(pin, np.float64)
+    sampleProblemGenerator(pin=pin, pmesh=pmesh)
+
+    plot_options = (["rho"], ["test"], ["magma"], "test", True)
+
+    for drop_policy in ["block", "skip"]:
+        ppool = PlotPool(pmesh, 1, 1, drop_policy, plot_options)
+        rendered = [ppool.submit(pmesh.Un, iter, 0.0) for iter in range(9000, 9004)]
+        ppool.close()
+
+        if drop_policy == "block":
+            assert all(rendered)
+        else:
+            assert rendered[0]
+            assert ppool.dropped == rendered.count(False)
+
+        for iter, was_rendered in zip(range(9000, 9004), rendered):
+            assert os.path.exists(f"./output/plots/{iter}.png") == was_rendered
+
+            if was_rendered:
+                os.remove(f"./output/plots/{iter}.png")
+
+
+def test_frame_renderer():
+    """Verify the frames match matplotlib's colormaps and orientation, and are written as readable PNG files"""
+
+    import matplotlib
+    from PIL import Image
+
+    x = np.linspace(0, 1, 256)
+    for cmap in ["gray", "jet", "hot", "ocean", "jet_r", "ocean_r"]:
+        assert np.array_equal(
+            get_colormap_lut(cmap), matplotlib.colormaps[cmap](x, bytes=True)[:, :3]
+        )
+
+    pin = PsychoInput(f"inputs/kh.in")
+    pin.parse_input_file()
+    pin.value_dict["nx1"] = 48
+    pin.value_dict["nx2"] = 32
+
+    pmesh = PsychoArray(pin, np.float64)
+    ProblemGenerator(pin=pin, pmesh=pmesh)
+
+    renderer = FrameRenderer(pmesh)
+
+    field = renderer.primitives["v"].T
+    norm = matplotlib.colors.Normalize(np.amin(field), np.amax(field))
+    expected = matplotlib.colormaps["jet"](norm(field), bytes=True)[..., :3]
+
+    assert np.array_equal(renderer.render("v", "jet"), expected)
+
+    renderer.create_plot(["v"], ["v"], ["jet"], "test", False, 9020, 0.0)
+
+    with Image.open("./output/frames/v_9020.png") as image:
+        assert np.array_equal(np.asarray(image.convert("RGB")), expected)
+
+    os.remove("./output/frames/v_9020.png")
+
+
+def test_frame_renderer_no_matplotlib():
+    """Verify the frame renderer does not import matplotlib"""
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; import plotting.frames; assert 'matplotlib' not in sys.modules",
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    assert result.returncode == 0
+
+
+def test_video_stream(tmp_path, monkeypatch):
+    """Verify frames are streamed into a y4m file, or piped into ffmpeg when it is found"""
+
+    rgb = [np.random.randint(0, 256, (6, 10, 3), dtype=np.uint8) for _ in range(3)]
+
+    stream = VideoStream(str(tmp_path / "movie"), 10, 6, 24, "y4m")
+    for frame in rgb:
+        stream.write(frame)
+    stream.close()
+
+    with open(tmp_path / "movie.y4m", "rb") as f:
+        assert f.readline() == b"YUV4MPEG2 W10 H6 F24:1 Ip A1:1 C444\n"
+        for frame in rgb:
+            assert f.readline() == b"FRAME\n"
+            assert f.read(3 * 6 * 10) == rgb_to_yuv444(frame).tobytes()
+        assert f.read() == b""
+
+    # Stand-in for ffmpeg which copies the raw frames into the output file
+    fake_ffmpeg = tmp_path / "ffmpeg"
+    fake_ffmpeg.write_text('#!/bin/sh\nfor last; do :; done\ncat > "$last"\n')
+    fake_ffmpeg.chmod(0o755)
+    monkeypatch.setenv("PATH", str(tmp_path), prepend=os.pathsep)
+
+    stream = VideoStream(str(tmp_path / "movie"), 10, 6, 24)
+    assert stream.fname == str(tmp_path / "movie.mp4")
+    for frame in rgb:
+        stream.write(frame)
+    stream.close()
+
+    with open(tmp_path / "movie.mp4", "rb") as f:
+        assert f.read() == b"".join(frame.tobytes() for frame in rgb)